@@ -2,6 +2,7 @@
 
 from __future__ import annotations  # noqa:F407
 
+import array
 import functools
 import struct
 import sys
@@ -27,6 +28,11 @@ else:  # pragma: no cover
 
 import hid_parser.data
 
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
 __version__ = "0.0.3"
 
 
@@ -381,6 +387,20 @@ class MainItem(BaseItem):
         return self._flags & (1 << 2) == 0
 
 
+_KIND_INT = 0
+_KIND_ON_OFF = 1  # true if 1
+_KIND_BOOL = 2  # true if not 0
+_KINDS = {"int": _KIND_INT, "on_off": _KIND_ON_OFF, "bool": _KIND_BOOL}
+
+
+def _value(raw: int, sign: int, kind: int) -> Union[int, bool]:
+    if kind == _KIND_INT:
+        return raw - (sign << 1) if raw & sign else raw
+    elif kind == _KIND_ON_OFF:
+        return raw == 1
+    return raw != 0
+
+
 class VariableItem(MainItem):
     _INCOMPATIBLE_TYPES = (
         # array types
@@ -407,6 +427,7 @@ class VariableItem(MainItem):
     ):
         super().__init__(offset, size, flags, logical_min, logical_max, physical_min, physical_max)
         self._usage = usage
+        self._extraction: Optional[Tuple[int, int, int, int, int, int]] = None
 
         try:
             if all(usage_type in self._INCOMPATIBLE_TYPES for usage_type in usage.usage_types):
@@ -417,25 +438,52 @@ class VariableItem(MainItem):
     def __repr__(self) -> str:
         return f"VariableItem(offset={self.offset}, size={self.size}, usage={self.usage})"
 
-    def parse(self, data: Sequence[int]) -> UsageValue:
-        data = _data_bit_shift(data, self.offset, self.size)
-
-        if hid_parser.data.UsageTypes.LINEAR_CONTROL in self.usage.usage_types or any(
+    def _kind(self) -> Literal["int", "on_off", "bool"]:
+        try:
+            usage_types = self.usage.usage_types
+        except (KeyError, ValueError):  # unknown or vendor usage, keep the raw value
+            return "int"
+        if hid_parser.data.UsageTypes.LINEAR_CONTROL in usage_types or any(
             usage_type in hid_parser.data.UsageTypesData and usage_type != hid_parser.data.UsageTypes.SELECTOR
-            for usage_type in self.usage.usage_types
-        ):  # int
-            value = int.from_bytes(data, byteorder="little")
+            for usage_type in usage_types
+        ):
+            return "int"
         elif (
-            hid_parser.data.UsageTypes.ON_OFF_CONTROL in self.usage.usage_types
+            hid_parser.data.UsageTypes.ON_OFF_CONTROL in usage_types
             and not self.preferred_state
             and self.logical_min == -1
             and self.logical_max == 1
-        ):  # bool - -1 is false
-            value = int.from_bytes(data, byteorder="little") == 1
-        else:  # bool
-            value = bool.from_bytes(data, byteorder="little")
+        ):  # -1 is false
+            return "on_off"
+        else:
+            return "bool"
+
+    @property
+    def extraction(self) -> Tuple[int, int, int, int, int, int]:
+        """
+        How to read the value of this item from a report, worked out once:
+        (byte start, byte end, shift, mask, sign bit, kind), with sign bit 0 for unsigned values.
+        """
+        if self._extraction is None:
+            offset = int(self.offset)
+            size = int(self.size)
+            kind = self._kind()
+            signed = kind == "int" and self.logical_min > self.logical_max  # logical minimum is kept unsigned
+            self._extraction = (
+                offset // 8,
+                (offset + size - 1) // 8 + 1,
+                offset % 8,
+                (1 << size) - 1,
+                1 << (size - 1) if signed else 0,
+                _KINDS[kind],
+            )
+        return self._extraction
 
-        return UsageValue(self, value)
+    def parse(self, data: Sequence[int]) -> UsageValue:
+        start, end, shift, mask, sign, kind = self.extraction
+        if end > len(data):
+            raise ValueError(f"Invalid data length: {len(data)} (expecting {end})")
+        return UsageValue(self, _value(int.from_bytes(data[start:end], byteorder="little") >> shift & mask, sign, kind))
 
     @property
     def usage(self) -> Usage:
@@ -585,6 +633,152 @@ class InvalidReportDescriptor(Exception):
 # report ID (None for no report ID), item list
 _ITEM_POOL = Dict[Optional[int], List[BaseItem]]
 
+# a column of values, one per report
+Column = Union["array.array[int]", Any]
+
+# usage, offset, size, array count (None for variable items), kind, signed
+_FIELD = Tuple[Usage, int, int, Optional[int], str, bool]
+
+
+def _column_fields(items: List[BaseItem]) -> List[_FIELD]:
+    """
+    The fields read for each usage in a report: (usage, offset, size, array count, kind, signed),
+    with array count None for variable items.
+    """
+    fields: Dict[Usage, _FIELD] = {}
+    for item in items:
+        if isinstance(item, VariableItem):
+            signed = item.extraction[4] != 0
+            fields[item.usage] = (item.usage, int(item.offset), int(item.size), None, item._kind(), signed)
+        elif isinstance(item, ArrayItem):
+            for usage in item.usages:  # a variable item for the same usage, like a modifier key, comes first
+                if usage not in item._ignore_usages and usage not in fields:
+                    fields[usage] = (usage, int(item.offset), int(item.size), item.count, "bool", False)
+    return list(fields.values())
+
+
+def _typecode(size: int, signed: bool) -> str:
+    for typecode in ("B", "H", "I", "Q"):
+        if size <= array.array(typecode).itemsize * 8:
+            return typecode.lower() if signed else typecode
+    raise ValueError(f"Field too large for a column: {size} bits")
+
+
+def _bits(data: bytes, start: int, offset: int, size: int) -> int:
+    """The unsigned value of size bits at bit offset of the report starting at byte start, least significant bit first."""
+    first = start + offset // 8
+    return int.from_bytes(data[first : start + (offset + size - 1) // 8 + 1], "little") >> (offset % 8) & ((1 << size) - 1)
+
+
+def _python_columns(data: bytes, skip: int, length: int, fields: Iterable[_FIELD]) -> Dict[Usage, Column]:
+    starts = range(skip, len(data), length)
+    columns: Dict[Usage, Column] = {}
+    for usage, offset, size, count, kind, signed in fields:
+        if count is None:
+            values = [_bits(data, start, offset, size) for start in starts]
+            if kind == "on_off":
+                values = [value == 1 for value in values]
+            elif kind == "bool":
+                values = [value != 0 for value in values]
+            elif signed:
+                values = [value - (1 << size) if value >> (size - 1) else value for value in values]
+            columns[usage] = array.array(_typecode(size, signed) if kind == "int" else "B", values)
+        else:
+            offsets = [offset + i * size for i in range(count)]
+            columns[usage] = array.array(
+                "B", [any(_bits(data, start, o, size) == usage.usage for o in offsets) for start in starts]
+            )
+    return columns
+
+
+def _numpy_field(rows: Any, offset: int, size: int) -> Any:
+    first = offset // 8
+    last = (offset + size - 1) // 8
+    if last - first >= 8:  # does not fit a 64 bit integer, rare enough to go through Python integers
+        return numpy.array([_bits(bytes(row), 0, offset, size) for row in rows], dtype=object)
+    values = numpy.zeros(len(rows), dtype=numpy.uint64)
+    for shift, column in enumerate(range(first, last + 1)):
+        values |= rows[:, column].astype(numpy.uint64) << numpy.uint64(8 * shift)
+    return (values >> numpy.uint64(offset % 8)) & numpy.uint64((1 << size) - 1)
+
+
+def _numpy_columns(data: bytes, skip: int, length: int, fields: Iterable[_FIELD]) -> Dict[Usage, Column]:
+    rows = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, length)[:, skip:]
+    columns: Dict[Usage, Column] = {}
+    for usage, offset, size, count, kind, signed in fields:
+        if count is None:
+            values = _numpy_field(rows, offset, size)
+            if kind == "on_off":
+                columns[usage] = (values == 1).astype(numpy.uint8)
+            elif kind == "bool":
+                columns[usage] = (values != 0).astype(numpy.uint8)
+            else:
+                if signed:
+                    values = values.astype(numpy.int64) - ((values >> numpy.uint64(size - 1)).astype(numpy.int64) << size)
+                columns[usage] = values.astype(numpy.dtype(_typecode(size, signed)))
+        else:
+            present = numpy.zeros(len(rows), dtype=bool)
+            for i in range(count):
+                present |= _numpy_field(rows, offset + i * size, size) == usage.usage
+            columns[usage] = present.astype(numpy.uint8)
+    return columns
+
+
+class _ReportPlan:
+    """
+    How to read the values of one report, compiled from its items. Byte aligned
+    8, 16, 32 and 64 bit values are read together by a struct, other values by
+    a precomputed (byte start, byte end, shift, mask, sign bit, kind) extraction.
+    """
+
+    _STRUCT_CODES = {8: "b", 16: "h", 32: "i", 64: "q"}
+
+    def __init__(self, items: List[BaseItem]) -> None:
+        self._steps: List[Tuple[BaseItem, Optional[int], Optional[Tuple[int, int, int, int, int, int]]]] = []
+        self._size = 0
+        fmt = "<"
+        position = 0
+        index = 0
+        for item in items:
+            self._size = max(self._size, (int(item.offset) + int(item.size) * getattr(item, "count", 1) + 7) // 8)
+            if isinstance(item, VariableItem):
+                start, end, shift, _mask, sign, _kind = item.extraction
+                code = self._STRUCT_CODES.get(int(item.size))
+                if code and shift == 0 and start >= position:
+                    fmt += "x" * (start - position) + (code if sign else code.upper())
+                    position = end
+                    self._steps.append((item, index, item.extraction))
+                    index += 1
+                else:
+                    self._steps.append((item, None, item.extraction))
+            elif isinstance(item, ArrayItem):
+                self._steps.append((item, None, None))
+            elif not isinstance(item, PaddingItem):
+                raise TypeError(f"Unknown item: {item}")
+        self._struct = struct.Struct(fmt) if index else None
+
+    def parse(self, data: Union[bytes, bytearray, memoryview], base: int) -> Dict[Usage, UsageValue]:
+        if base + self._size > len(data):
+            raise ValueError(f"Invalid data length: {len(data)} (expecting {base + self._size})")
+        aligned = self._struct.unpack_from(data, base) if self._struct else ()
+        parsed: Dict[Usage, UsageValue] = {}
+        for item, index, extraction in self._steps:
+            if index is not None:
+                value = aligned[index]
+                kind = extraction[5]
+                parsed[item.usage] = UsageValue(item, value if kind == _KIND_INT else _value(value, 0, kind))
+            elif extraction is not None:
+                start, end, shift, mask, sign, kind = extraction
+                raw = int.from_bytes(data[base + start : base + end], byteorder="little") >> shift & mask
+                parsed[item.usage] = UsageValue(item, _value(raw, sign, kind))
+            else:
+                usage_values = item.parse(data[base:])
+                for usage in usage_values:
+                    if usage in parsed:
+                        warnings.warn(HIDReportWarning(f"Overriding usage: {usage}"))  # noqa
+                parsed.update(usage_values)
+        return parsed
+
 
 class ReportDescriptor:
     def __init__(self, data: Sequence[int]) -> None:
@@ -602,6 +796,10 @@ class ReportDescriptor:
 
         self._parse()
 
+        self._input_plans = self._compile(self._input)
+        self._output_plans = self._compile(self._output)
+        self._feature_plans = self._compile(self._feature)
+
     @property
     def data(self) -> Sequence[int]:
         return self._data
@@ -648,37 +846,59 @@ class ReportDescriptor:
     def get_feature_report_size(self, report_id: Optional[int] = None) -> BitNumber:
         return self._get_report_size(self.get_feature_items(report_id))
 
-    def _parse_report_items(self, items: List[BaseItem], data: Sequence[int]) -> Dict[Usage, UsageValue]:
-        parsed: Dict[Usage, UsageValue] = {}
-        for item in items:
-            if isinstance(item, VariableItem):
-                parsed[item.usage] = item.parse(data)
-            elif isinstance(item, ArrayItem):
-                usage_values = item.parse(data)
-                for usage in usage_values:
-                    if usage in parsed:
-                        warnings.warn(HIDReportWarning(f"Overriding usage: {usage}"))  # noqa
-                parsed.update(usage_values)
-            elif isinstance(item, PaddingItem):
-                pass
-            else:
-                raise TypeError(f"Unknown item: {item}")
-        return parsed
+    def _compile(self, pool: _ITEM_POOL) -> Dict[Optional[int], _ReportPlan]:
+        return {report_id: _ReportPlan(items) for report_id, items in pool.items()}
 
-    def _parse_report(self, item_poll: _ITEM_POOL, data: Sequence[int]) -> Dict[Usage, UsageValue]:
-        if None in item_poll:  # unnumbered reports
-            return self._parse_report_items(item_poll[None], data)
+    def _parse_report(self, plans: Dict[Optional[int], _ReportPlan], data: Sequence[int]) -> Dict[Usage, UsageValue]:
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data)
+        if None in plans:  # unnumbered reports
+            return plans[None].parse(data, 0)
         else:  # numbered reports
-            return self._parse_report_items(item_poll[data[0]], data[1:])
+            return plans[data[0]].parse(data, 1)
 
     def parse_input_report(self, data: Sequence[int]) -> Dict[Usage, UsageValue]:
-        return self._parse_report(self._input, data)
+        return self._parse_report(self._input_plans, data)
 
     def parse_output_report(self, data: Sequence[int]) -> Dict[Usage, UsageValue]:
-        return self._parse_report(self._output, data)
+        return self._parse_report(self._output_plans, data)
 
     def parse_feature_report(self, data: Sequence[int]) -> Dict[Usage, UsageValue]:
-        return self._parse_report(self._feature, data)
+        return self._parse_report(self._feature_plans, data)
+
+    def parse_input_reports(self, data: Union[bytes, bytearray, memoryview]) -> Dict[Usage, Column]:
+        """
+        Parse a buffer of many input reports with the same report ID, back to back,
+        as captured from a device.
+
+        Returns one column per usage, with the value of that usage in each report:
+        a NumPy array if NumPy is available, else an array.array. Variable items
+        give their value (signed if their logical minimum is negative, 0 or 1 for
+        on/off controls and selectors), array items give 1 for each usage
+        present in the report. Fields are read least significant bit first.
+        """
+        data = bytes(data)
+        if not data:
+            return {}
+        if None in self._input:  # unnumbered reports
+            report_id = None
+            skip = 0
+        else:
+            report_id = data[0]
+            skip = 1
+        if report_id not in self._input:
+            raise ValueError(f"Unknown input report ID: {report_id}")
+
+        length = skip + (int(self.get_input_report_size(report_id)) + 7) // 8
+        if len(data) % length:
+            raise ValueError(f"Invalid data length: {len(data)} (expecting a multiple of {length})")
+        if skip and data[::length].count(report_id) != len(data) // length:
+            raise ValueError(f"Reports do not all have report ID {report_id}")
+
+        fields = _column_fields(self.get_input_items(report_id))
+        if numpy is not None:
+            return _numpy_columns(data, skip, length, fields)
+        return _python_columns(data, skip, length, fields)
 
     def _iterate_raw(self) -> Iterable[Tuple[int, int, Optional[int]]]:
         i = 0
@@ -1039,3 +1259,79 @@ class ReportDescriptor:
 
                 elif tag == TagLocal.DELIMITER:
                     printl(f"Delemiter ({data})")
+
+
+class ReportSizes(typing.NamedTuple):
+    """Sizes in bits of the input, output and feature reports, by report ID (None for no report ID)."""
+
+    input: Dict[Optional[int], int]
+    output: Dict[Optional[int], int]
+    feature: Dict[Optional[int], int]
+
+
+# main item (tag and type bits of the prefix) -> index in ReportSizes
+_SCAN_MAIN_ITEMS = {
+    TagMain.INPUT << 4: 0,
+    TagMain.OUTPUT << 4: 1,
+    TagMain.FEATURE << 4: 2,
+}
+_SCAN_REPORT_SIZE = TagGlobal.REPORT_SIZE << 4 | Type.GLOBAL << 2
+_SCAN_REPORT_COUNT = TagGlobal.REPORT_COUNT << 4 | Type.GLOBAL << 2
+_SCAN_REPORT_ID = TagGlobal.REPORT_ID << 4 | Type.GLOBAL << 2
+_SCAN_PUSH = TagGlobal.PUSH << 4 | Type.GLOBAL << 2
+_SCAN_POP = TagGlobal.POP << 4 | Type.GLOBAL << 2
+
+
+def scan(data: Union[bytes, bytearray, Sequence[int]]) -> ReportSizes:
+    """
+    Find the report IDs and report sizes of a report descriptor.
+
+    This is a single pass over the descriptor items that only keeps track of
+    the report ID, size and count, so it creates no items or usages and emits
+    no warnings. Push and pop are supported. Use ReportDescriptor to look at
+    the items themselves.
+    """
+    if not isinstance(data, (bytes, bytearray)):
+        data = bytes(data)
+    sizes: Tuple[Dict[Optional[int], int], ...] = ({}, {}, {})
+    report_id: Optional[int] = None
+    report_size = report_count = 0
+    stack: List[Tuple[Optional[int], int, int]] = []
+
+    i = 0
+    length = len(data)
+    while i < length:
+        prefix = data[i]
+        if prefix == 0xFE:  # long item (6.2.2.3), none are defined
+            if i + 2 >= length:
+                raise InvalidReportDescriptor(f"Invalid long item at {i}")
+            i += 3 + data[i + 1]
+            continue
+
+        size = prefix & 0b00000011
+        if size == 3:  # 6.2.2.2
+            size = 4
+        if i + size >= length:
+            raise InvalidReportDescriptor(f"Invalid size: expecting >={i + 1 + size}, got {length}")
+
+        item = prefix & 0b11111100
+        main = _SCAN_MAIN_ITEMS.get(item)
+        if main is not None:
+            pool = sizes[main]
+            pool[report_id] = pool.get(report_id, 0) + report_size * report_count
+        elif item == _SCAN_REPORT_SIZE:
+            report_size = int.from_bytes(data[i + 1 : i + 1 + size], "little")
+        elif item == _SCAN_REPORT_COUNT:
+            report_count = int.from_bytes(data[i + 1 : i + 1 + size], "little")
+        elif item == _SCAN_REPORT_ID:
+            report_id = int.from_bytes(data[i + 1 : i + 1 + size], "little")
+        elif item == _SCAN_PUSH:
+            stack.append((report_id, report_size, report_count))
+        elif item == _SCAN_POP:
+            if not stack:
+                raise InvalidReportDescriptor(f"Pop without push at {i}")
+            report_id, report_size, report_count = stack.pop()
+
+        i += size + 1
+
+    return ReportSizes(*sizes)
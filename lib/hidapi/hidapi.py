@@ -31,11 +31,6 @@ from collections import namedtuple
 from threading import Thread
 from time import sleep
 
-import gi
-
-gi.require_version("Gdk", "3.0")
-from gi.repository import GLib  # NOQA: E402
-
 logger = logging.getLogger(__name__)
 
 native_implementation = "hidapi"
@@ -211,29 +206,92 @@ def _enumerate_devices():
     return unique_devices
 
 
+# hidapi 0.15 and later can call back when devices are connected or removed
+_HOTPLUG_EVENT_DEVICE_ARRIVED = 1 << 0
+_HOTPLUG_EVENT_DEVICE_LEFT = 1 << 1
+_hotplug_callback_fn = ctypes.CFUNCTYPE(
+    ctypes.c_int, ctypes.c_int, ctypes.POINTER(_cDeviceInfo), ctypes.c_int, ctypes.c_void_p
+)
+_hotplug = hasattr(_hidapi, "hid_hotplug_register_callback")
+if _hotplug:
+    _hidapi.hid_hotplug_register_callback.argtypes = [
+        ctypes.c_ushort,
+        ctypes.c_ushort,
+        ctypes.c_int,
+        ctypes.c_int,
+        _hotplug_callback_fn,
+        ctypes.c_void_p,
+        ctypes.POINTER(ctypes.c_int),
+    ]
+    _hidapi.hid_hotplug_register_callback.restype = ctypes.c_int
+
+
 # Use a separate thread to check if devices have been removed or connected
 class _DeviceMonitor(Thread):
+    """Reports connected and removed devices, keeping a table of the present ones by path.
+
+    With hidapi hotplug callbacks the changes are reported as they happen, otherwise
+    the devices are enumerated every polling_delay seconds and compared with the table.
+    """
+
     def __init__(self, device_callback, polling_delay=5.0):
         self.device_callback = device_callback
         self.polling_delay = polling_delay
+        self.devices = {}  # path -> device
+        self._ignored = set()  # paths of keyboards and mice
+        self._hotplug_callback = None
         # daemon threads are automatically killed when main thread exits
         super().__init__(daemon=True)
 
     def run(self):
         # Populate initial set of devices so startup doesn't cause any callbacks
-        self.prev_devices = {tuple(dev.items()): dev for dev in _enumerate_devices()}
+        self.devices = {dev["path"]: dev for dev in _enumerate_devices()}
+        if _hotplug and self._register_hotplug():
+            return  # hidapi calls back from its own thread
 
         # Continously enumerate devices and raise callback for changes
         while True:
-            current_devices = {tuple(dev.items()): dev for dev in _enumerate_devices()}
-            for key, device in self.prev_devices.items():
-                if key not in current_devices:
-                    self.device_callback("remove", device)
-            for key, device in current_devices.items():
-                if key not in self.prev_devices:
-                    self.device_callback("add", device)
-            self.prev_devices = current_devices
             sleep(self.polling_delay)
+            current_devices = {dev["path"]: dev for dev in _enumerate_devices()}
+            for path, device in self.devices.items():
+                if current_devices.get(path) != device:
+                    self.device_callback("remove", device)
+            for path, device in current_devices.items():
+                if self.devices.get(path) != device:
+                    self.device_callback("add", dict(device))  # the callback adds to the device, keep the table as listed
+            self.devices = current_devices
+
+    def _register_hotplug(self):
+        self._hotplug_callback = _hotplug_callback_fn(self._hotplug_event)  # keep a reference while registered
+        handle = ctypes.c_int()
+        events = _HOTPLUG_EVENT_DEVICE_ARRIVED | _HOTPLUG_EVENT_DEVICE_LEFT
+        if _hidapi.hid_hotplug_register_callback(0, 0, events, 0, self._hotplug_callback, None, ctypes.byref(handle)):
+            logger.warning("hidapi hotplug callbacks not available, polling for devices")
+            return False
+        return True
+
+    def _hotplug_event(self, callback_handle, c_device, event, user_data):
+        try:
+            device = c_device.contents.as_dict()
+            path = device["path"]
+            # hidapi reports each usage page of a device, only report the device once
+            if event == _HOTPLUG_EVENT_DEVICE_ARRIVED:
+                if device["usage_page"] == 1 and device["usage"] in (6, 2):
+                    self._ignored.add(path)
+                    added = self.devices.pop(path, None)
+                    if added is not None:  # reported before its keyboard or mouse usage turned up
+                        self.device_callback("remove", added)
+                elif path not in self._ignored and path not in self.devices:
+                    self.devices[path] = device
+                    self.device_callback("add", dict(device))
+            elif event == _HOTPLUG_EVENT_DEVICE_LEFT:
+                self._ignored.discard(path)
+                device = self.devices.pop(path, None)
+                if device is not None:
+                    self.device_callback("remove", device)
+        except Exception:
+            logger.exception("hidapi hotplug event")
+        return 0  # stay registered
 
 
 # The filterfn is used to determine whether this is a device of interest to Solaar.
@@ -330,16 +388,29 @@ def find_paired_node_wpid(receiver_path, index):
     return None
 
 
+# The devices of interest to Solaar that are present, by path, kept up to date by enumerate() and the monitor.
+# A removed device cannot be opened to match it, so its removal is reported with what was found when it was added.
+_devices = {}
+
+
 def monitor_glib(callback, filterfn):
+    # GLib is only needed by the GUI, so the command line does not load it
+    import gi
+
+    gi.require_version("Gdk", "3.0")
+    from gi.repository import GLib
+
     def device_callback(action, device):
         # print(f"device_callback({action}): {device}")
         if action == "add":
             d_info = _match(action, device, filterfn)
             if d_info:
+                _devices[d_info.path] = d_info
                 GLib.idle_add(callback, action, d_info)
         elif action == "remove":
-            # Removed devices will be detected by Solaar directly
-            pass
+            d_info = _devices.pop(device["path"].decode(), None)
+            if d_info:
+                GLib.idle_add(callback, action, d_info)
 
     monitor = _DeviceMonitor(device_callback=device_callback)
     monitor.start()
@@ -356,6 +427,7 @@ def enumerate(filterfn):
     for device in _enumerate_devices():
         d_info = _match("add", device, filterfn)
         if d_info:
+            _devices[d_info.path] = d_info
             yield d_info
 
 
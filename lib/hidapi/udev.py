@@ -23,9 +23,11 @@ necessary.
 """
 
 import errno as _errno
+import hashlib as _hashlib
 import logging
 import os as _os
-import warnings as _warnings
+import tempfile as _tempfile
+import threading as _threading
 
 
 # the tuple object we'll expose when enumerating devices
@@ -34,16 +36,12 @@ from select import select as _select
 from time import sleep
 from time import time as _timestamp
 
-import gi
-
 from pyudev import Context as _Context
 from pyudev import Device as _Device
 from pyudev import DeviceNotFoundError
 from pyudev import Devices as _Devices
 from pyudev import Monitor as _Monitor
-
-gi.require_version("Gdk", "3.0")
-from gi.repository import GLib  # NOQA: E402
+from pyudev import MonitorObserver as _MonitorObserver
 
 logger = logging.getLogger(__name__)
 
@@ -93,6 +91,68 @@ def exit():
     return True
 
 
+# Classification of report descriptors, (hidpp_short, hidpp_long) by the SHA-1 of the descriptor.
+# Many HID devices share descriptors, and a device keeps its descriptor across hotplugs.
+_descriptor_classes = {}
+_descriptor_cache_path = None
+_descriptor_lock = _threading.Lock()  # classifications are added from the monitor thread as well
+_DESCRIPTOR_CACHE_HEADER = "solaar-descriptors 1\n"  # change the version when the classification changes
+
+
+def enable_descriptor_cache(path):
+    """Also keep the report descriptor classifications in a file, so they survive restarts."""
+    global _descriptor_cache_path
+    _descriptor_cache_path = path
+    try:
+        with fileopen(path) as cache_file:
+            if cache_file.readline() != _DESCRIPTOR_CACHE_HEADER:
+                return  # another version, classified again and replaced
+            with _descriptor_lock:
+                for line in cache_file:
+                    key, hidpp_short, hidpp_long = line.split()
+                    _descriptor_classes.setdefault(key, (hidpp_short == "1", hidpp_long == "1"))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning("failed to load report descriptor cache %s: %s", path, e)
+
+
+def _save_descriptor_cache():
+    directory = _os.path.dirname(_descriptor_cache_path)
+    cache_file = None
+    try:
+        _os.makedirs(directory, exist_ok=True)
+        with _descriptor_lock:  # the file holds a snapshot, and the last one written is the latest
+            with _tempfile.NamedTemporaryFile("w", dir=directory, prefix=".descriptors-", delete=False) as cache_file:
+                cache_file.write(_DESCRIPTOR_CACHE_HEADER)
+                for key, (hidpp_short, hidpp_long) in _descriptor_classes.items():
+                    cache_file.write(f"{key} {int(hidpp_short)} {int(hidpp_long)}\n")
+            _os.replace(cache_file.name, _descriptor_cache_path)
+    except Exception as e:
+        logger.warning("failed to save report descriptor cache %s: %s", _descriptor_cache_path, e)
+        if cache_file is not None:
+            try:
+                _os.unlink(cache_file.name)
+            except OSError:
+                pass
+
+
+def _classify_descriptor(data):
+    """Whether a report descriptor has HID++ short and long input reports, as (hidpp_short, hidpp_long)."""
+    key = _hashlib.sha1(data).hexdigest()
+    result = _descriptor_classes.get(key)
+    if result is None:
+        from hid_parser import scan as _scan
+
+        sizes = _scan(data).input
+        result = (sizes.get(0x10) == 6 * 8, sizes.get(0x11) == 19 * 8)
+        with _descriptor_lock:
+            _descriptor_classes[key] = result
+        if _descriptor_cache_path:
+            _save_descriptor_cache()
+    return result
+
+
 # The filterfn is used to determine whether this is a device of interest to Solaar.
 # It is given the bus id, vendor id, and product id and returns a dictionary
 # with the required hid_driver and usb_interface and whether this is a receiver or device.
@@ -111,18 +171,10 @@ def _match(action, device, filterfn):
         return  # these are devices connected through a receiver so don't pick them up here
 
     try:  # if report descriptor does not indicate HID++ capabilities then this device is not of interest to Solaar
-        from hid_parser import ReportDescriptor as _ReportDescriptor
-
         hidpp_short = hidpp_long = False
         devfile = "/sys" + hid_device.get("DEVPATH") + "/report_descriptor"
         with fileopen(devfile, "rb") as fd:
-            with _warnings.catch_warnings():
-                _warnings.simplefilter("ignore")
-                rd = _ReportDescriptor(fd.read())
-            hidpp_short = 0x10 in rd.input_report_ids and 6 * 8 == int(rd.get_input_report_size(0x10))
-            # and _Usage(0xFF00, 0x0001) in rd.get_input_items(0x10)[0].usages  # be more permissive
-            hidpp_long = 0x11 in rd.input_report_ids and 19 * 8 == int(rd.get_input_report_size(0x11))
-            # and _Usage(0xFF00, 0x0002) in rd.get_input_items(0x11)[0].usages  # be more permissive
+            hidpp_short, hidpp_long = _classify_descriptor(fd.read())
         if not hidpp_short and not hidpp_long:
             return
     except Exception as e:  # if can't process report descriptor fall back to old scheme
@@ -205,49 +257,201 @@ def _match(action, device, filterfn):
         return d_info
 
 
+class _HidrawIndex:
+    """The hidraw nodes by HID_PHYS, kept up to date by a udev monitor thread.
+
+    Looking up the node of a paired device is then a dictionary lookup, and waiting
+    for a node to appear waits on a condition instead of listing all hidraw devices
+    over and over. If the monitor cannot be started the index is refreshed by
+    listing the devices, as before.
+    """
+
+    RESCAN_INTERVAL = 0.1  # seconds between listings while waiting, without a monitor
+
+    def __init__(self):
+        self._cond = _threading.Condition()
+        self._by_phys = {}  # HID_PHYS -> (device node, HID_ID)
+        self._phys = {}  # device node -> HID_PHYS
+        self._started = False
+        self._starting = False
+        self._pending = []  # changes seen by the monitor while the index was being started
+        self._observer = None
+
+    def _ensure_started(self):
+        """Start the monitor and list the hidraw devices the first time the index is used.
+        This is done without holding the lock, which the monitor needs to report changes.
+        If listing the devices fails the next use of the index tries again.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: not self._starting)
+            if self._started:
+                return
+            self._starting = True
+        observer = entries = None
+        try:
+            context = _Context()
+            try:
+                monitor = _Monitor.from_netlink(context)
+                monitor.filter_by(subsystem="hidraw")
+                observer = _MonitorObserver(monitor, callback=self._event, name="HidrawIndex")
+                observer.daemon = True
+                observer.start()
+            except Exception as e:
+                logger.warning("cannot monitor hidraw devices, listing them instead: %s", e)
+                observer = None
+            entries = self._list(context)  # after starting the monitor so that no change is missed
+        finally:
+            with self._cond:
+                if entries is not None:
+                    self._observer = observer
+                    for entry in entries:
+                        self._add(*entry)
+                    for change in self._pending:  # the changes made while listing, in order
+                        self._apply(*change)
+                    self._started = True
+                self._pending = []
+                self._starting = False
+                self._cond.notify_all()
+            if entries is None and observer is not None:
+                observer.send_stop()
+
+    @staticmethod
+    def _entry(device):
+        """The (device node, HID_PHYS, HID_ID) of a hidraw device, or None if it has no HID_PHYS."""
+        hid_device = device.find_parent("hid")
+        phys = hid_device.get("HID_PHYS") if hid_device else None
+        if phys and device.device_node:
+            return device.device_node, phys, hid_device.get("HID_ID")
+
+    def _list(self, context=None):
+        entries = (self._entry(device) for device in (context or _Context()).list_devices(subsystem="hidraw"))
+        return [entry for entry in entries if entry]
+
+    def _scan(self):
+        entries = self._list()
+        with self._cond:
+            for entry in entries:
+                self._add(*entry)
+
+    def _event(self, device):
+        change = (device.action, device.device_node, self._entry(device) if device.action in ("add", "change") else None)
+        with self._cond:
+            if self._started:
+                self._apply(*change)
+                self._cond.notify_all()
+            elif self._starting:
+                self._pending.append(change)
+
+    def _apply(self, action, device_node, entry):
+        if action == "remove":
+            self._remove(device_node)
+        elif entry:
+            self._add(*entry)
+
+    def _add(self, device_node, phys, hid_id):
+        self._remove(device_node)
+        self._by_phys[phys] = (device_node, hid_id)
+        self._phys[device_node] = phys
+
+    def _remove(self, device_node):
+        phys = self._phys.pop(device_node, None)
+        if phys and self._by_phys.get(phys, (None,))[0] == device_node:
+            del self._by_phys[phys]
+
+    def phys(self, device_node):
+        """The HID_PHYS of a hidraw node."""
+        self._ensure_started()
+        with self._cond:
+            phys = self._phys.get(device_node)
+        if phys is None:  # not a node seen by the index yet, ask udev directly
+            phys = _Devices.from_device_file(_Context(), device_node).find_parent("hid").get("HID_PHYS")
+        return phys
+
+    def get(self, phys, timeout=0):
+        """The (device node, HID_ID) of the hidraw node with a HID_PHYS, waiting up to timeout seconds for it."""
+        deadline = _timestamp() + timeout
+        self._ensure_started()
+        with self._cond:
+            while phys not in self._by_phys:
+                remaining = deadline - _timestamp()
+                if remaining <= 0:
+                    return None
+                if self._observer is None:
+                    self._cond.wait(min(remaining, self.RESCAN_INTERVAL))
+                    self._cond.release()
+                    try:
+                        self._scan()
+                    finally:
+                        self._cond.acquire()
+                else:
+                    self._cond.wait(remaining)
+            return self._by_phys[phys]
+
+
+_hidraw_index = _HidrawIndex()
+
+
 def find_paired_node(receiver_path, index, timeout):
     """Find the node of a device paired with a receiver"""
-    context = _Context()
-    receiver_phys = _Devices.from_device_file(context, receiver_path).find_parent("hid").get("HID_PHYS")
+    receiver_phys = _hidraw_index.phys(receiver_path)
 
     if not receiver_phys:
         return None
 
-    phys = f"{receiver_phys}:{index}"  # noqa: E231
-    timeout += _timestamp()
-    delta = _timestamp()
-    while delta < timeout:
-        for dev in context.list_devices(subsystem="hidraw"):
-            dev_phys = dev.find_parent("hid").get("HID_PHYS")
-            if dev_phys and dev_phys == phys:
-                return dev.device_node
-        delta = _timestamp()
-
-    return None
+    entry = _hidraw_index.get(f"{receiver_phys}:{index}", timeout)  # noqa: E231
+    return entry[0] if entry else None
 
 
 def find_paired_node_wpid(receiver_path, index):
     """Find the node of a device paired with a receiver, get wpid from udev"""
-    context = _Context()
-    receiver_phys = _Devices.from_device_file(context, receiver_path).find_parent("hid").get("HID_PHYS")
+    receiver_phys = _hidraw_index.phys(receiver_path)
 
     if not receiver_phys:
         return None
 
-    phys = f"{receiver_phys}:{index}"  # noqa: E231
-    for dev in context.list_devices(subsystem="hidraw"):
-        dev_phys = dev.find_parent("hid").get("HID_PHYS")
-        if dev_phys and dev_phys == phys:
-            # get hid id like 0003:0000046D:00000065
-            hid_id = dev.find_parent("hid").get("HID_ID")
-            # get wpid - last 4 symbols
-            udev_wpid = hid_id[-4:]
-            return udev_wpid
+    entry = _hidraw_index.get(f"{receiver_phys}:{index}")  # noqa: E231
+    if entry and entry[1]:
+        # hid id like 0003:0000046D:00000065, wpid is the last 4 symbols
+        return entry[1][-4:]
 
     return None
 
 
+# The devices of interest to Solaar that are present, by device node, kept up to date by enumerate() and the monitor.
+# A removed device cannot be matched any more, so its removal is reported with what was found when it was added.
+_devices = {}
+
+
+def _track(action, device, filterfn):
+    """Update the device table for a udev event, returns the (action, DeviceInfo) changes to report."""
+    node = device.device_node
+    known = _devices.get(node)
+    if action == "remove":
+        if known is None:
+            return []
+        del _devices[node]
+        return [("remove", known)]
+    if action not in ("add", "change"):
+        return []
+    d_info = _match("add", device, filterfn)
+    if d_info is None:
+        if known is None:
+            return []
+        del _devices[node]  # changed into a device that is not of interest
+        return [("remove", known)]
+    _devices[node] = d_info
+    if action == "change" and known == d_info:
+        return []
+    return [("add", d_info)]
+
+
 def monitor_glib(callback, filterfn):
+    # GLib is only needed by the GUI, so the command line does not load it
+    import gi
+
+    gi.require_version("Gdk", "3.0")
+    from gi.repository import GLib
+
     c = _Context()
 
     # already existing devices
@@ -267,14 +471,8 @@ def monitor_glib(callback, filterfn):
             event = monitor.receive_device()
             if event:
                 action, device = event
-                # print ("***", action, device)
-                if action == "add":
-                    d_info = _match(action, device, filterfn)
-                    if d_info:
-                        GLib.idle_add(cb, action, d_info)
-                elif action == "remove":
-                    # the GLib notification does _not_ match!
-                    pass
+                for change, d_info in _track(action, device, filterfn):
+                    GLib.idle_add(cb, change, d_info)
         return True
 
     try:
@@ -309,6 +507,7 @@ def enumerate(filterfn):
     for dev in _Context().list_devices(subsystem="hidraw"):
         dev_info = _match("add", dev, filterfn)
         if dev_info:
+            _devices[dev_info.path] = dev_info
             yield dev_info
 
 
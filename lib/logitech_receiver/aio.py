@@ -0,0 +1,218 @@
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# asyncio front end to the API.
+# The handles are read from the event loop instead of by listener threads,
+# so many devices can be probed at once with asyncio.gather.
+
+import asyncio
+import logging
+
+from struct import pack as _pack
+
+from . import base
+from . import exceptions
+
+logger = logging.getLogger(__name__)
+
+# How many unprocessed notifications to keep for a connection
+_NOTIFICATIONS_QUEUE_SIZE = 256
+
+
+class Connection:
+    """An open handle that is read from the asyncio event loop.
+
+    Replies are routed through the request pipeline of the handle, so blocking
+    requests made from other threads (e.g., in run_in_executor) also get their
+    replies while the event loop runs. Blocking requests must not be made from the
+    event loop thread itself, as nothing would read their replies.
+    A connection is made in a coroutine, or given the event loop to use.
+    """
+
+    def __init__(self, handle, loop=None):
+        assert handle is not None
+        self.handle = handle
+        self._loop = loop or asyncio.get_running_loop()
+        self._pipeline = base.handle_pipeline(handle)
+        self._pending = {}  # waiter -> future
+        self._notifications = asyncio.Queue(_NOTIFICATIONS_QUEUE_SIZE)
+        self._pipeline.fed = True
+        self._loop.add_reader(int(handle), self._read)
+
+    @classmethod
+    def open_path(cls, path, loop=None):
+        """Open a Linux device path, returns a connection or ``None``."""
+        handle = base.open_path(path)
+        if handle:
+            return cls(handle, loop)
+
+    def _read(self):
+        try:
+            reply = base.read(self.handle, 0)
+        except exceptions.NoReceiver:
+            logger.warning("(%s) read failed, closing connection", self.handle)
+            self.close()
+            return
+        if reply:
+            self._pipeline.dispatch(*reply, self._notification)
+            for waiter, future in self._pending.items():
+                if waiter.reply is not None and not future.done():
+                    future.set_result(waiter.reply)
+
+    def _notification(self, n):
+        try:
+            self._notifications.put_nowait(n)
+        except asyncio.QueueFull:
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("(%s) dropping unprocessed %s", self.handle, n)
+
+    async def _wait(self, devnumber, request_data, long_message, match, timeout):
+        # the write blocks, so it is made in the default executor
+        waiter = await self._loop.run_in_executor(
+            None, self._pipeline.submit, self.handle, devnumber, request_data, long_message, match, None, True, timeout
+        )
+        if waiter is None:  # the key stayed in flight on another descriptor
+            return None, None
+        future = self._loop.create_future()
+        self._pending[waiter] = future
+        if waiter.reply is not None:  # read while the request was being written
+            future.set_result(waiter.reply)
+        try:
+            return waiter, await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return waiter, None
+        finally:
+            del self._pending[waiter]
+            self._pipeline.discard(waiter)
+
+    async def request(self, devnumber, request_id, *params, return_error=False, long_message=False, protocol=1.0):
+        """Makes a feature call to a device and waits for a matching reply, see base.request."""
+        request_id, params, request_data, timeout, match = base._prepare_request(
+            self._pipeline, devnumber, request_id, params, protocol
+        )
+        waiter, reply = await self._wait(devnumber, request_data, long_message, match, timeout)
+        if reply:
+            return base._request_reply(self.handle, devnumber, request_id, params, reply, return_error)
+        if waiter:
+            base._request_timeout(devnumber, request_id, params, waiter, timeout)
+
+    async def ping(self, devnumber, long_message=False):
+        """Check if a device is connected, see base.ping."""
+        request_id, request_data, match = base._prepare_ping(self._pipeline, devnumber)
+        waiter, reply = await self._wait(devnumber, request_data, long_message, match, base._PING_TIMEOUT)
+        if reply:
+            return base._ping_reply(self.handle, devnumber, request_id, reply)
+        if waiter:
+            logger.warning("(%s) timeout (%0.2f) on device %d ping", self.handle, base._PING_TIMEOUT, devnumber)
+
+    async def notifications(self):
+        """Iterate over the notifications from the handle until the connection is closed."""
+        while True:
+            n = await self._notifications.get()
+            if n is None:
+                return
+            yield n
+
+    def close(self):
+        if self.handle is not None:
+            handle, self.handle = self.handle, None
+            self._loop.remove_reader(int(handle))
+            self._pipeline.fed = False
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(exceptions.NoReceiver(reason="connection closed"))
+            try:
+                self._notifications.put_nowait(None)  # end any iteration over notifications
+            except asyncio.QueueFull:
+                self._notifications.get_nowait()
+                self._notifications.put_nowait(None)
+            base.close(handle)
+
+    def __bool__(self):
+        return self.handle is not None
+
+    __nonzero__ = __bool__
+
+
+class AsyncDevice:
+    """Async access to a Device through the connection to its handle (or its receiver's handle).
+
+    Settings are read and written in the default executor, as their code makes blocking requests.
+    """
+
+    def __init__(self, device, connection):
+        assert device is not None
+        assert connection is not None
+        self.device = device
+        self.connection = connection
+
+    async def ping(self):
+        """Checks if the device is online, returns True or False."""
+        protocol = await self.connection.ping(self.device.number, long_message=self.device.long_message)
+        self.device.online = protocol is not None
+        if protocol:
+            self.device._protocol = protocol
+        return self.device.online
+
+    async def protocol(self):
+        if not self.device._protocol:
+            await self.ping()
+        return self.device._protocol or 0
+
+    async def request(self, request_id, *params):
+        protocol = await self.protocol()
+        return await self.connection.request(
+            self.device.number, request_id, *params, long_message=self.device.long_message, protocol=protocol
+        )
+
+    async def feature_index(self, feature):
+        """The index of a feature on the device, looking it up without blocking if it is not known yet."""
+        features = self.device.features
+        if features is None:
+            return None
+        index = dict.get(features, feature)
+        if index is None and self.device.online:
+            response = await self.request(0x0000, _pack("!H", feature))
+            if response:
+                index = response[0]
+                features[feature] = index if index else False
+                features.version[feature] = response[2]
+        return index
+
+    async def feature_request(self, feature, function=0x00, *params):
+        if await self.protocol() >= 2.0:
+            feature_index = await self.feature_index(feature)
+            if feature_index:
+                return await self.request((feature_index << 8) + (function & 0xFF), *params)
+
+    def _setting(self, name):
+        return next((s for s in self.device.settings if s.name == name), None)
+
+    def _read_setting(self, name, cached):
+        setting = self._setting(name)
+        return setting.read(cached) if setting else None
+
+    def _write_setting(self, name, value, save):
+        setting = self._setting(name)
+        return setting.write(value, save) if setting else None
+
+    async def read_setting(self, name, cached=True):
+        """The value of the named setting, or ``None`` if the device does not have it."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._read_setting, name, cached)
+
+    async def write_setting(self, name, value, save=True):
+        """Write a value to the named setting, returns the value written or ``None``."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._write_setting, name, value, save)
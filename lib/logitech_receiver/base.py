@@ -22,8 +22,8 @@ from __future__ import annotations
 import logging
 import threading as _threading
 
-from collections import namedtuple
-from contextlib import contextmanager
+from collections import deque
+from random import choice as _random_choice
 from random import getrandbits as _random_bits
 from struct import pack as _pack
 from time import time as _timestamp
@@ -34,6 +34,7 @@ from . import exceptions
 from . import hidpp10_constants as _hidpp10_constants
 from . import hidpp20
 from . import hidpp20_constants as _hidpp20_constants
+from . import trace as _trace
 from .base_usb import ALL as _RECEIVER_USB_IDS
 from .common import strhex as _strhex
 from .descriptors import DEVICES as _DEVICES
@@ -115,6 +116,9 @@ _RECEIVER_REQUEST_TIMEOUT = 0.9
 _DEVICE_REQUEST_TIMEOUT = DEFAULT_TIMEOUT
 # when pinging, be extra patient (no longer)
 _PING_TIMEOUT = DEFAULT_TIMEOUT
+# how many requests of a batch to keep in flight at once, devices only have a small input queue
+# and there are only 8 SoftwareIds, so leave some for requests made by other threads
+_BATCH_WINDOW = 4
 
 #
 #
@@ -185,7 +189,10 @@ def open_path(path):
     :returns: an open receiver handle if this is the right Linux device, or
     ``None``.
     """
-    return _hid.open_path(path)
+    handle = _hid.open_path(path)
+    if handle:
+        _trace.label(handle, path)
+    return handle
 
 
 def open():
@@ -204,6 +211,7 @@ def close(handle):
     if handle:
         try:
             if isinstance(handle, int):
+                _forget_pipeline(handle)
                 _hid.close(handle)
             else:
                 handle.close()
@@ -269,7 +277,7 @@ def read(handle, timeout=DEFAULT_TIMEOUT):
 # sanity checks on  message report id and size
 def check_message(data):
     assert isinstance(data, bytes), (repr(data), type(data))
-    report_id = ord(data[:1])
+    report_id = data[0]
     if report_id in report_lengths:  # is this an HID++ or DJ message?
         if report_lengths.get(report_id) == len(data):
             return True
@@ -296,13 +304,11 @@ def _read(handle, timeout):
         close(handle)
         raise exceptions.NoReceiver(reason=reason) from reason
 
-    if data and check_message(data):  # ignore messages that fail check
-        report_id = ord(data[:1])
-        devnumber = ord(data[1:2])
+    if data and (report_lengths.get(data[0]) == len(data) or check_message(data)):  # ignore messages that fail check
+        report_id = data[0]
+        devnumber = data[1]
 
-        if logger.isEnabledFor(logging.DEBUG) and (
-            report_id != DJ_MESSAGE_ID or ord(data[2:3]) > 0x10
-        ):  # ignore DJ input messages
+        if logger.isEnabledFor(logging.DEBUG) and (report_id != DJ_MESSAGE_ID or data[2] > 0x10):  # ignore DJ input messages
             logger.debug("(%s) => r[%02X %02X %s %s]", handle, report_id, devnumber, _strhex(data[2:4]), _strhex(data[4:]))
 
         return report_id, devnumber, data[2:]
@@ -313,12 +319,13 @@ def _read(handle, timeout):
 #
 
 
-def _skip_incoming(handle, ihandle, notifications_hook):
+def _skip_incoming(handle, ihandle, notifications_hook, pipeline=None):
     """Read anything already in the input buffer.
 
-    Used by request() and ping() before their write.
+    Used by request() and ping() before their write. Replies to requests still
+    in flight on the handle are handed over to them, the pipeline must be
+    drained through _RequestPipeline.drain() so that no other thread is reading.
     """
-
     while True:
         try:
             # read whatever is already in the buffer, if any
@@ -329,10 +336,11 @@ def _skip_incoming(handle, ihandle, notifications_hook):
             raise exceptions.NoReceiver(reason=reason) from reason
 
         if data:
-            if check_message(data):  # only process messages that pass check
-                # report_id = ord(data[:1])
-                if notifications_hook:
-                    n = make_notification(ord(data[:1]), ord(data[1:2]), data[2:])
+            if report_lengths.get(data[0]) == len(data) or check_message(data):  # only process messages that pass check
+                if pipeline is not None:
+                    pipeline.dispatch(data[0], data[1], data[2:], notifications_hook)
+                elif notifications_hook:
+                    n = make_notification(data[0], data[1], data[2:])
                     if n:
                         notifications_hook(n)
         else:
@@ -342,9 +350,9 @@ def _skip_incoming(handle, ihandle, notifications_hook):
 
 def make_notification(report_id, devnumber, data):
     """Guess if this is a notification (and not just a request reply), and
-    return a Notification tuple if it is."""
+    return a Notification if it is."""
 
-    sub_id = ord(data[:1])
+    sub_id = data[0]
     if sub_id & 0x80 == 0x80:
         # this is either a HID++1.0 register r/w, or an error reply
         return
@@ -353,7 +361,7 @@ def make_notification(report_id, devnumber, data):
     if report_id == DJ_MESSAGE_ID and (sub_id < 0x10):
         return
 
-    address = ord(data[1:2])
+    address = data[1]
     if sub_id == 0x00 and (address & 0x0F == 0x00):
         # this is a no-op notification - don't do anything with it
         return
@@ -363,7 +371,7 @@ def make_notification(report_id, devnumber, data):
         (sub_id >= 0x40)  # noqa: E131
         or
         # custom HID++1.0 battery events, where SubId is 0x07/0x0D
-        (sub_id in (0x07, 0x0D) and len(data) == 5 and data[4:5] == b"\x00")
+        (sub_id in (0x07, 0x0D) and len(data) == 5 and data[4] == 0x00)
         or
         # custom HID++1.0 illumination event, where SubId is 0x17
         (sub_id == 0x17 and len(data) == 5)
@@ -374,48 +382,357 @@ def make_notification(report_id, devnumber, data):
         return _HIDPP_Notification(report_id, devnumber, sub_id, address, data[2:])
 
 
-_HIDPP_Notification = namedtuple("_HIDPP_Notification", ("report_id", "devnumber", "sub_id", "address", "data"))
-_HIDPP_Notification.__str__ = lambda self: "Notification(%02x,%d,%02X,%02X,%s)" % (
-    self.report_id,
-    self.devnumber,
-    self.sub_id,
-    self.address,
-    _strhex(self.data),
-)
+class _HIDPP_Notification:
+    """A notification from a device; data is the payload after the sub id and address bytes."""
+
+    __slots__ = ("report_id", "devnumber", "sub_id", "address", "data")
+
+    def __init__(self, report_id, devnumber, sub_id, address, data):
+        self.report_id = report_id
+        self.devnumber = devnumber
+        self.sub_id = sub_id
+        self.address = address
+        self.data = data
+
+    def __str__(self):
+        return "Notification(%02x,%d,%02X,%02X,%s)" % (
+            self.report_id,
+            self.devnumber,
+            self.sub_id,
+            self.address,
+            _strhex(self.data),
+        )
+
+    __repr__ = __str__
+
 
 #
 #
 #
 
-request_lock = _threading.Lock()  # serialize all requests
-handles_lock = {}
 
+class _Waiter:
+    """A request in flight, waiting for its reply."""
 
-def handle_lock(handle):
-    with request_lock:
-        if handles_lock.get(handle) is None:
-            if logger.isEnabledFor(logging.INFO):
-                logger.info("New lock %s", repr(handle))
-            handles_lock[handle] = _threading.Lock()  # Serialize requests on the handle
-    return handles_lock[handle]
+    __slots__ = ("key", "match", "started", "reply")
 
+    def __init__(self, key, match=None):
+        self.key = key
+        self.match = match  # extra check on the reply data, error replies included, for replies that need more than the id
+        self.started = None
+        self.reply = None
 
-# context manager for locks with a timeout
-@contextmanager
-def acquire_timeout(lock, handle, timeout):
-    result = lock.acquire(timeout=timeout)
-    try:
-        if not result:
-            logger.error("lock on handle %d not acquired, probably due to timeout", int(handle))
-        yield result
-    finally:
-        if result:
-            lock.release()
+
+class _RequestKeys:
+    """The request keys in flight on all the open file descriptors of one device path.
+
+    Every open hidraw file descriptor gets its own copy of every packet, so the replies to
+    requests made through one descriptor also turn up on all the others. A key is only in
+    flight on one descriptor at a time, so that these copies never match another request.
+    """
+
+    def __init__(self):
+        self._cond = _threading.Condition()
+        self._owners = {}  # key -> [pipeline, number of its requests with the key]
+
+    def free(self, key):
+        return key not in self._owners
+
+    def reserve(self, key, pipeline, block=True, timeout=None):
+        """Take a key for a request of the pipeline, waiting until no other pipeline has it in flight.
+        :returns: ``False`` if the key is in flight on another descriptor and block is false or
+        it still is after timeout seconds.
+        """
+        deadline = None if timeout is None else _timestamp() + timeout
+        with self._cond:
+            while self._owners.get(key, (pipeline,))[0] is not pipeline:
+                remaining = None if deadline is None else deadline - _timestamp()
+                if not block or (remaining is not None and remaining <= 0):
+                    return False
+                self._cond.wait(remaining)
+            self._owners.setdefault(key, [pipeline, 0])[1] += 1
+        return True
+
+    def release(self, key):
+        with self._cond:
+            owner = self._owners[key]
+            owner[1] -= 1
+            if not owner[1]:
+                del self._owners[key]
+                self._cond.notify_all()
+
+
+class _RequestPipeline:
+    """All the requests in flight on one open file descriptor.
+
+    Every open hidraw file descriptor gets its own copy of every packet, so each descriptor
+    has its own pipeline (a _ThreadedHandle has one descriptor for each thread) and the
+    pipelines of a device path share their request keys so that only one of them is waiting
+    for the replies with a key.
+    Several threads can have requests outstanding on the same descriptor. Whichever
+    waiting thread gets there first reads from the handle and hands each reply to
+    the request it answers, and anything else to the notifications hook. The other
+    threads sleep until their reply has been delivered or it is their turn to read.
+    Replies are matched on device number and the first two bytes of the request
+    (SubId/feature index and address/function + SoftwareId); requests that share
+    these get their replies in the order they were sent.
+    When the pipeline is fed, another thread (an EventsHub) does all the reading
+    on the handle and passes every packet to dispatch().
+    """
+
+    def __init__(self, keys=None):
+        self._cond = _threading.Condition()
+        self._waiters = {}  # (devnumber, request id bytes) -> waiters, oldest first
+        self._shared = keys is not None  # other descriptors get copies of the replies
+        self._keys = keys or _RequestKeys()
+        self._reading = False
+        self._drains = 0  # threads waiting to read what is already in the input buffer
+        self.fed = False
+
+    def software_id(self, devnumber, request_id):
+        """Set a random SoftwareId in a request id, preferring one not already in flight to the device."""
+        free = [bits for bits in range(8) if self._keys.free((devnumber, _pack("!H", (request_id & 0xFFF0) | 0x08 | bits)))]
+        return (request_id & 0xFFF0) | 0x08 | (_random_choice(free) if free else _random_bits(3))
+
+    def submit(
+        self,
+        handle,
+        devnumber,
+        request_data,
+        long_message=False,
+        match=None,
+        notifications_hook=None,
+        block=True,
+        timeout=None,
+    ):
+        """Write a request to the handle and register it as waiting for a reply.
+        :returns: the waiter for the reply, or ``None`` if the request would have to wait for a
+        request with the same key on another descriptor and block is false or that takes more
+        than timeout seconds.
+        """
+        waiter = _Waiter((devnumber, request_data[:2]), match)
+        if not self._keys.reserve(waiter.key, self, block, timeout):
+            if block:
+                logger.warning(
+                    "(%s) timeout (%0.2f) on device %d request [%s] in flight on another descriptor",
+                    handle,
+                    timeout,
+                    devnumber,
+                    _strhex(request_data[:2]),
+                )
+            return None
+        try:
+            if self._shared:  # copies of replies to earlier requests with the key are in the buffer by now
+                self.drain(handle, notifications_hook)
+            with self._cond:
+                self._waiters.setdefault(waiter.key, []).append(waiter)
+            if _trace.active:
+                _trace.count_request(handle, devnumber)
+            write(int(handle), devnumber, request_data, long_message)
+        except Exception:
+            self.discard(waiter)
+            raise
+        waiter.started = _timestamp()  # we consider timeout from this point
+        return waiter
+
+    def wait(self, handle, waiter, timeout, notifications_hook=None):
+        """Wait for the reply to a submitted request, reading from the handle when no other thread is.
+
+        :returns: a tuple of (report_id, reply data), or ``None`` on timeout.
+        """
+        try:
+            with self._cond:
+                while waiter.reply is None:
+                    remaining = waiter.started + timeout - _timestamp()
+                    if remaining <= 0:
+                        break
+                    if self._reading or self.fed or self._drains:
+                        self._cond.wait(remaining)
+                        continue
+                    self._reading = True
+                    self._cond.release()
+                    try:
+                        reply = _read(handle, remaining)
+                    finally:
+                        self._cond.acquire()
+                        self._reading = False
+                        self._cond.notify_all()
+                    if reply:
+                        self._deliver(*reply, notifications_hook)
+                return waiter.reply
+        finally:
+            self.discard(waiter)
+
+    def drain(self, handle, notifications_hook=None, block=True):
+        """Read what is already in the input buffer of the handle, as the only thread reading from it.
+        If another thread is reading, wait for it to stop, or leave the buffer to it if block is false.
+        """
+        with self._cond:
+            if self.fed or (self._reading and not block):
+                return  # someone else is reading from the handle
+            self._drains += 1
+            try:
+                while self._reading:
+                    self._cond.wait()
+            finally:
+                self._drains -= 1
+            self._reading = True
+        try:
+            _skip_incoming(handle, int(handle), notifications_hook, self)
+        finally:
+            with self._cond:
+                self._reading = False
+                self._cond.notify_all()
+
+    def dispatch(self, report_id, devnumber, data, notifications_hook=None):
+        """Hand an incoming packet to the request it answers, or to the notifications hook."""
+        with self._cond:
+            self._deliver(report_id, devnumber, data, notifications_hook)
+
+    def _deliver(self, report_id, devnumber, data, notifications_hook):
+        if self._route(report_id, devnumber, data):
+            self._cond.notify_all()
+        elif notifications_hook:
+            n = make_notification(report_id, devnumber, data)
+            if n:
+                notifications_hook(n)
+            # elif logger.isEnabledFor(logging.DEBUG):
+            #     logger.debug("(%s) ignoring reply %02X [%s]", handle, devnumber, _strhex(data))
+
+    def _route(self, report_id, devnumber, data):
+        if data[:1] == b"\xFF" or (report_id == HIDPP_SHORT_MESSAGE_ID and data[:1] == b"\x8F"):
+            request_key = data[1:3]  # error replies echo the request after the error marker
+        else:
+            request_key = data[:2]
+        for number in (devnumber, devnumber ^ 0xFF):  # BT device returning 0x00
+            for waiter in self._waiters.get((number, request_key), ()):
+                if waiter.reply is None and (waiter.match is None or waiter.match(data)):
+                    waiter.reply = (report_id, data)
+                    return True
+        return False
+
+    def discard(self, waiter):
+        """Forget about a request that is no longer waiting for its reply."""
+        with self._cond:
+            if waiter.key is None:
+                return
+            waiters = self._waiters.get(waiter.key)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[waiter.key]
+            key, waiter.key = waiter.key, None
+        self._keys.release(key)
+
+
+pipelines_lock = _threading.Lock()
+handles_pipeline = {}  # file descriptor -> pipeline
+paths_keys = {}  # device path -> request keys of all its descriptors
+
+
+def handle_pipeline(handle):
+    """The request pipeline of the file descriptor that the current thread uses for the handle."""
+    fd = int(handle)
+    path = getattr(handle, "path", None)
+    with pipelines_lock:
+        pipeline = handles_pipeline.get(fd)
+        keys = paths_keys.setdefault(path, _RequestKeys()) if path else None
+        if pipeline is None or (keys and pipeline._keys is not keys):  # new descriptor, or a reused number
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("New request pipeline %s (%d)", repr(handle), fd)
+            pipeline = handles_pipeline[fd] = _RequestPipeline(keys)  # Track requests in flight on the descriptor
+    return pipeline
+
+
+def _forget_pipeline(fd):
+    """Drop the pipeline of a closed file descriptor, and the request keys of its path with the last one."""
+    with pipelines_lock:
+        pipeline = handles_pipeline.pop(fd, None)
+        if pipeline is not None and pipeline._shared:
+            if not any(p._keys is pipeline._keys for p in handles_pipeline.values()):
+                for path in [path for path, keys in paths_keys.items() if keys is pipeline._keys]:
+                    del paths_keys[path]
+
+
+def _prepare_request(pipeline, devnumber, request_id, params, protocol):
+    """Build the packet data for a request, its reply timeout and any extra check on its reply."""
+    assert isinstance(request_id, int)
+    if (devnumber != 0xFF or protocol >= 2.0) and request_id < 0x8000:
+        # For HID++ 2.0 feature requests, randomize the SoftwareId to make it
+        # easier to recognize the reply for this request. also, always set the
+        # most significant bit (8) in SoftwareId, to make notifications easier
+        # to distinguish from request replies.
+        # This only applies to peripheral requests, ofc.
+        request_id = pipeline.software_id(devnumber, request_id)
+
+    timeout = _RECEIVER_REQUEST_TIMEOUT if devnumber == 0xFF else _DEVICE_REQUEST_TIMEOUT
+    # be extra patient on long register read
+    if request_id & 0xFF00 == 0x8300:
+        timeout *= 2
+
+    if params:
+        params = b"".join(_pack("B", p) if isinstance(p, int) else p for p in params)
+    else:
+        params = b""
+    # if logger.isEnabledFor(logging.DEBUG):
+    #     logger.debug("device %d request_id {%04X} params [%s]", devnumber, request_id, _strhex(params))
+    request_data = _pack("!H", request_id) + params
+
+    match = None
+    if devnumber == 0xFF and (request_id == 0x83B5 or request_id == 0x81F1):
+        # these replies have to match the first parameter as well
+        def match(reply_data):
+            return reply_data[:1] == b"\x8F" or reply_data[2:3] == params[:1]
+
+    return request_id, params, request_data, timeout, match
+
+
+def _request_reply(handle, devnumber, request_id, params, reply, return_error=False):
+    """Turn the reply to a request into its result, raising FeatureCallError on HID++ 2.0 errors."""
+    report_id, reply_data = reply
+    if report_id == HIDPP_SHORT_MESSAGE_ID and reply_data[:1] == b"\x8F":
+        error = ord(reply_data[3:4])
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "(%s) device 0x%02X error on request {%04X}: %d = %s",
+                handle,
+                devnumber,
+                request_id,
+                error,
+                _hidpp10_constants.ERROR[error],
+            )
+        return _hidpp10_constants.ERROR[error] if return_error else None
+    if reply_data[:1] == b"\xFF":
+        # a HID++ 2.0 feature call returned with an error
+        error = ord(reply_data[3:4])
+        logger.error(
+            "(%s) device %d error on feature request {%04X}: %d = %s",
+            handle,
+            devnumber,
+            request_id,
+            error,
+            _hidpp20_constants.ERROR[error],
+        )
+        raise exceptions.FeatureCallError(number=devnumber, request=request_id, error=error, params=params)
+    return reply_data[2:]
+
+
+def _request_timeout(devnumber, request_id, params, waiter, timeout):
+    logger.warning(
+        "timeout (%0.2f/%0.2f) on device %d request {%04X} params [%s]",
+        _timestamp() - waiter.started,
+        timeout,
+        devnumber,
+        request_id,
+        _strhex(params),
+    )
+    # raise DeviceUnreachable(number=devnumber, request=request_id)
 
 
 # a very few requests (e.g., host switching) do not expect a reply, but use no_reply=True with extreme caution
 def request(handle, devnumber, request_id, *params, no_reply=False, return_error=False, long_message=False, protocol=1.0):
     """Makes a feature call to a device and waits for a matching reply.
+    Other threads can make requests on the same handle while this one is waiting.
     :param handle: an open UR handle.
     :param devnumber: attached device number.
     :param request_id: a 16-bit integer.
@@ -426,121 +743,119 @@ def request(handle, devnumber, request_id, *params, no_reply=False, return_error
     # import inspect as _inspect
     # print ('\n  '.join(str(s) for s in _inspect.stack()))
 
-    with acquire_timeout(handle_lock(handle), handle, 10.0):
-        assert isinstance(request_id, int)
-        if (devnumber != 0xFF or protocol >= 2.0) and request_id < 0x8000:
-            # For HID++ 2.0 feature requests, randomize the SoftwareId to make it
-            # easier to recognize the reply for this request. also, always set the
-            # most significant bit (8) in SoftwareId, to make notifications easier
-            # to distinguish from request replies.
-            # This only applies to peripheral requests, ofc.
-            request_id = (request_id & 0xFFF0) | 0x08 | _random_bits(3)
-
-        timeout = _RECEIVER_REQUEST_TIMEOUT if devnumber == 0xFF else _DEVICE_REQUEST_TIMEOUT
-        # be extra patient on long register read
-        if request_id & 0xFF00 == 0x8300:
-            timeout *= 2
-
-        if params:
-            params = b"".join(_pack("B", p) if isinstance(p, int) else p for p in params)
+    pipeline = handle_pipeline(handle)
+    request_id, params, request_data, timeout, match = _prepare_request(pipeline, devnumber, request_id, params, protocol)
+
+    notifications_hook = getattr(handle, "notifications_hook", None)
+    try:
+        pipeline.drain(handle, notifications_hook, block=False)
+    except exceptions.NoReceiver:
+        logger.warning("device or receiver disconnected")
+        return None
+
+    if no_reply:
+        write(int(handle), devnumber, request_data, long_message)
+        return None
+
+    waiter = pipeline.submit(handle, devnumber, request_data, long_message, match, notifications_hook, timeout=timeout)
+    if waiter is None:
+        return None
+    reply = pipeline.wait(handle, waiter, timeout, notifications_hook)
+    if reply:
+        return _request_reply(handle, devnumber, request_id, params, reply, return_error)
+    _request_timeout(devnumber, request_id, params, waiter, timeout)
+
+
+def requests(handle, devnumber, request_list, long_message=False, protocol=1.0):
+    """Makes several feature calls to a device, keeping up to _BATCH_WINDOW of them in flight at once.
+    :param handle: an open UR handle.
+    :param devnumber: attached device number.
+    :param request_list: a sequence of (request_id, *params) tuples.
+    :returns: a list with, in order, the reply data for each request, ``None`` if
+    some error occurred, or the FeatureCallError raised by the request.
+    """
+    pipeline = handle_pipeline(handle)
+    notifications_hook = getattr(handle, "notifications_hook", None)
+    results = [None] * len(request_list)
+    try:
+        pipeline.drain(handle, notifications_hook, block=False)
+    except exceptions.NoReceiver:
+        logger.warning("device or receiver disconnected")
+        return results
+
+    def complete(index, request_id, params, waiter, timeout):
+        reply = pipeline.wait(handle, waiter, timeout, notifications_hook)
+        if reply:
+            try:
+                results[index] = _request_reply(handle, devnumber, request_id, params, reply)
+            except exceptions.FeatureCallError as error:
+                results[index] = error
         else:
-            params = b""
-        # if logger.isEnabledFor(logging.DEBUG):
-        #     logger.debug("(%s) device %d request_id {%04X} params [%s]", handle, devnumber, request_id, _strhex(params))
-        request_data = _pack("!H", request_id) + params
+            _request_timeout(devnumber, request_id, params, waiter, timeout)
 
-        ihandle = int(handle)
-        notifications_hook = getattr(handle, "notifications_hook", None)
-        try:
-            _skip_incoming(handle, ihandle, notifications_hook)
-        except exceptions.NoReceiver:
-            logger.warning("device or receiver disconnected")
-            return None
-        write(ihandle, devnumber, request_data, long_message)
+    in_flight = deque()
+    try:
+        for index, (request_id, *params) in enumerate(request_list):
+            if len(in_flight) >= _BATCH_WINDOW:
+                complete(*in_flight.popleft())
+            request_id, params, request_data, timeout, match = _prepare_request(
+                pipeline, devnumber, request_id, params, protocol
+            )
+            while True:
+                # only wait for a key in flight on another descriptor when none of ours are in flight
+                waiter = pipeline.submit(
+                    handle, devnumber, request_data, long_message, match, notifications_hook, not in_flight, timeout
+                )
+                if waiter or not in_flight:
+                    break
+                complete(*in_flight.popleft())
+            if waiter:
+                in_flight.append((index, request_id, params, waiter, timeout))
+        while in_flight:
+            complete(*in_flight.popleft())
+    finally:
+        for _index, _request_id, _params, waiter, _timeout in in_flight:
+            pipeline.discard(waiter)
+    return results
 
-        if no_reply:
-            return None
 
-        # we consider timeout from this point
-        request_started = _timestamp()
-        delta = 0
-
-        while delta < timeout:
-            reply = _read(handle, timeout)
-
-            if reply:
-                report_id, reply_devnumber, reply_data = reply
-                if reply_devnumber == devnumber or reply_devnumber == devnumber ^ 0xFF:  # BT device returning 0x00
-                    if (
-                        report_id == HIDPP_SHORT_MESSAGE_ID
-                        and reply_data[:1] == b"\x8F"
-                        and reply_data[1:3] == request_data[:2]
-                    ):
-                        error = ord(reply_data[3:4])
-
-                        if logger.isEnabledFor(logging.DEBUG):
-                            logger.debug(
-                                "(%s) device 0x%02X error on request {%04X}: %d = %s",
-                                handle,
-                                devnumber,
-                                request_id,
-                                error,
-                                _hidpp10_constants.ERROR[error],
-                            )
-                        return _hidpp10_constants.ERROR[error] if return_error else None
-                    if reply_data[:1] == b"\xFF" and reply_data[1:3] == request_data[:2]:
-                        # a HID++ 2.0 feature call returned with an error
-                        error = ord(reply_data[3:4])
-                        logger.error(
-                            "(%s) device %d error on feature request {%04X}: %d = %s",
-                            handle,
-                            devnumber,
-                            request_id,
-                            error,
-                            _hidpp20_constants.ERROR[error],
-                        )
-                        raise exceptions.FeatureCallError(number=devnumber, request=request_id, error=error, params=params)
-
-                    if reply_data[:2] == request_data[:2]:
-                        if devnumber == 0xFF:
-                            if request_id == 0x83B5 or request_id == 0x81F1:
-                                # these replies have to match the first parameter as well
-                                if reply_data[2:3] == params[:1]:
-                                    return reply_data[2:]
-                                else:
-                                    # hm, not matching my request, and certainly not a notification
-                                    continue
-                            else:
-                                return reply_data[2:]
-                        else:
-                            return reply_data[2:]
-                else:
-                    # a reply was received, but did not match our request in any way
-                    # reset the timeout starting point
-                    request_started = _timestamp()
-
-                if notifications_hook:
-                    n = make_notification(report_id, reply_devnumber, reply_data)
-                    if n:
-                        notifications_hook(n)
-                    # elif logger.isEnabledFor(logging.DEBUG):
-                    #     logger.debug("(%s) ignoring reply %02X [%s]", handle, reply_devnumber, _strhex(reply_data))
-                # elif logger.isEnabledFor(logging.DEBUG):
-                #     logger.debug("(%s) ignoring reply %02X [%s]", handle, reply_devnumber, _strhex(reply_data))
-
-            delta = _timestamp() - request_started
-            # if logger.isEnabledFor(logging.DEBUG):
-            #     logger.debug("(%s) still waiting for reply, delta %f", handle, delta)
-
-        logger.warning(
-            "timeout (%0.2f/%0.2f) on device %d request {%04X} params [%s]",
-            delta,
-            timeout,
-            devnumber,
-            request_id,
-            _strhex(params),
-        )
-        # raise DeviceUnreachable(number=devnumber, request=request_id)
+_PING_ERRORS = (
+    _hidpp10_constants.ERROR.invalid_SubID__command,  # a valid reply from a HID++ 1.0 device
+    _hidpp10_constants.ERROR.resource_error,  # device unreachable
+    _hidpp10_constants.ERROR.connection_request_failed,  # device unreachable
+    _hidpp10_constants.ERROR.unknown_device,  # no paired device with that number
+)
+
+
+def _prepare_ping(pipeline, devnumber):
+    """Build the packet data for a ping and the check on its reply."""
+    # randomize the SoftwareId and mark byte to be able to identify the ping
+    # reply, and set most significant (0x8) bit in SoftwareId so that the reply
+    # is always distinguishable from notifications
+    request_id = pipeline.software_id(devnumber, 0x0010)
+    request_data = _pack("!HBBB", request_id, 0, 0, _random_bits(8))
+
+    def match(reply_data):
+        if reply_data[:1] == b"\x8F":  # only the errors that answer a ping, keep waiting after any other
+            return ord(reply_data[3:4]) in _PING_ERRORS
+        return reply_data[:1] != b"\xFF" and reply_data[4:5] == request_data[-1:]
+
+    return request_id, request_data, match
+
+
+def _ping_reply(handle, devnumber, request_id, reply):
+    """Turn the reply to a ping into the protocol version, raising NoSuchDevice if there is no such device."""
+    report_id, reply_data = reply
+    if report_id == HIDPP_SHORT_MESSAGE_ID and reply_data[:1] == b"\x8F":  # error response
+        error = ord(reply_data[3:4])
+        if error == _hidpp10_constants.ERROR.invalid_SubID__command:  # a valid reply from a HID++ 1.0 device
+            return 1.0
+        if error == _hidpp10_constants.ERROR.unknown_device:  # no paired device with that number
+            logger.error("(%s) device %d error on ping request: unknown device", handle, devnumber)
+            raise exceptions.NoSuchDevice(number=devnumber, request=request_id)
+        return  # device unreachable
+    # HID++ 2.0+ device, currently connected
+    return ord(reply_data[2:3]) + ord(reply_data[3:4]) / 10.0
 
 
 def ping(handle, devnumber, long_message=False):
@@ -549,56 +864,21 @@ def ping(handle, devnumber, long_message=False):
     """
     if logger.isEnabledFor(logging.DEBUG):
         logger.debug("(%s) pinging device %d", handle, devnumber)
-    with acquire_timeout(handle_lock(handle), handle, 10.0):
-        notifications_hook = getattr(handle, "notifications_hook", None)
-        try:
-            _skip_incoming(handle, int(handle), notifications_hook)
-        except exceptions.NoReceiver:
-            logger.warning("device or receiver disconnected")
-            return
-
-        # randomize the SoftwareId and mark byte to be able to identify the ping
-        # reply, and set most significant (0x8) bit in SoftwareId so that the reply
-        # is always distinguishable from notifications
-        request_id = 0x0018 | _random_bits(3)
-        request_data = _pack("!HBBB", request_id, 0, 0, _random_bits(8))
-        write(int(handle), devnumber, request_data, long_message)
-
-        request_started = _timestamp()  # we consider timeout from this point
-        delta = 0
-        while delta < _PING_TIMEOUT:
-            reply = _read(handle, _PING_TIMEOUT)
-            if reply:
-                report_id, reply_devnumber, reply_data = reply
-                if reply_devnumber == devnumber or reply_devnumber == devnumber ^ 0xFF:  # BT device returning 0x00
-                    if reply_data[:2] == request_data[:2] and reply_data[4:5] == request_data[-1:]:
-                        # HID++ 2.0+ device, currently connected
-                        return ord(reply_data[2:3]) + ord(reply_data[3:4]) / 10.0
-
-                    if (
-                        report_id == HIDPP_SHORT_MESSAGE_ID
-                        and reply_data[:1] == b"\x8F"
-                        and reply_data[1:3] == request_data[:2]
-                    ):  # error response
-                        error = ord(reply_data[3:4])
-                        if error == _hidpp10_constants.ERROR.invalid_SubID__command:  # a valid reply from a HID++ 1.0 device
-                            return 1.0
-                        if (
-                            error == _hidpp10_constants.ERROR.resource_error
-                            or error == _hidpp10_constants.ERROR.connection_request_failed
-                        ):
-                            return  # device unreachable
-                        if error == _hidpp10_constants.ERROR.unknown_device:  # no paired device with that number
-                            logger.error("(%s) device %d error on ping request: unknown device", handle, devnumber)
-                            raise exceptions.NoSuchDevice(number=devnumber, request=request_id)
-
-                if notifications_hook:
-                    n = make_notification(report_id, reply_devnumber, reply_data)
-                    if n:
-                        notifications_hook(n)
-                    # elif logger.isEnabledFor(logging.DEBUG):
-                    #     logger.debug("(%s) ignoring reply %02X [%s]", handle, reply_devnumber, _strhex(reply_data))
+    pipeline = handle_pipeline(handle)
+    notifications_hook = getattr(handle, "notifications_hook", None)
+    try:
+        pipeline.drain(handle, notifications_hook, block=False)
+    except exceptions.NoReceiver:
+        logger.warning("device or receiver disconnected")
+        return
 
-            delta = _timestamp() - request_started
+    request_id, request_data, match = _prepare_ping(pipeline, devnumber)
+    waiter = pipeline.submit(handle, devnumber, request_data, long_message, match, notifications_hook, timeout=_PING_TIMEOUT)
+    if waiter is None:
+        return
+    reply = pipeline.wait(handle, waiter, _PING_TIMEOUT, notifications_hook)
+    if reply:
+        return _ping_reply(handle, devnumber, request_id, reply)
 
-        logger.warning("(%s) timeout (%0.2f/%0.2f) on device %d ping", handle, delta, _PING_TIMEOUT, devnumber)
+    delta = _timestamp() - waiter.started
+    logger.warning("(%s) timeout (%0.2f/%0.2f) on device %d ping", handle, delta, _PING_TIMEOUT, devnumber)
@@ -0,0 +1,144 @@
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Capability snapshots - the replies to the feature calls that describe what a device can do
+# (its keys, gestures, LED zones, onboard profile format) only depend on the model and firmware,
+# so they are kept in a small binary cache file and reused instead of being read each run.
+
+import logging
+import os as _os
+import threading as _threading
+
+from struct import Struct as _Struct
+from struct import pack as _pack
+
+logger = logging.getLogger(__name__)
+
+_XDG_CACHE_HOME = _os.environ.get("XDG_CACHE_HOME") or _os.path.expanduser(_os.path.join("~", ".cache"))
+_file_path = _os.path.join(_XDG_CACHE_HOME, "solaar", "capabilities")
+
+_MAGIC = b"SLRC"
+_VERSION = 1  # change when the format or the meaning of the stored replies changes
+_HEADER = _Struct("!4sBH")  # magic, version, number of snapshots
+_SNAPSHOT = _Struct("!HH")  # key length, number of replies
+_REPLY = _Struct("!BB")  # request length, reply length
+
+_snapshots = None  # snapshot key -> Snapshot
+_lock = _threading.Lock()
+
+
+def request_key(feature, function, params):
+    """The bytes that identify a feature call, as (feature, function, *params) would be sent."""
+    data = b"".join(_pack("B", p) if isinstance(p, int) else bytes(p) for p in params)
+    return _pack("!HB", int(feature), function & 0xFF) + data
+
+
+class Snapshot(dict):
+    """The replies to the static feature calls of one device model and firmware, by request key."""
+
+    def __init__(self, replies=None):
+        super().__init__(replies or {})
+        self.dirty = False
+
+    def get_reply(self, feature, function, params):
+        return self.get(request_key(feature, function, params))
+
+    def set_reply(self, feature, function, params, reply):
+        key = request_key(feature, function, params)
+        reply = bytes(reply)
+        with _lock:  # save() can be dumping the snapshot
+            if self.get(key) != reply:
+                self[key] = reply
+                self.dirty = True
+
+
+def dumps(snapshots):
+    chunks = [_HEADER.pack(_MAGIC, _VERSION, len(snapshots))]
+    for key, snapshot in snapshots.items():
+        key = key.encode("utf-8")
+        chunks.append(_SNAPSHOT.pack(len(key), len(snapshot)))
+        chunks.append(key)
+        for request, reply in snapshot.items():
+            chunks.append(_REPLY.pack(len(request), len(reply)))
+            chunks.append(request)
+            chunks.append(reply)
+    return b"".join(chunks)
+
+
+def loads(data):
+    """Parse a capability cache, returns {} if it is not in the current format."""
+    magic, version, count = _HEADER.unpack_from(data)
+    if magic != _MAGIC or version != _VERSION:
+        return {}
+    snapshots = {}
+    offset = _HEADER.size
+    for _i in range(count):
+        key_length, reply_count = _SNAPSHOT.unpack_from(data, offset)
+        offset += _SNAPSHOT.size
+        key = data[offset : offset + key_length].decode("utf-8")
+        offset += key_length
+        replies = {}
+        for _j in range(reply_count):
+            request_length, reply_length = _REPLY.unpack_from(data, offset)
+            offset += _REPLY.size
+            request = data[offset : offset + request_length]
+            offset += request_length
+            replies[request] = data[offset : offset + reply_length]
+            offset += reply_length
+        snapshots[key] = Snapshot(replies)
+    return snapshots
+
+
+def _load():
+    global _snapshots
+    _snapshots = {}
+    if _os.path.isfile(_file_path):
+        try:
+            with open(_file_path, "rb") as cache_file:
+                _snapshots = loads(cache_file.read())
+        except Exception as e:
+            logger.warning("failed to load capabilities from %s: %s", _file_path, e)
+            _snapshots = {}
+
+
+def snapshot(key):
+    """The capability snapshot for a device model and firmware, a new empty one if not cached yet."""
+    with _lock:
+        if _snapshots is None:
+            _load()
+        if key not in _snapshots:
+            _snapshots[key] = Snapshot()
+        return _snapshots[key]
+
+
+def save():
+    """Write the capability cache if any snapshot has new replies."""
+    with _lock:
+        if not _snapshots or not any(s.dirty for s in _snapshots.values()):
+            return
+        dirname = _os.path.dirname(_file_path)
+        try:
+            _os.makedirs(dirname, exist_ok=True)
+            temp_path = _file_path + ".tmp"
+            with open(temp_path, "wb") as cache_file:
+                cache_file.write(dumps({k: s for k, s in _snapshots.items() if s}))
+            _os.replace(temp_path, _file_path)
+            for s in _snapshots.values():
+                s.dirty = False
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("saved capabilities of %d devices to %s", len(_snapshots), _file_path)
+        except Exception as e:
+            logger.error("failed to save capabilities to %s: %s", _file_path, e)
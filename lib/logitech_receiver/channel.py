@@ -0,0 +1,145 @@
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Bounded channels for notifications and tasks, that keep count of what goes through them.
+
+import logging
+import threading as _threading
+import weakref as _weakref
+
+from collections import deque as _deque
+from time import monotonic as _monotonic
+
+logger = logging.getLogger(__name__)
+
+# What to do with a new item when the channel is full
+DROP_OLDEST = "drop-oldest"  # drop the oldest item to make room
+COALESCE = "coalesce"  # replace an older notification for the same feature and function, else drop the oldest
+BLOCK = "block"  # wait for room; items that cannot wait are dropped
+
+_channels = _weakref.WeakSet()
+
+
+class Empty(Exception):
+    pass
+
+
+def _coalesce_key(item):
+    try:
+        return item.devnumber, item.sub_id, item.address
+    except AttributeError:  # not a notification, never coalesced
+        return None
+
+
+class Channel:
+    """A bounded FIFO ring between producer threads and one consumer thread.
+
+    Items are kept in a deque with a condition variable to wake the consumer.
+    When the channel is full the overflow policy decides what is lost, and each
+    loss is counted, so nothing disappears without a trace.
+    """
+
+    def __init__(self, name, capacity, policy=DROP_OLDEST):
+        assert capacity > 0
+        assert policy in (DROP_OLDEST, COALESCE, BLOCK)
+        self.name = name
+        self.capacity = capacity
+        self.policy = policy
+        self._items = _deque()
+        self._cond = _threading.Condition()
+        self.enqueued = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+        _channels.add(self)
+
+    def put(self, item, block=True):
+        """Add an item, applying the overflow policy if the channel is full.
+        Only the block policy with block True waits. Returns False if the new item was dropped.
+        """
+        with self._cond:
+            if len(self._items) >= self.capacity:
+                if self.policy == BLOCK:
+                    if not block:
+                        self._drop(item)
+                        return False
+                    while len(self._items) >= self.capacity:
+                        self._cond.wait()
+                elif self.policy == COALESCE and self._coalesce(item):
+                    pass
+                else:
+                    self._drop(self._items.popleft())
+            self._items.append(item)
+            self.enqueued += 1
+            if len(self._items) > self.max_depth:
+                self.max_depth = len(self._items)
+            self._cond.notify_all()
+        return True
+
+    def _coalesce(self, item):
+        key = _coalesce_key(item)
+        if key is not None:
+            for older in self._items:
+                if _coalesce_key(older) == key:
+                    self._items.remove(older)
+                    self.coalesced += 1
+                    return True
+        return False
+
+    def _drop(self, item):
+        self.dropped += 1
+        if self.dropped == 1:
+            logger.warning("%s full, dropping %s", self.name, item)
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info("%s full, dropping %s (%d dropped)", self.name, item, self.dropped)
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, waiting for one for up to timeout seconds (forever if None).
+        :raises Empty: if there was nothing to get in time.
+        """
+        with self._cond:
+            if not self._items:
+                deadline = None if timeout is None else _monotonic() + timeout
+                while not self._items:
+                    remaining = None if deadline is None else deadline - _monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Empty()
+                    self._cond.wait(remaining)
+            item = self._items.popleft()
+            self._cond.notify_all()  # wake producers waiting for room
+            return item
+
+    def empty(self):
+        return not self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self):
+        return {
+            "capacity": self.capacity,
+            "policy": self.policy,
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+def stats():
+    """The counters of all live channels, by channel name, for monitoring."""
+    return {c.name: c.stats() for c in list(_channels)}
@@ -26,6 +26,7 @@ import hidapi as _hid
 import solaar.configuration as _configuration
 
 from . import base
+from . import capabilities as _capabilities
 from . import descriptors
 from . import exceptions
 from . import hidpp10
@@ -33,9 +34,9 @@ from . import hidpp10_constants
 from . import hidpp20
 from . import hidpp20_constants
 from . import settings
+from . import trace as _trace
 from .common import ALERT
 from .common import Battery
-from .settings_templates import check_feature_settings as _check_feature_settings
 
 logger = logging.getLogger(__name__)
 
@@ -99,6 +100,8 @@ class Device:
         self._modelId = None  # model id (contains identifiers for the transports of the device)
         self._tid_map = None  # map from transports to product identifiers
         self._persister = None  # persister holds settings
+        self._capabilities = None  # snapshot of static capability replies
+        self.settings_state = settings.SettingsState()  # what is known about the values of its settings
         self._led_effects = self._firmware = self._keys = self._remap_keys = self._gestures = None
         self._profiles = self._backlight = self._registers = self._settings = None
         self.notification_flags = None
@@ -107,10 +110,16 @@ class Device:
         self._active = None  # lags self.online - is used to help determine when to setup devices
 
         self._feature_settings_checked = False
+        self._keys_lock = _threading.Lock()
+        self._remap_keys_lock = _threading.Lock()
         self._gestures_lock = _threading.Lock()
+        self._led_effects_lock = _threading.Lock()
+        self._backlight_lock = _threading.Lock()
+        self._profiles_lock = _threading.Lock()
         self._settings_lock = _threading.Lock()
         self._persister_lock = _threading.Lock()
         self._notification_handlers = {}  # See `add_notification_handler`
+        self._feature_notification_handlers = {}  # (int(feature), address) -> {id: fn}
 
         if not self.path:
             self.path = _hid.find_paired_node(receiver.path, number, 1) if receiver else None
@@ -260,22 +269,26 @@ class Device:
 
     @property
     def led_effects(self):
-        if not self._led_effects and self.online and self.protocol >= 2.0:
-            self._led_effects = hidpp20.LEDEffectsInfo(self)
+        if not self._led_effects:
+            with self._led_effects_lock:
+                if not self._led_effects and self.online and self.protocol >= 2.0:
+                    self._led_effects = hidpp20.LEDEffectsInfo(self)
         return self._led_effects
 
     @property
     def keys(self):
         if not self._keys:
-            if self.online and self.protocol >= 2.0:
-                self._keys = _hidpp20.get_keys(self) or ()
+            with self._keys_lock:
+                if not self._keys and self.online and self.protocol >= 2.0:
+                    self._keys = _hidpp20.get_keys(self) or ()
         return self._keys
 
     @property
     def remap_keys(self):
         if self._remap_keys is None:
-            if self.online and self.protocol >= 2.0:
-                self._remap_keys = _hidpp20.get_remap_keys(self) or ()
+            with self._remap_keys_lock:
+                if self._remap_keys is None and self.online and self.protocol >= 2.0:
+                    self._remap_keys = _hidpp20.get_remap_keys(self) or ()
         return self._remap_keys
 
     @property
@@ -290,15 +303,17 @@ class Device:
     @property
     def backlight(self):
         if self._backlight is None:
-            if self.online and self.protocol >= 2.0:
-                self._backlight = _hidpp20.get_backlight(self)
+            with self._backlight_lock:
+                if self._backlight is None and self.online and self.protocol >= 2.0:
+                    self._backlight = _hidpp20.get_backlight(self)
         return self._backlight
 
     @property
     def profiles(self):
         if self._profiles is None:
-            if self.online and self.protocol >= 2.0:
-                self._profiles = _hidpp20.get_profiles(self)
+            with self._profiles_lock:
+                if self._profiles is None and self.online and self.protocol >= 2.0:
+                    self._profiles = _hidpp20.get_profiles(self)
         return self._profiles
 
     @property
@@ -330,7 +345,14 @@ class Device:
         if not self._feature_settings_checked:
             with self._settings_lock:
                 if not self._feature_settings_checked:
-                    self._feature_settings_checked = _check_feature_settings(self, self._settings)
+                    # setting templates are loaded on first use, so that the command line loads only what it touches
+                    from .settings_templates import check_feature_settings as _check_feature_settings
+
+                    with _trace.span("settings", "check feature settings", device=str(self)):
+                        self._feature_settings_checked = _check_feature_settings(self, self._settings)
+                    if self._feature_settings_checked:
+                        self._save_features()  # most of the features are known now
+                        _capabilities.save()  # and so are most of the capabilities
         return self._settings
 
     def set_configuration(self, configuration, no_reply=False):
@@ -346,8 +368,35 @@ class Device:
             with self._persister_lock:
                 if not self._persister:
                     self._persister = _configuration.persister(self)
+                    self._restore_features()
         return self._persister
 
+    @property
+    def capabilities(self):
+        """The snapshot of static capability replies (keys, gestures, LED zones, ...) for the model and firmware."""
+        if self._capabilities is None and self.online and self.protocol >= 2.0 and self.modelId:
+            firmware = self._firmware_key()
+            if firmware:
+                self._capabilities = _capabilities.snapshot(f"{self.modelId} {firmware}")
+        return self._capabilities
+
+    def _firmware_key(self):
+        return " ".join(f"{fw.kind}:{fw.name}:{fw.version}" for fw in self.firmware)
+
+    def _restore_features(self):
+        # The feature table only changes with the firmware, so reuse the one cached for the same model and firmware
+        if self.features is not None and self.online and self.protocol >= 2.0:
+            capabilities = self.capabilities
+            if capabilities is not None and self.features.restore(capabilities):
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("%s: restored %d features from cache", self, dict.__len__(self.features))
+
+    def _save_features(self):
+        if self.features is not None and self.features.count and self.online:
+            capabilities = self.capabilities
+            if capabilities is not None:
+                self.features.snapshot(capabilities)
+
     def battery(self):  # None  or  level, next, status, voltage
         if self.protocol < 2.0:
             return _hidpp10.get_battery(self)
@@ -423,14 +472,16 @@ class Device:
             self.online = active
             was_active, self._active = self._active, active
             if active:
-                # Push settings for new devices when devices request software reconfiguration
-                # and when devices become active if they don't have wireless device status feature,
+                # Push settings for new devices, when devices become active, and when they request software reconfiguration.
+                # Devices with the wireless device status feature request it when they have lost their settings, others
+                # may have lost them whenever they become active. Settings known to be on the device are not written again.
                 if (
-                    was_active is None
+                    push
                     or not was_active
-                    or push
-                    and (not self.features or hidpp20_constants.FEATURE.WIRELESS_DEVICE_STATUS not in self.features)
+                    and not (self.features and hidpp20_constants.FEATURE.WIRELESS_DEVICE_STATUS in self.features)
                 ):
+                    self.settings_state.invalidate()
+                if not was_active or push:
                     if logger.isEnabledFor(logging.INFO):
                         logger.info("%s pushing device settings %s", self, self.settings)
                     settings.apply_all_settings(self)
@@ -447,7 +498,7 @@ class Device:
         if self.status_callback is not None:
             self.status_callback(self, alert, reason)
 
-    def add_notification_handler(self, id: str, fn):
+    def add_notification_handler(self, id: str, fn, feature=None, address=None):
         """Adds the notification handling callback `fn` to this device under name `id`.
         If a callback has already been registered under this name, it's replaced with
         the argument.
@@ -458,16 +509,24 @@ class Device:
         It should return `None` if it hasn't handled the notification, return `True`
         if it did so successfully and return `False` if an error should be reported
         (malformed notification, etc).
+        With a feature the callback only gets the HID++ 2.0 notifications of that feature,
+        and with an address as well only the ones with that report address, so it
+        does not have to look up the feature of each notification itself.
         """
-        self._notification_handlers[id] = fn
+        self.remove_notification_handler(id, quiet=True)
+        if feature is None:
+            self._notification_handlers[id] = fn
+        else:
+            self._feature_notification_handlers.setdefault((int(feature), address), {})[id] = fn
 
-    def remove_notification_handler(self, id: str):
+    def remove_notification_handler(self, id: str, quiet=False):
         """Unregisters the notification handler under name `id`."""
 
-        if id not in self._notification_handlers and logger.isEnabledFor(logging.INFO):
+        found = self._notification_handlers.pop(id, None) is not None
+        for handlers in self._feature_notification_handlers.values():
+            found = handlers.pop(id, None) is not None or found
+        if not found and not quiet and logger.isEnabledFor(logging.INFO):
             logger.info(f"Tried to remove nonexistent notification handler {id} from device {self}.")
-        else:
-            del self._notification_handlers[id]
 
     def handle_notification(self, n) -> Optional[bool]:
         for h in self._notification_handlers.values():
@@ -476,31 +535,64 @@ class Device:
                 return ret
         return None
 
+    def handle_feature_notification(self, n, feature) -> Optional[bool]:
+        """Invokes the handlers subscribed to the feature of a HID++ 2.0 notification, see `add_notification_handler`."""
+        for key in ((int(feature), n.address), (int(feature), None)):
+            handlers = self._feature_notification_handlers.get(key)
+            if handlers:
+                for h in list(handlers.values()):
+                    ret = h(self, n)
+                    if ret is not None:
+                        return ret
+        return None
+
+    @property
+    def long_message(self):
+        """Whether requests to the device have to use long HID++ messages."""
+        return self.hidpp_long is True or (
+            self.hidpp_long is None and (self.bluetooth or self._protocol is not None and self._protocol >= 2.0)
+        )
+
     def request(self, request_id, *params, no_reply=False):
         if self:
-            long = self.hidpp_long is True or (
-                self.hidpp_long is None and (self.bluetooth or self._protocol is not None and self._protocol >= 2.0)
-            )
             return base.request(
                 self.handle or self.receiver.handle,
                 self.number,
                 request_id,
                 *params,
                 no_reply=no_reply,
-                long_message=long,
+                long_message=self.long_message,
                 protocol=self.protocol,
             )
 
+    def requests(self, request_list):
+        """Makes several requests to the device at once, see base.requests."""
+        if self:
+            return base.requests(
+                self.handle or self.receiver.handle,
+                self.number,
+                request_list,
+                long_message=self.long_message,
+                protocol=self.protocol,
+            )
+        return [None] * len(request_list)
+
     def feature_request(self, feature, function=0x00, *params, no_reply=False):
         if self.protocol >= 2.0:
             return hidpp20.feature_request(self, feature, function, *params, no_reply=no_reply)
 
+    def feature_requests(self, request_list):
+        """Makes several feature calls to the device at once.
+        :param request_list: a sequence of (feature, function, *params) tuples.
+        :returns: a list with, in order, the result of each call or the FeatureCallError it raised.
+        """
+        if self.protocol >= 2.0:
+            return hidpp20.feature_requests(self, request_list)
+        return [None] * len(request_list)
+
     def ping(self):
         """Checks if the device is online, returns True of False"""
-        long = self.hidpp_long is True or (
-            self.hidpp_long is None and (self.bluetooth or self._protocol is not None and self._protocol >= 2.0)
-        )
-        protocol = base.ping(self.handle or self.receiver.handle, self.number, long_message=long)
+        protocol = base.ping(self.handle or self.receiver.handle, self.number, long_message=self.long_message)
         self.online = protocol is not None
         if protocol:
             self._protocol = protocol
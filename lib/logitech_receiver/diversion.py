@@ -24,6 +24,7 @@ import platform as _platform
 import socket
 import subprocess
 import sys as _sys
+import threading as _threading
 import time as _time
 
 import dbus
@@ -38,6 +39,7 @@ if _platform.system() in ("Darwin", "Windows"):
 else:
     import evdev
 
+from hashlib import sha1 as _sha1
 from math import sqrt as _sqrt
 from struct import unpack as _unpack
 
@@ -45,6 +47,7 @@ from yaml import add_representer as _yaml_add_representer
 from yaml import dump_all as _yaml_dump_all
 from yaml import safe_load_all as _yaml_safe_load_all
 
+from . import trace as _trace
 from .common import NamedInt
 from .hidpp20 import FEATURE as _F
 from .special_keys import CONTROL as _CONTROL
@@ -240,10 +243,6 @@ def setup_uinput():
         logger.warning("cannot create uinput device: %s", e)
 
 
-if wayland:  # Wayland can't use xtest so may as well set up uinput now
-    setup_uinput()
-
-
 def kbdgroup():
     if xkb_setup():
         state = XkbStateRec()
@@ -640,15 +639,15 @@ def gnome_dbus_pointer_prog():
     return (wm_class,) if wm_class else None
 
 
+def focus_setup():
+    """Connect to X11, or to the Solaar Gnome extension in Wayland, to find out which processes have the focus."""
+    return gnome_dbus_interface_setup() if wayland else x11_setup()
+
+
 class Process(Condition):
     def __init__(self, process, warn=True):
         self.process = process
-        if (not wayland and not x11_setup()) or (wayland and not gnome_dbus_interface_setup()):
-            if warn:
-                logger.warning(
-                    "rules can only access active process in X11 or in Wayland under GNOME with Solaar Gnome extension - %s",
-                    self,
-                )
+        self.warn = warn  # about a missing focus source, when first evaluated
         if not isinstance(process, str):
             if warn:
                 logger.warning("rule Process argument not a string: %s", process)
@@ -662,6 +661,13 @@ class Process(Condition):
             logger.debug("evaluate condition: %s", self)
         if not isinstance(self.process, str):
             return False
+        if self.warn:
+            self.warn = False
+            if not focus_setup():
+                logger.warning(
+                    "rules can only access active process in X11 or in Wayland under GNOME with Solaar Gnome extension - %s",
+                    self,
+                )
         focus = x11_focus_prog() if not wayland else gnome_dbus_focus_prog()
         result = any(bool(s and s.startswith(self.process)) for s in focus) if focus else None
         return result
@@ -673,13 +679,7 @@ class Process(Condition):
 class MouseProcess(Condition):
     def __init__(self, process, warn=True):
         self.process = process
-        if (not wayland and not x11_setup()) or (wayland and not gnome_dbus_interface_setup()):
-            if warn:
-                logger.warning(
-                    "rules cannot access active mouse process "
-                    "in X11 or in Wayland under GNOME with Solaar Extension for GNOME - %s",
-                    self,
-                )
+        self.warn = warn  # about a missing focus source, when first evaluated
         if not isinstance(process, str):
             if warn:
                 logger.warning("rule MouseProcess argument not a string: %s", process)
@@ -693,6 +693,14 @@ class MouseProcess(Condition):
             logger.debug("evaluate condition: %s", self)
         if not isinstance(self.process, str):
             return False
+        if self.warn:
+            self.warn = False
+            if not focus_setup():
+                logger.warning(
+                    "rules cannot access active mouse process "
+                    "in X11 or in Wayland under GNOME with Solaar Extension for GNOME - %s",
+                    self,
+                )
         pointer_focus = x11_pointer_prog() if not wayland else gnome_dbus_pointer_prog()
         result = any(bool(s and s.startswith(self.process)) for s in pointer_focus) if pointer_focus else None
         return result
@@ -1309,10 +1317,11 @@ class Set(Action):
         if args is None:
             logger.warning("Set Action: invalid args %s for setting %s of %s", self.args[2:], self.args[1], self.args[0])
             return None
+        # rules can change settings faster than the device takes them, so the writes are merged
         if len(args) > 1:
-            setting.write_key_value(args[0], args[1])
+            setting.queue_write(args[1], key=args[0])
         else:
-            setting.write(args[0])
+            setting.queue_write(args[0])
         if device.setting_callback:
             device.setting_callback(device, type(setting), args)
         return None
@@ -1436,67 +1445,113 @@ def key_is_down(key):
 
 
 def evaluate_rules(feature, notification, device):
+    loader = _rules_loader or _start_rules_loader()
+    if loader.is_alive():
+        loader.join()  # only a notification diverted before the rules are compiled waits for them
     if logger.isEnabledFor(logging.DEBUG):
         logger.debug("evaluating rules on %s", notification)
     rules.evaluate(feature, notification, device, True)
 
 
+# need to keep track of keys that are down to find a new key down
+def _track_keys(notification):
+    global keys_down, key_down, key_up
+    new_keys_down = _unpack("!4H", notification.data[:8])
+    for key in new_keys_down:
+        if key and key not in keys_down:
+            key_down = key
+    for key in keys_down:
+        if key and key not in new_keys_down:
+            key_up = key
+    keys_down = new_keys_down
+
+
+# and also G keys down
+def _track_g_keys(notification):
+    global g_keys_down, key_down, key_up
+    new_g_keys_down = _unpack("<I", notification.data[:4])[0]
+    for i in range(32):
+        if new_g_keys_down & (0x01 << i) and not g_keys_down & (0x01 << i):
+            key_down = _CONTROL["G" + str(i + 1)]
+        if g_keys_down & (0x01 << i) and not new_g_keys_down & (0x01 << i):
+            key_up = _CONTROL["G" + str(i + 1)]
+    g_keys_down = new_g_keys_down
+
+
+# and also M keys down
+def _track_m_keys(notification):
+    global m_keys_down, key_down, key_up
+    new_m_keys_down = _unpack("!1B", notification.data[:1])[0]
+    for i in range(1, 9):
+        if new_m_keys_down & (0x01 << (i - 1)) and not m_keys_down & (0x01 << (i - 1)):
+            key_down = _CONTROL["M" + str(i)]
+        if m_keys_down & (0x01 << (i - 1)) and not new_m_keys_down & (0x01 << (i - 1)):
+            key_up = _CONTROL["M" + str(i)]
+    m_keys_down = new_m_keys_down
+
+
+# and also MR key
+def _track_mr_key(notification):
+    global mr_key_down, key_down, key_up
+    new_mr_key_down = _unpack("!1B", notification.data[:1])[0]
+    if not mr_key_down and new_mr_key_down:
+        key_down = _CONTROL["MR"]
+    if mr_key_down and not new_mr_key_down:
+        key_up = _CONTROL["MR"]
+    mr_key_down = new_mr_key_down
+
+
+# keep track of thumb wheel movment
+def _track_thumb_wheel(notification):
+    global thumb_wheel_displacement
+    if notification.data[4] <= 0x01:  # when wheel starts, zero out last movement
+        thumb_wheel_displacement = 0
+    thumb_wheel_displacement += signed(notification.data[0:2])
+
+
+# the state trackers for notifications with report address 0x00, by int(feature)
+_trackers = {
+    int(_F.REPROG_CONTROLS_V4): _track_keys,
+    int(_F.GKEY): _track_g_keys,
+    int(_F.MKEYS): _track_m_keys,
+    int(_F.MR): _track_mr_key,
+    int(_F.THUMB_WHEEL): _track_thumb_wheel,
+}
+
+
 # process a notification
 def process_notification(device, notification, feature):
-    global keys_down, g_keys_down, m_keys_down, mr_key_down, key_down, key_up, thumb_wheel_displacement
+    global key_down, key_up
     key_down, key_up = None, None
-    # need to keep track of keys that are down to find a new key down
-    if feature == _F.REPROG_CONTROLS_V4 and notification.address == 0x00:
-        new_keys_down = _unpack("!4H", notification.data[:8])
-        for key in new_keys_down:
-            if key and key not in keys_down:
-                key_down = key
-        for key in keys_down:
-            if key and key not in new_keys_down:
-                key_up = key
-        keys_down = new_keys_down
-    # and also G keys down
-    elif feature == _F.GKEY and notification.address == 0x00:
-        new_g_keys_down = _unpack("<I", notification.data[:4])[0]
-        for i in range(32):
-            if new_g_keys_down & (0x01 << i) and not g_keys_down & (0x01 << i):
-                key_down = _CONTROL["G" + str(i + 1)]
-            if g_keys_down & (0x01 << i) and not new_g_keys_down & (0x01 << i):
-                key_up = _CONTROL["G" + str(i + 1)]
-        g_keys_down = new_g_keys_down
-    # and also M keys down
-    elif feature == _F.MKEYS and notification.address == 0x00:
-        new_m_keys_down = _unpack("!1B", notification.data[:1])[0]
-        for i in range(1, 9):
-            if new_m_keys_down & (0x01 << (i - 1)) and not m_keys_down & (0x01 << (i - 1)):
-                key_down = _CONTROL["M" + str(i)]
-            if m_keys_down & (0x01 << (i - 1)) and not new_m_keys_down & (0x01 << (i - 1)):
-                key_up = _CONTROL["M" + str(i)]
-        m_keys_down = new_m_keys_down
-    # and also MR key
-    elif feature == _F.MR and notification.address == 0x00:
-        new_mr_key_down = _unpack("!1B", notification.data[:1])[0]
-        if not mr_key_down and new_mr_key_down:
-            key_down = _CONTROL["MR"]
-        if mr_key_down and not new_mr_key_down:
-            key_up = _CONTROL["MR"]
-        mr_key_down = new_mr_key_down
-    # keep track of thumb wheel movment
-    elif feature == _F.THUMB_WHEEL and notification.address == 0x00:
-        if notification.data[4] <= 0x01:  # when wheel starts, zero out last movement
-            thumb_wheel_displacement = 0
-        thumb_wheel_displacement += signed(notification.data[0:2])
+    if notification.address == 0x00 and feature is not None:
+        tracker = _trackers.get(int(feature))
+        if tracker:
+            tracker(notification)
 
+    if _rules_loader is None:
+        _start_rules_loader()
     GLib.idle_add(evaluate_rules, feature, notification, device)
 
 
 _XDG_CONFIG_HOME = _os.environ.get("XDG_CONFIG_HOME") or _path.expanduser(_path.join("~", ".config"))
 _file_path = _path.join(_XDG_CONFIG_HOME, "solaar", "rules.yaml")
 
+# The rules file is compiled in the background when this module is loaded, and again when the rules editor reloads it.
+# The compiled rules are kept with the modification time and digest of the file, so an unchanged file is not recompiled.
 rules = built_in_rules
+_rules_lock = _threading.Lock()
+_rules_key = None  # (modification time, sha1 digest) of the rules file that rules were compiled from
+_rules_loader = None  # the thread compiling the rules file
+_loader_lock = _threading.Lock()
 
 
-def _save_config_rule_file(file_name=_file_path):
+def _save_config_rule_file(file_name=_file_path, saved_rules=None):
+    """Save the user-defined rules of saved_rules, by default the rules in use. The rules file can have been
+    compiled again since an editor got its rules, so it passes them to save its changes and not the ones in use.
+    """
+    if saved_rules is None:
+        saved_rules = rules
+
     # This is a trick to show str/float/int lists in-line (inspired by https://stackoverflow.com/a/14001707)
     class inline_list(list):
         pass
@@ -1529,38 +1584,101 @@ def _save_config_rule_file(file_name=_file_path):
         # 'version': (1, 3),  # it would be printed for every rule
     }
     # Save only user-defined rules
-    rules_to_save = sum((r.data()["Rule"] for r in rules.components if r.source == file_name), [])
+    rules_to_save = sum((r.data()["Rule"] for r in saved_rules.components if r.source == file_name), [])
     if True:  # save even if there are no rules to save
         if logger.isEnabledFor(logging.INFO):
             logger.info("saving %d rule(s) to %s", len(rules_to_save), file_name)
         try:
-            with open(file_name, "w") as f:
-                if rules_to_save:
-                    f.write("%YAML 1.3\n")  # Write version manually
-                _yaml_dump_all(convert([r["Rule"] for r in rules_to_save]), f, **dump_settings)
+            with _rules_lock:
+                with open(file_name, "w") as f:
+                    if rules_to_save:
+                        f.write("%YAML 1.3\n")  # Write version manually
+                    _yaml_dump_all(convert([r["Rule"] for r in rules_to_save]), f, **dump_settings)
+                if file_name == _file_path:  # the rules are what was saved, no need to compile them again
+                    _set_rules(saved_rules, _read_rules_file())
         except Exception as e:
             logger.error("failed to save to %s\n%s", file_name, e)
             return False
     return True
 
 
-def _load_config_rule_file():
-    global rules
+def _rules_file_mtime():
+    try:
+        return _os.stat(_file_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _read_rules_file():
+    """The modification time and contents of the rules file, with None and empty contents if there is none."""
+    mtime = _rules_file_mtime()
+    if mtime is None:
+        return None, b""
+    try:
+        with open(_file_path, "rb") as config_file:
+            return mtime, config_file.read()
+    except OSError as e:
+        logger.error("failed to load from %s\n%s", _file_path, e)
+        return mtime, b""
+
+
+def _set_rules(new_rules, file):
+    global rules, _rules_key
+    mtime, contents = file
+    rules = new_rules
+    _rules_key = (mtime, _sha1(contents).digest())
+
+
+def _compile_rules(contents):
     loaded_rules = []
-    if _path.isfile(_file_path):
+    if contents:
         try:
-            with open(_file_path) as config_file:
-                loaded_rules = []
-                for loaded_rule in _yaml_safe_load_all(config_file):
-                    rule = Rule(loaded_rule, source=_file_path)
-                    if logger.isEnabledFor(logging.DEBUG):
-                        logger.debug("load rule: %s", rule)
-                    loaded_rules.append(rule)
-                if logger.isEnabledFor(logging.INFO):
-                    logger.info("loaded %d rules from %s", len(loaded_rules), config_file.name)
+            for loaded_rule in _yaml_safe_load_all(contents):
+                rule = Rule(loaded_rule, source=_file_path)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("load rule: %s", rule)
+                loaded_rules.append(rule)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("loaded %d rules from %s", len(loaded_rules), _file_path)
         except Exception as e:
             logger.error("failed to load from %s\n%s", _file_path, e)
-    rules = Rule([Rule(loaded_rules, source=_file_path), built_in_rules])
+    return Rule([Rule(loaded_rules, source=_file_path), built_in_rules])
+
+
+def _load_rules(force=False):
+    """Compile the rules file, unless it has the same modification time or contents as when the rules were compiled."""
+    with _rules_lock:
+        if not force and _rules_key and _rules_key[0] == _rules_file_mtime():
+            return rules
+        file = _read_rules_file()
+        if not force and _rules_key and _rules_key[1] == _sha1(file[1]).digest():
+            _set_rules(rules, file)  # only touched
+            return rules
+        with _trace.span("load", "rules"):
+            _set_rules(_compile_rules(file[1]), file)
+        return rules
+
+
+def _start_rules_loader():
+    """Compile the rules file in the background, if that is not already happening."""
+    global _rules_loader
+    with _loader_lock:
+        if _rules_loader is None or not _rules_loader.is_alive():
+            _rules_loader = _threading.Thread(name="RulesLoader", target=_load_rules, daemon=True)
+            _rules_loader.start()
+        return _rules_loader
+
+
+def load_rules():
+    """The rules in use, compiled from the rules file now if they are not being compiled yet."""
+    if _rules_loader is not None:
+        _rules_loader.join()
+    return _load_rules()
+
+
+def _load_config_rule_file():
+    """Compile the rules file again, discarding the rules in use."""
+    _load_rules(force=True)
 
 
-_load_config_rule_file()
+_start_rules_loader()
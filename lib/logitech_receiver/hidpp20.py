@@ -29,6 +29,7 @@ import yaml as _yaml
 from . import exceptions
 from . import hidpp10_constants as _hidpp10_constants
 from . import special_keys
+from .capabilities import request_key as _request_key
 from .common import Battery
 from .common import FirmwareInfo as _FirmwareInfo
 from .common import NamedInt as _NamedInt
@@ -116,10 +117,46 @@ class FeaturesArray(dict):
                 feature = self.get_feature(index)
                 yield feature, index
 
+    def lookup(self, features) -> None:
+        """Find the indices of several features at once, pipelining the requests for the ones not known yet."""
+        if not self._check():
+            return
+        unknown = [feature for feature in dict.fromkeys(features) if dict.get(self, feature) is None]
+        if unknown:
+            replies = self.device.requests([(0x0000, _pack("!H", feature)) for feature in unknown])
+            for feature, reply in zip(unknown, replies):
+                if reply and not isinstance(reply, Exception):
+                    self[feature] = reply[0] if reply[0] else False
+                    self.version[feature] = reply[2]
+
     def get_feature_version(self, feature: _NamedInt) -> Optional[int]:
         if self[feature]:
             return self.version.get(feature, 0)
 
+    def snapshot(self, capabilities) -> None:
+        """Keep the feature table in the capability snapshot of the device, as replies to feature set and root calls."""
+        if self.count:
+            capabilities.set_reply(FEATURE.FEATURE_SET, 0x00, (), bytes([self.count - 1]))
+        for feature, index in list(self.items()):
+            reply = bytes([index or 0, 0, self.version.get(feature, 0)])
+            capabilities.set_reply(FEATURE.ROOT, 0x00, (_pack("!H", feature),), reply)
+
+    def restore(self, capabilities) -> bool:
+        """Fill in the feature table from the capability snapshot of the device, if it has one."""
+        count = capabilities.get_reply(FEATURE.FEATURE_SET, 0x00, ())
+        if not count:
+            return False
+        prefix = _request_key(FEATURE.ROOT, 0x00, ())
+        for key, reply in list(capabilities.items()):
+            if len(key) == len(prefix) + 2 and key.startswith(prefix):
+                feature = FEATURE[_unpack("!H", key[len(prefix) :])[0]]
+                if super().get(feature) is None:
+                    self[feature] = reply[0] if reply[0] or feature == FEATURE.ROOT else False
+                    self.version[feature] = reply[2]
+        if not self.count:
+            self.count = count[0] + 1
+        return True
+
     def __contains__(self, feature: _NamedInt) -> bool:
         index = self.__getitem__(feature)
         return index is not None and index is not False
@@ -433,16 +470,20 @@ class KeysArray:
         """Queries the device for a given key and stores it in self.keys."""
         if index < 0 or index >= len(self.keys):
             raise IndexError(index)
+        self._store_key(index, static_request(self.device, *self._key_request(index)))
 
+    def _key_request(self, index: int):
+        """The feature call, as a (feature, function, *params) tuple, that reads a key."""
         # TODO: add here additional variants for other REPROG_CONTROLS
+        return (self.keyversion, 0x10, index)
+
+    def _store_key(self, index: int, keydata):
         if self.keyversion == FEATURE.REPROG_CONTROLS_V2:
-            keydata = feature_request(self.device, FEATURE.REPROG_CONTROLS_V2, 0x10, index)
             if keydata:
                 cid, tid, flags = _unpack("!HHB", keydata[:5])
                 self.keys[index] = ReprogrammableKey(self.device, index, cid, tid, flags)
                 self.cid_to_tid[cid] = tid
         elif self.keyversion == FEATURE.REPROG_CONTROLS_V4:
-            keydata = feature_request(self.device, FEATURE.REPROG_CONTROLS_V4, 0x10, index)
             if keydata:
                 cid, tid, flags1, pos, group, gmask, flags2 = _unpack("!HHBBBBB", keydata[:9])
                 flags = flags1 | (flags2 << 8)
@@ -455,11 +496,17 @@ class KeysArray:
 
     def _ensure_all_keys_queried(self):
         """The retrieval of key information is lazy, but for certain functionality
-        we need to know all keys. This function makes sure that's the case."""
+        we need to know all keys. This function makes sure that's the case,
+        reading all the missing keys in one batch."""
         with self.lock:  # don't want two threads doing this
-            for i, k in enumerate(self.keys):
-                if k is None:
-                    self._query_key(i)
+            indices = [i for i, k in enumerate(self.keys) if k is None]
+            if indices:
+                keydata = static_requests(self.device, [self._key_request(i) for i in indices])
+                self._store_keys(indices, _raise_errors(keydata))
+
+    def _store_keys(self, indices, keydata):
+        for i, data in zip(indices, keydata):
+            self._store_key(i, data)
 
     def __getitem__(self, index):
         if isinstance(index, int):
@@ -504,10 +551,10 @@ class KeysArrayV1(KeysArray):
         A key k can only be remapped to targets in groups within k.group_mask."""
         self.group_cids = {g: [] for g in special_keys.CID_GROUP}
 
-    def _query_key(self, index: int):
-        if index < 0 or index >= len(self.keys):
-            raise IndexError(index)
-        keydata = feature_request(self.device, FEATURE.REPROG_CONTROLS, 0x10, index)
+    def _key_request(self, index: int):
+        return (FEATURE.REPROG_CONTROLS, 0x10, index)
+
+    def _store_key(self, index: int, keydata):
         if keydata:
             cid, tid, flags = _unpack("!HHB", keydata[:5])
             self.keys[index] = ReprogrammableKey(self.device, index, cid, tid, flags)
@@ -520,10 +567,10 @@ class KeysArrayV4(KeysArrayV1):
     def __init__(self, device, count):
         super().__init__(device, count, 4)
 
-    def _query_key(self, index: int):
-        if index < 0 or index >= len(self.keys):
-            raise IndexError(index)
-        keydata = feature_request(self.device, FEATURE.REPROG_CONTROLS_V4, 0x10, index)
+    def _key_request(self, index: int):
+        return (FEATURE.REPROG_CONTROLS_V4, 0x10, index)
+
+    def _store_key(self, index: int, keydata):
         if keydata:
             cid, tid, flags1, pos, group, gmask, flags2 = _unpack("!HHBBBBB", keydata[:9])
             flags = flags1 | (flags2 << 8)
@@ -544,7 +591,7 @@ class KeysArrayPersistent(KeysArray):
     @property
     def capabilities(self):
         if self._capabilities is None and self.device.online:
-            capabilities = self.device.feature_request(FEATURE.PERSISTENT_REMAPPABLE_ACTION, 0x00)
+            capabilities = static_request(self.device, FEATURE.PERSISTENT_REMAPPABLE_ACTION, 0x00)
             assert capabilities, "Oops, persistent remappable key capabilities cannot be retrieved!"
             self._capabilities = _unpack("!H", capabilities[:2])[0]  # flags saying what the mappings are possible
         return self._capabilities
@@ -552,17 +599,36 @@ class KeysArrayPersistent(KeysArray):
     def _query_key(self, index: int):
         if index < 0 or index >= len(self.keys):
             raise IndexError(index)
-        keydata = feature_request(self.device, FEATURE.PERSISTENT_REMAPPABLE_ACTION, 0x20, index, 0xFF)
+        keydata = static_request(self.device, *self._key_request(index))
+        mapped_data = None
         if keydata:
-            key = _unpack("!H", keydata[:2])[0]
             try:
-                mapped_data = feature_request(
-                    self.device, FEATURE.PERSISTENT_REMAPPABLE_ACTION, 0x30, key & 0xFF00, key & 0xFF, 0xFF
-                )
-                if mapped_data:
-                    _ignore, _ignore, actionId, remapped, modifiers, status = _unpack("!HBBHBB", mapped_data[:8])
+                mapped_data = feature_request(self.device, *self._mapping_request(keydata))
             except Exception:
-                actionId = remapped = modifiers = status = 0
+                pass
+        self._store_key(index, keydata, mapped_data)
+
+    def _key_request(self, index: int):
+        return (FEATURE.PERSISTENT_REMAPPABLE_ACTION, 0x20, index, 0xFF)
+
+    def _mapping_request(self, keydata):
+        key = _unpack("!H", keydata[:2])[0]
+        return (FEATURE.PERSISTENT_REMAPPABLE_ACTION, 0x30, key & 0xFF00, key & 0xFF, 0xFF)
+
+    def _store_keys(self, indices, keydata):
+        # the mappings of the keys found are read in a second batch
+        keydata = dict(zip(indices, keydata))
+        found = [i for i, data in keydata.items() if data]
+        mapped_data = dict(zip(found, feature_requests(self.device, [self._mapping_request(keydata[i]) for i in found])))
+        for i, data in keydata.items():
+            self._store_key(i, data, mapped_data.get(i))
+
+    def _store_key(self, index: int, keydata, mapped_data=None):
+        if keydata:
+            key = _unpack("!H", keydata[:2])[0]
+            actionId = remapped = modifiers = status = 0
+            if mapped_data and not isinstance(mapped_data, Exception):
+                _ignore, _ignore, actionId, remapped, modifiers, status = _unpack("!HBBHBB", mapped_data[:8])
             actionId = special_keys.ACTIONID[actionId]
             if actionId == special_keys.ACTIONID.Key:
                 remapped = special_keys.USB_HID_KEYCODES[remapped]
@@ -765,7 +831,7 @@ class Param:
         return self._default_value
 
     def _read_default(self):
-        result = feature_request(self._device, FEATURE.GESTURE_2, 0x60, self.index, 0xFF)
+        result = static_request(self._device, FEATURE.GESTURE_2, 0x60, self.index, 0xFF)
         if result:
             self._default_value = _bytes2int(result[: self.size])
             return self._default_value
@@ -797,7 +863,7 @@ class Spec:
 
     def read(self):
         try:
-            value = feature_request(self._device, FEATURE.GESTURE_2, 0x50, self.id, 0xFF)
+            value = static_request(self._device, FEATURE.GESTURE_2, 0x50, self.id, 0xFF)
         except exceptions.FeatureCallError:  # some calls produce an error (notably spec 5 multiplier on K400Plus)
             if logger.isEnabledFor(logging.WARNING):
                 logger.warning(
@@ -826,7 +892,7 @@ class Gestures:
         field_high = 0x00
         while field_high != 0x01:  # end of fields
             # retrieve the next eight fields
-            fields = feature_request(device, FEATURE.GESTURE_2, 0x00, index >> 8, index & 0xFF)
+            fields = static_request(device, FEATURE.GESTURE_2, 0x00, index >> 8, index & 0xFF)
             if not fields:
                 break
             for offset in range(8):
@@ -982,8 +1048,9 @@ _yaml.add_representer(LEDEffectSetting, LEDEffectSetting.to_yaml)
 
 
 class LEDEffectInfo:  # an effect that a zone can do
-    def __init__(self, device, zindex, eindex):
-        info = device.feature_request(FEATURE.COLOR_LED_EFFECTS, 0x20, zindex, eindex)
+    def __init__(self, device, zindex, eindex, info=None):
+        if info is None:
+            info = static_request(device, FEATURE.COLOR_LED_EFFECTS, 0x20, zindex, eindex)
         self.zindex, self.index, self.ID, self.capabilities, self.period = _unpack("!BBHHH", info[0:8])
 
     def __str__(self):
@@ -1006,13 +1073,13 @@ LEDZoneLocations[0x0B] = _("Primary 6")
 
 
 class LEDZoneInfo:  # effects that a zone can do
-    def __init__(self, device, index):
-        info = device.feature_request(FEATURE.COLOR_LED_EFFECTS, 0x10, index)
+    def __init__(self, device, index, info=None):
+        if info is None:
+            info = static_request(device, FEATURE.COLOR_LED_EFFECTS, 0x10, index)
         self.index, self.location, self.count = _unpack("!BHB", info[0:4])
         self.location = LEDZoneLocations[self.location] if LEDZoneLocations[self.location] else self.location
-        self.effects = []
-        for i in range(0, self.count):
-            self.effects.append(LEDEffectInfo(device, index, i))
+        infos = static_requests(device, [(FEATURE.COLOR_LED_EFFECTS, 0x20, index, i) for i in range(0, self.count)])
+        self.effects = [LEDEffectInfo(device, index, i, info) for i, info in enumerate(_raise_errors(infos))]
 
     def to_command(self, setting):
         for i in range(0, len(self.effects)):
@@ -1027,13 +1094,12 @@ class LEDZoneInfo:  # effects that a zone can do
 
 class LEDEffectsInfo:  # effects that the LEDs can do
     def __init__(self, device):
-        info = device.feature_request(FEATURE.COLOR_LED_EFFECTS, 0x00)
+        info = static_request(device, FEATURE.COLOR_LED_EFFECTS, 0x00)
         self.device = device
         self.count, _, capabilities = _unpack("!BHH", info[0:5])
         self.readable = capabilities & 0x1
-        self.zones = []
-        for i in range(0, self.count):
-            self.zones.append(LEDZoneInfo(device, i))
+        infos = static_requests(device, [(FEATURE.COLOR_LED_EFFECTS, 0x10, i) for i in range(0, self.count)])
+        self.zones = [LEDZoneInfo(device, i, info) for i, info in enumerate(_raise_errors(infos))]
 
     def to_command(self, index, setting):
         return self.zones[index].to_command(setting)
@@ -1276,7 +1342,7 @@ class OnboardProfiles:
     def from_device(cls, device):
         if not device.online:  # wake the device up if necessary
             device.ping()
-        response = device.feature_request(FEATURE.ONBOARD_PROFILES, 0x00)
+        response = static_request(device, FEATURE.ONBOARD_PROFILES, 0x00)
         memory, profile, _macro = _unpack("!BBB", response[0:3])
         if memory != 0x01 or profile > 0x04:
             return
@@ -1311,15 +1377,14 @@ class OnboardProfiles:
 
     @classmethod
     def read_sector(cls, dev, sector, s):  # doesn't check for valid sector or size
-        bytes = b""
-        o = 0
-        while o < s - 15:
-            chunk = dev.feature_request(FEATURE.ONBOARD_PROFILES, 0x50, sector >> 8, sector & 0xFF, o >> 8, o & 0xFF)
-            bytes += chunk
-            o += 16
-        chunk = dev.feature_request(FEATURE.ONBOARD_PROFILES, 0x50, sector >> 8, sector & 0xFF, (s - 16) >> 8, (s - 16) & 0xFF)
-        bytes += chunk[16 + o - s :]  # the last chunk has to be read in an awkward way
-        return bytes
+        offsets = list(range(0, s - 15, 16))
+        o = offsets[-1] + 16 if offsets else 0
+        offsets.append(s - 16)  # the last chunk has to be read in an awkward way
+        chunks = dev.feature_requests(
+            [(FEATURE.ONBOARD_PROFILES, 0x50, sector >> 8, sector & 0xFF, c >> 8, c & 0xFF) for c in offsets]
+        )
+        chunks = _raise_errors(chunks)
+        return b"".join(chunks[:-1]) + chunks[-1][16 + o - s :]
 
     @classmethod
     def write_sector(cls, device, s, bs):  # doesn't check for valid sector or size
@@ -1369,6 +1434,59 @@ def feature_request(device, feature, function=0x00, *params, no_reply=False):
             return device.request((feature_index << 8) + (function & 0xFF), *params, no_reply=no_reply)
 
 
+def feature_requests(device, request_list):
+    """Makes several feature calls at once, each a (feature, function, *params) tuple.
+    Results come back in order; calls to features the device does not have give ``None``
+    and calls that fail give the FeatureCallError they raised.
+    """
+    results = [None] * len(request_list)
+    if device.online and device.features:
+        indices, requests = [], []
+        for i, (feature, function, *params) in enumerate(request_list):
+            if feature in device.features:
+                indices.append(i)
+                requests.append(((device.features[feature] << 8) + (function & 0xFF), *params))
+        if requests:
+            for i, reply in zip(indices, device.requests(requests)):
+                results[i] = reply
+    return results
+
+
+def _raise_errors(replies):
+    for reply in replies:
+        if isinstance(reply, Exception):
+            raise reply
+    return replies
+
+
+def static_request(device, feature, function=0x00, *params):
+    """A feature call whose reply only depends on the model and firmware of the device,
+    answered from the capability snapshot of the device when it is there."""
+    snapshot = getattr(device, "capabilities", None)
+    reply = snapshot.get_reply(feature, function, params) if snapshot is not None else None
+    if reply is None:
+        reply = feature_request(device, feature, function, *params)
+        if reply and snapshot is not None:
+            snapshot.set_reply(feature, function, params, reply)
+    return reply
+
+
+def static_requests(device, request_list):
+    """Several static feature calls at once, only the ones not in the capability snapshot are made."""
+    snapshot = getattr(device, "capabilities", None)
+    if snapshot is None:
+        return feature_requests(device, request_list)
+    results = [snapshot.get_reply(feature, function, params) for feature, function, *params in request_list]
+    missing = [i for i, reply in enumerate(results) if reply is None]
+    if missing:
+        for i, reply in zip(missing, feature_requests(device, [request_list[i] for i in missing])):
+            results[i] = reply
+            if reply and not isinstance(reply, Exception):
+                feature, function, *params = request_list[i]
+                snapshot.set_reply(feature, function, params, reply)
+    return results
+
+
 # voltage to remaining charge from Logitech
 battery_voltage_remaining = (
     (4186, 100),
@@ -1535,15 +1653,15 @@ class Hidpp20:
         # TODO: add here additional variants for other REPROG_CONTROLS
         count = None
         if FEATURE.REPROG_CONTROLS_V2 in device.features:
-            count = feature_request(device, FEATURE.REPROG_CONTROLS_V2)
+            count = static_request(device, FEATURE.REPROG_CONTROLS_V2)
             return KeysArrayV1(device, ord(count[:1]))
         elif FEATURE.REPROG_CONTROLS_V4 in device.features:
-            count = feature_request(device, FEATURE.REPROG_CONTROLS_V4)
+            count = static_request(device, FEATURE.REPROG_CONTROLS_V4)
             return KeysArrayV4(device, ord(count[:1]))
         return None
 
     def get_remap_keys(self, device):
-        count = feature_request(device, FEATURE.PERSISTENT_REMAPPABLE_ACTION, 0x10)
+        count = static_request(device, FEATURE.PERSISTENT_REMAPPABLE_ACTION, 0x10)
         if count:
             return KeysArrayPersistent(device, ord(count[:1]))
 
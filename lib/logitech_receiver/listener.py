@@ -16,10 +16,12 @@
 ## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
 import logging
-import queue
+import os
+import select
 import threading
 
 from . import base
+from . import channel
 from . import exceptions
 
 logger = logging.getLogger(__name__)
@@ -107,11 +109,121 @@ class _ThreadedHandle:
 _EVENT_READ_TIMEOUT = 1.0  # in seconds
 
 
+class EventsHub(threading.Thread):
+    """A single thread that reads from the handles of all the listeners using epoll.
+    Replies to requests are routed to the request pipeline of their handle and
+    notifications are queued for their listener, so listeners never poll their handles.
+    The hub sleeps until a packet arrives and stop() wakes it up at once through an
+    eventfd (a pipe on Pythons without os.eventfd). Linux only.
+    """
+
+    def __init__(self):
+        super().__init__(name=self.__class__.__name__)
+        self.daemon = True
+        self._active = True  # until stop(), even if it is called before the hub runs
+        self._listeners = {}  # handle -> listener
+        self._lock = threading.Lock()
+        self._epoll = select.epoll()
+        if hasattr(os, "eventfd"):
+            self._wakeup = self._wakeup_write = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        else:
+            self._wakeup, self._wakeup_write = os.pipe()
+            os.set_blocking(self._wakeup, False)
+        self._epoll.register(self._wakeup, select.EPOLLIN)
+
+    def register(self, listener):
+        handle = int(listener.receiver.handle)
+        with self._lock:
+            self._listeners[handle] = listener
+            base.handle_pipeline(handle).fed = True
+        self._epoll.register(handle, select.EPOLLIN)
+
+    def unregister(self, listener):
+        with self._lock:  # waits for any packet being handed to the listener
+            for handle in [h for h, lst in self._listeners.items() if lst is listener]:
+                del self._listeners[handle]
+                base.handle_pipeline(handle).fed = False
+                try:
+                    self._epoll.unregister(handle)
+                except (OSError, ValueError):  # already closed
+                    pass
+
+    def run(self):
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("started epoll hub")
+        while self._active:
+            try:
+                events = self._epoll.poll()
+            except InterruptedError:
+                continue
+            for handle, _event in events:
+                if handle == self._wakeup:
+                    try:
+                        os.read(self._wakeup, 8)
+                    except BlockingIOError:
+                        pass
+                    continue
+                with self._lock:
+                    listener = self._listeners.get(handle)
+                    if listener is None:
+                        continue
+                    try:
+                        reply = base.read(handle, 0)
+                    except exceptions.NoReceiver:
+                        del self._listeners[handle]
+                        base.handle_pipeline(handle).fed = False
+                        listener._hub_notification(_DISCONNECTED)
+                        continue
+                    if reply:
+                        base.handle_pipeline(handle).dispatch(*reply, listener._hub_notification)
+        with self._lock:
+            self._epoll.close()
+            os.close(self._wakeup)
+            if self._wakeup_write != self._wakeup:
+                os.close(self._wakeup_write)
+
+    def stop(self):
+        """Tells the hub to stop, interrupting its wait. Does nothing if it was already told to."""
+        with self._lock:
+            if not self._active:
+                return
+            self._active = False
+            os.write(self._wakeup_write, (1).to_bytes(8, "little"))
+
+
+# Queued instead of a notification when the hub finds that the handle is no longer available
+_DISCONNECTED = object()
+# Size of the notification queue of a listener when the hub reads its notifications
+_HUB_QUEUE_SIZE = 256
+# Size of the notification queue of a listener that reads its own notifications
+_QUEUE_SIZE = 16
+
+_hub = None
+
+
+def enable_hub():
+    """Have all the listeners started from now on read through a single EventsHub thread.
+    :returns: ``True`` if the hub is available (epoll is only available on Linux).
+    """
+    global _hub
+    if _hub is None and hasattr(select, "epoll"):
+        _hub = EventsHub()
+        _hub.start()
+    return _hub is not None
+
+
 class EventsListener(threading.Thread):
     """Listener thread for notifications from the Unifying Receiver.
     Incoming packets will be passed to the callback function in sequence.
+    Notifications waiting for the callback are kept in a channel.Channel; its
+    capacity and overflow policy can be changed by setting queue_size and
+    overflow_policy before the listener starts. The block policy is not allowed,
+    as the hub thread and the listener itself must not wait for room.
     """
 
+    queue_size = None  # default depends on whether the hub is used
+    overflow_policy = channel.DROP_OLDEST
+
     def __init__(self, receiver, notifications_callback):
         try:
             path_name = receiver.path.split("/")[2]
@@ -121,13 +233,21 @@ class EventsListener(threading.Thread):
         self.daemon = True
         self._active = False
         self.receiver = receiver
-        self._queued_notifications = queue.Queue(16)
+        self._hub = _hub
+        assert self.overflow_policy != channel.BLOCK
+        self._queued_notifications = channel.Channel(
+            self.name, self.queue_size or (_HUB_QUEUE_SIZE if self._hub else _QUEUE_SIZE), self.overflow_policy
+        )
         self._notifications_callback = notifications_callback
 
     def run(self):
         self._active = True
-        # replace the handle with a threaded one
-        self.receiver.handle = _ThreadedHandle(self, self.receiver.path, self.receiver.handle)
+        if self._hub:
+            # the hub reads from the handle, so all threads can share it
+            self._hub.register(self)
+        else:
+            # replace the handle with a threaded one
+            self.receiver.handle = _ThreadedHandle(self, self.receiver.path, self.receiver.handle)
         if logger.isEnabledFor(logging.INFO):
             logger.info("started with %s (%d)", self.receiver, int(self.receiver.handle))
         self.has_started()
@@ -137,7 +257,13 @@ class EventsListener(threading.Thread):
                 self.receiver.changed(active=True, reason="initialization")
 
         while self._active:
-            if self._queued_notifications.empty():
+            if self._hub:
+                n = self._queued_notifications.get()  # sleep until the hub or stop() puts something
+                if n is _DISCONNECTED:
+                    logger.warning("%s disconnected", self.receiver.name)
+                    self.receiver.close()
+                    break
+            elif self._queued_notifications.empty():
                 try:
                     n = base.read(self.receiver.handle, _EVENT_READ_TIMEOUT)
                 except exceptions.NoReceiver:
@@ -154,12 +280,18 @@ class EventsListener(threading.Thread):
                 except Exception:
                     logger.exception("processing %s", n)
 
+        if self._hub:
+            self._hub.unregister(self)
+        if self._queued_notifications.dropped and logger.isEnabledFor(logging.INFO):
+            logger.info("%s notifications: %s", self.receiver, self._queued_notifications.stats())
         del self._queued_notifications
         self.has_stopped()
 
     def stop(self):
         """Tells the listener to stop as soon as possible."""
         self._active = False
+        if self._hub:
+            self._hub_notification(None)  # wake up the listener
 
     def has_started(self):
         """Called right after the thread has started, and before it starts
@@ -177,8 +309,19 @@ class EventsListener(threading.Thread):
         if self._active:  # and threading.current_thread() == self:
             # if logger.isEnabledFor(logging.DEBUG):
             #     logger.debug("queueing unhandled %s", n)
-            if not self._queued_notifications.full():
-                self._queued_notifications.put(n)
+            self._queued_notifications.put(n, block=False)
+
+    def queue_notifications(self, notifications):
+        """Queue notifications that arrived before the listener started, to be handled first."""
+        for n in notifications:
+            self._queued_notifications.put(n, block=False)
+
+    def _hub_notification(self, n):
+        # Called from the hub thread, so must not block
+        try:
+            self._queued_notifications.put(n, block=False)
+        except AttributeError:  # listener already stopped
+            pass
 
     def __bool__(self):
         return bool(self._active and self.receiver)
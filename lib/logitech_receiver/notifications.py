@@ -181,6 +181,12 @@ def _process_device_notification(device, n):
         logger.warning("%s: notification from invalid feature index %02X: %s", device, n.sub_id, n)
         return False
 
+    # Let handlers that subscribed to this feature on the device handle it first.
+    if feature is not None:
+        handling_ret = device.handle_feature_notification(n, feature)
+        if handling_ret is not None:
+            return handling_ret
+
     return _process_feature_notification(device, n, feature)
 
 
@@ -286,156 +292,250 @@ def _process_hidpp10_notification(device, n):
     logger.warning("%s: unrecognized %s", device, n)
 
 
+# Handlers for HID++ 2.0 feature notifications: int(feature) -> {address: handler}.
+# The handler under address None gets the notifications with addresses that have no handler of their own.
+_feature_handlers = {}
+
+
+def feature_handler(feature, address=None):
+    """Decorator that registers a handler(device, n) for notifications of a feature with a report address,
+    or for all its otherwise unhandled addresses if address is None."""
+
+    def register(handler):
+        _feature_handlers.setdefault(int(feature), {})[address] = handler
+        return handler
+
+    return register
+
+
 def _process_feature_notification(device, n, feature):
     if logger.isEnabledFor(logging.DEBUG):
         logger.debug("%s: notification for feature %s, report %s, data %s", device, feature, n.address >> 4, _strhex(n.data))
 
-    if feature == _F.BATTERY_STATUS:
-        if n.address == 0x00:
-            device.set_battery_info(hidpp20.decipher_battery_status(n.data)[1])
-        elif n.address == 0x10:
-            if logger.isEnabledFor(logging.INFO):
-                logger.info("%s: spurious BATTERY status %s", device, n)
-        else:
-            logger.warning("%s: unknown BATTERY %s", device, n)
+    handlers = _feature_handlers.get(int(feature)) if feature is not None else None
+    if handlers:
+        handler = handlers.get(n.address) or handlers.get(None)
+        if handler:
+            handler(device, n)
 
-    elif feature == _F.BATTERY_VOLTAGE:
-        if n.address == 0x00:
-            device.set_battery_info(hidpp20.decipher_battery_voltage(n.data)[1])
-        else:
-            logger.warning("%s: unknown VOLTAGE %s", device, n)
+    _diversion.process_notification(device, n, feature)
+    return True
 
-    elif feature == _F.UNIFIED_BATTERY:
-        if n.address == 0x00:
-            device.set_battery_info(hidpp20.decipher_battery_unified(n.data)[1])
-        else:
-            logger.warning("%s: unknown UNIFIED BATTERY %s", device, n)
 
-    elif feature == _F.ADC_MEASUREMENT:
-        if n.address == 0x00:
-            result = hidpp20.decipher_adc_measurement(n.data)
-            if result:
-                device.set_battery_info(result[1])
-            else:  # this feature is used to signal device becoming inactive
-                device.changed(active=False)
-        else:
-            logger.warning("%s: unknown ADC MEASUREMENT %s", device, n)
-
-    elif feature == _F.SOLAR_DASHBOARD:
-        if n.data[5:9] == b"GOOD":
-            charge, lux, adc = _unpack("!BHH", n.data[:5])
-            # guesstimate the battery voltage, emphasis on 'guess'
-            # status_text = '%1.2fV' % (adc * 2.67793237653 / 0x0672)
-            status_text = _Battery.STATUS.discharging
-            if n.address == 0x00:
-                device.set_battery_info(_Battery(charge, None, status_text, None))
-            elif n.address == 0x10:
-                if lux > 200:
-                    status_text = _Battery.STATUS.recharging
-                device.set_battery_info(_Battery(charge, None, status_text, None, lux))
-            elif n.address == 0x20:
-                if logger.isEnabledFor(logging.DEBUG):
-                    logger.debug("%s: Light Check button pressed", device)
-                device.changed(alert=_ALERT.SHOW_WINDOW)
-                # first cancel any reporting
-                # device.feature_request(_F.SOLAR_DASHBOARD)
-                # trigger a new report chain
-                reports_count = 15
-                reports_period = 2  # seconds
-                device.feature_request(_F.SOLAR_DASHBOARD, 0x00, reports_count, reports_period)
-            else:
-                logger.warning("%s: unknown SOLAR CHARGE %s", device, n)
-        else:
-            logger.warning("%s: SOLAR CHARGE not GOOD? %s", device, n)
+@feature_handler(_F.BATTERY_STATUS, 0x00)
+def _battery_status(device, n):
+    device.set_battery_info(hidpp20.decipher_battery_status(n.data)[1])
 
-    elif feature == _F.WIRELESS_DEVICE_STATUS:
-        if n.address == 0x00:
-            if logger.isEnabledFor(logging.DEBUG):
-                logger.debug("wireless status: %s", n)
-            reason = "powered on" if n.data[2] == 1 else None
-            if n.data[1] == 1:  # device is asking for software reconfiguration so need to change status
-                alert = _ALERT.NONE
-                device.changed(active=True, alert=alert, reason=reason, push=True)
-        else:
-            logger.warning("%s: unknown WIRELESS %s", device, n)
 
-    elif feature == _F.TOUCHMOUSE_RAW_POINTS:
-        if n.address == 0x00:
-            if logger.isEnabledFor(logging.INFO):
-                logger.info("%s: TOUCH MOUSE points %s", device, n)
-        elif n.address == 0x10:
-            touch = ord(n.data[:1])
-            button_down = bool(touch & 0x02)
-            mouse_lifted = bool(touch & 0x01)
-            if logger.isEnabledFor(logging.INFO):
-                logger.info("%s: TOUCH MOUSE status: button_down=%s mouse_lifted=%s", device, button_down, mouse_lifted)
-        else:
-            logger.warning("%s: unknown TOUCH MOUSE %s", device, n)
+@feature_handler(_F.BATTERY_STATUS, 0x10)
+def _battery_status_spurious(device, n):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s: spurious BATTERY status %s", device, n)
 
-    # TODO: what are REPROG_CONTROLS_V{2,3}?
-    elif feature == _F.REPROG_CONTROLS:
-        if n.address == 0x00:
-            if logger.isEnabledFor(logging.INFO):
-                logger.info("%s: reprogrammable key: %s", device, n)
-        else:
-            logger.warning("%s: unknown REPROG_CONTROLS %s", device, n)
 
-    elif feature == _F.BACKLIGHT2:
-        if n.address == 0x00:
-            level = _unpack("!B", n.data[1:2])[0]
-            if device.setting_callback:
-                device.setting_callback(device, _st.Backlight2Level, [level])
+@feature_handler(_F.BATTERY_STATUS)
+def _battery_status_unknown(device, n):
+    logger.warning("%s: unknown BATTERY %s", device, n)
+
+
+@feature_handler(_F.BATTERY_VOLTAGE, 0x00)
+def _battery_voltage(device, n):
+    device.set_battery_info(hidpp20.decipher_battery_voltage(n.data)[1])
+
+
+@feature_handler(_F.BATTERY_VOLTAGE)
+def _battery_voltage_unknown(device, n):
+    logger.warning("%s: unknown VOLTAGE %s", device, n)
 
-    elif feature == _F.REPROG_CONTROLS_V4:
+
+@feature_handler(_F.UNIFIED_BATTERY, 0x00)
+def _unified_battery(device, n):
+    device.set_battery_info(hidpp20.decipher_battery_unified(n.data)[1])
+
+
+@feature_handler(_F.UNIFIED_BATTERY)
+def _unified_battery_unknown(device, n):
+    logger.warning("%s: unknown UNIFIED BATTERY %s", device, n)
+
+
+@feature_handler(_F.ADC_MEASUREMENT, 0x00)
+def _adc_measurement(device, n):
+    result = hidpp20.decipher_adc_measurement(n.data)
+    if result:
+        device.set_battery_info(result[1])
+    else:  # this feature is used to signal device becoming inactive
+        device.changed(active=False)
+
+
+@feature_handler(_F.ADC_MEASUREMENT)
+def _adc_measurement_unknown(device, n):
+    logger.warning("%s: unknown ADC MEASUREMENT %s", device, n)
+
+
+@feature_handler(_F.SOLAR_DASHBOARD)
+def _solar_dashboard(device, n):
+    if n.data[5:9] == b"GOOD":
+        charge, lux, adc = _unpack("!BHH", n.data[:5])
+        # guesstimate the battery voltage, emphasis on 'guess'
+        # status_text = '%1.2fV' % (adc * 2.67793237653 / 0x0672)
+        status_text = _Battery.STATUS.discharging
         if n.address == 0x00:
-            if logger.isEnabledFor(logging.DEBUG):
-                cid1, cid2, cid3, cid4 = _unpack("!HHHH", n.data[:8])
-                logger.debug("%s: diverted controls pressed: 0x%x, 0x%x, 0x%x, 0x%x", device, cid1, cid2, cid3, cid4)
+            device.set_battery_info(_Battery(charge, None, status_text, None))
         elif n.address == 0x10:
-            if logger.isEnabledFor(logging.DEBUG):
-                dx, dy = _unpack("!hh", n.data[:4])
-                logger.debug("%s: rawXY dx=%i dy=%i", device, dx, dy)
+            if lux > 200:
+                status_text = _Battery.STATUS.recharging
+            device.set_battery_info(_Battery(charge, None, status_text, None, lux))
         elif n.address == 0x20:
             if logger.isEnabledFor(logging.DEBUG):
-                logger.debug("%s: received analyticsKeyEvents", device)
-        elif logger.isEnabledFor(logging.INFO):
-            logger.info("%s: unknown REPROG_CONTROLS_V4 %s", device, n)
-
-    elif feature == _F.HIRES_WHEEL:
-        if n.address == 0x00:
-            if logger.isEnabledFor(logging.INFO):
-                flags, delta_v = _unpack(">bh", n.data[:3])
-                high_res = (flags & 0x10) != 0
-                periods = flags & 0x0F
-                logger.info("%s: WHEEL: res: %d periods: %d delta V:%-3d", device, high_res, periods, delta_v)
-        elif n.address == 0x10:
-            ratchet = n.data[0]
-            if logger.isEnabledFor(logging.INFO):
-                logger.info("%s: WHEEL: ratchet: %d", device, ratchet)
-            if ratchet < 2:  # don't process messages with unusual ratchet values
-                if device.setting_callback:
-                    device.setting_callback(device, _st.ScrollRatchet, [2 if ratchet else 1])
+                logger.debug("%s: Light Check button pressed", device)
+            device.changed(alert=_ALERT.SHOW_WINDOW)
+            # first cancel any reporting
+            # device.feature_request(_F.SOLAR_DASHBOARD)
+            # trigger a new report chain
+            reports_count = 15
+            reports_period = 2  # seconds
+            device.feature_request(_F.SOLAR_DASHBOARD, 0x00, reports_count, reports_period)
         else:
-            if logger.isEnabledFor(logging.INFO):
-                logger.info("%s: unknown WHEEL %s", device, n)
+            logger.warning("%s: unknown SOLAR CHARGE %s", device, n)
+    else:
+        logger.warning("%s: SOLAR CHARGE not GOOD? %s", device, n)
 
-    elif feature == _F.ONBOARD_PROFILES:
-        if n.address > 0x10:
-            if logger.isEnabledFor(logging.INFO):
-                logger.info("%s: unknown ONBOARD PROFILES %s", device, n)
-        else:
-            if n.address == 0x00:
-                profile_sector = _unpack("!H", n.data[:2])[0]
-                if profile_sector:
-                    _st.profile_change(device, profile_sector)
-            elif n.address == 0x10:
-                resolution_index = _unpack("!B", n.data[:1])[0]
-                profile_sector = _unpack("!H", device.feature_request(_F.ONBOARD_PROFILES, 0x40)[:2])[0]
-                if device.setting_callback:
-                    for profile in device.profiles.profiles.values() if device.profiles else []:
-                        if profile.sector == profile_sector:
-                            device.setting_callback(device, _st.AdjustableDpi, [profile.resolutions[resolution_index]])
-                            break
 
-    _diversion.process_notification(device, n, feature)
-    return True
+@feature_handler(_F.WIRELESS_DEVICE_STATUS, 0x00)
+def _wireless_device_status(device, n):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("wireless status: %s", n)
+    reason = "powered on" if n.data[2] == 1 else None
+    if n.data[1] == 1:  # device is asking for software reconfiguration so need to change status
+        alert = _ALERT.NONE
+        device.changed(active=True, alert=alert, reason=reason, push=True)
+
+
+@feature_handler(_F.WIRELESS_DEVICE_STATUS)
+def _wireless_device_status_unknown(device, n):
+    logger.warning("%s: unknown WIRELESS %s", device, n)
+
+
+@feature_handler(_F.TOUCHMOUSE_RAW_POINTS, 0x00)
+def _touchmouse_points(device, n):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s: TOUCH MOUSE points %s", device, n)
+
+
+@feature_handler(_F.TOUCHMOUSE_RAW_POINTS, 0x10)
+def _touchmouse_status(device, n):
+    touch = ord(n.data[:1])
+    button_down = bool(touch & 0x02)
+    mouse_lifted = bool(touch & 0x01)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s: TOUCH MOUSE status: button_down=%s mouse_lifted=%s", device, button_down, mouse_lifted)
+
+
+@feature_handler(_F.TOUCHMOUSE_RAW_POINTS)
+def _touchmouse_unknown(device, n):
+    logger.warning("%s: unknown TOUCH MOUSE %s", device, n)
+
+
+# TODO: what are REPROG_CONTROLS_V{2,3}?
+@feature_handler(_F.REPROG_CONTROLS, 0x00)
+def _reprog_controls(device, n):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s: reprogrammable key: %s", device, n)
+
+
+@feature_handler(_F.REPROG_CONTROLS)
+def _reprog_controls_unknown(device, n):
+    logger.warning("%s: unknown REPROG_CONTROLS %s", device, n)
+
+
+def _settings_changed(device, *setting_classes):
+    """The device changed these settings by itself, so what is known about them is stale."""
+    state = getattr(device, "settings_state", None)
+    if state is not None:
+        state.invalidate(*(s.name for s in setting_classes))
+
+
+@feature_handler(_F.BACKLIGHT2, 0x00)
+def _backlight2(device, n):
+    level = _unpack("!B", n.data[1:2])[0]
+    _settings_changed(device, _st.Backlight2Level)
+    if device.setting_callback:
+        device.setting_callback(device, _st.Backlight2Level, [level])
+
+
+@feature_handler(_F.REPROG_CONTROLS_V4, 0x00)
+def _reprog_controls_v4_diverted(device, n):
+    if logger.isEnabledFor(logging.DEBUG):
+        cid1, cid2, cid3, cid4 = _unpack("!HHHH", n.data[:8])
+        logger.debug("%s: diverted controls pressed: 0x%x, 0x%x, 0x%x, 0x%x", device, cid1, cid2, cid3, cid4)
+
+
+@feature_handler(_F.REPROG_CONTROLS_V4, 0x10)
+def _reprog_controls_v4_raw_xy(device, n):
+    if logger.isEnabledFor(logging.DEBUG):
+        dx, dy = _unpack("!hh", n.data[:4])
+        logger.debug("%s: rawXY dx=%i dy=%i", device, dx, dy)
+
+
+@feature_handler(_F.REPROG_CONTROLS_V4, 0x20)
+def _reprog_controls_v4_analytics(device, n):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: received analyticsKeyEvents", device)
+
+
+@feature_handler(_F.REPROG_CONTROLS_V4)
+def _reprog_controls_v4_unknown(device, n):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s: unknown REPROG_CONTROLS_V4 %s", device, n)
+
+
+@feature_handler(_F.HIRES_WHEEL, 0x00)
+def _hires_wheel(device, n):
+    if logger.isEnabledFor(logging.INFO):
+        flags, delta_v = _unpack(">bh", n.data[:3])
+        high_res = (flags & 0x10) != 0
+        periods = flags & 0x0F
+        logger.info("%s: WHEEL: res: %d periods: %d delta V:%-3d", device, high_res, periods, delta_v)
+
+
+@feature_handler(_F.HIRES_WHEEL, 0x10)
+def _hires_wheel_ratchet(device, n):
+    ratchet = n.data[0]
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s: WHEEL: ratchet: %d", device, ratchet)
+    if ratchet < 2:  # don't process messages with unusual ratchet values
+        _settings_changed(device, _st.ScrollRatchet)
+        if device.setting_callback:
+            device.setting_callback(device, _st.ScrollRatchet, [2 if ratchet else 1])
+
+
+@feature_handler(_F.HIRES_WHEEL)
+def _hires_wheel_unknown(device, n):
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s: unknown WHEEL %s", device, n)
+
+
+@feature_handler(_F.ONBOARD_PROFILES, 0x00)
+def _onboard_profiles_profile(device, n):
+    profile_sector = _unpack("!H", n.data[:2])[0]
+    if profile_sector:
+        _settings_changed(device, _st.OnboardProfiles, _st.AdjustableDpi, _st.ReportRate)
+        _st.profile_change(device, profile_sector)
+
+
+@feature_handler(_F.ONBOARD_PROFILES, 0x10)
+def _onboard_profiles_resolution(device, n):
+    resolution_index = _unpack("!B", n.data[:1])[0]
+    _settings_changed(device, _st.AdjustableDpi)
+    profile_sector = _unpack("!H", device.feature_request(_F.ONBOARD_PROFILES, 0x40)[:2])[0]
+    if device.setting_callback:
+        for profile in device.profiles.profiles.values() if device.profiles else []:
+            if profile.sector == profile_sector:
+                device.setting_callback(device, _st.AdjustableDpi, [profile.resolutions[resolution_index]])
+                break
+
+
+@feature_handler(_F.ONBOARD_PROFILES)
+def _onboard_profiles_unknown(device, n):
+    if n.address > 0x10 and logger.isEnabledFor(logging.INFO):
+        logger.info("%s: unknown ONBOARD PROFILES %s", device, n)
@@ -16,11 +16,15 @@
 
 import logging
 import math
+import threading as _threading
 
 from struct import unpack as _unpack
+from time import monotonic as _monotonic
 from time import sleep as _sleep
 
+from . import hidpp20 as _hidpp20
 from . import hidpp20_constants as _hidpp20_constants
+from . import trace as _trace
 from .common import NamedInt as _NamedInt
 from .common import NamedInts as _NamedInts
 from .common import bytes2int as _bytes2int
@@ -46,6 +50,170 @@ KIND = _NamedInts(
 )
 
 
+# Where the value of a setting in a settings state came from
+FROM_DEVICE = "device"  # read from the device
+FROM_PERSISTER = "persister"  # from the configuration or set in Solaar, not known to be on the device yet
+ASSUMED = "assumed"  # written to the device, so assumed to be on it
+
+
+class SettingState:
+    """What is known about the value of a setting: the value, where it came from, and when."""
+
+    __slots__ = ("value", "source", "timestamp", "stale", "_known")
+
+    def __init__(self, value, source):
+        self.value = value
+        self.source = source
+        self.timestamp = _monotonic()
+        self.stale = False
+        # a copy of the value known to be on the device, as map values are changed in place
+        self._known = None if source == FROM_PERSISTER else _copy_value(value)
+
+    def fresh(self, max_age=None):
+        """Whether the value is known to be on the device, and has not been invalidated or changed since."""
+        return (
+            not self.stale
+            and self.source != FROM_PERSISTER
+            and self.value == self._known
+            and (max_age is None or _monotonic() - self.timestamp <= max_age)
+        )
+
+    def __repr__(self):
+        return f"<SettingState({self.value!r} from {self.source}{' stale' if self.stale else ''})>"
+
+
+class SettingsState:
+    """The state of the settings of a device, by setting name.
+
+    Settings read and write through it, so values read from or written to the device are
+    used without touching the wire again until they are invalidated, like when the device
+    reports that it changed a setting or that it lost its settings. Subscribers are called
+    with the setting name and its new state whenever a value is recorded or invalidated.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._subscribers = []
+        self._lock = _threading.Lock()
+        self.writes = SettingWrites()  # queued writes to the settings
+
+    def get(self, name):
+        return self._states.get(name)
+
+    def value(self, name):
+        state = self._states.get(name)
+        return state.value if state is not None else None
+
+    def set(self, name, value, source):
+        state = SettingState(value, source)
+        with self._lock:
+            self._states[name] = state
+        self._notify(name, state)
+        return state
+
+    def invalidate(self, *names):
+        """Mark the states of settings, or of all of them, as stale, so that their values are read again."""
+        with self._lock:
+            invalidated = [(n, s) for n, s in self._states.items() if (not names or n in names) and not s.stale]
+            for _name, state in invalidated:
+                state.stale = True
+        for name, state in invalidated:
+            self._notify(name, state)
+
+    def subscribe(self, callback):
+        """Call callback(name, state) on changes to the state of settings. Returns a function that unsubscribes."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def _notify(self, name, state):
+        for callback in list(self._subscribers):
+            try:
+                callback(name, state)
+            except Exception as e:
+                logger.warning("settings state subscriber %s failed for %s: %r", callback, name, e)
+
+
+class SettingWrites:
+    """Writes to the settings of a device, made one at a time on a writer thread.
+
+    Queued writes only name the setting and key to write, the value written is the latest one
+    when the write is made, so rapid changes to the same setting and key, like from a thumb wheel
+    rule, become one write per round trip to the device. Settings are persisted once their queue
+    has been written, not after each write.
+    """
+
+    def __init__(self):
+        self._pending = {}  # (setting, key) -> callbacks, in the order they were queued
+        self._saves = {}  # settings to persist once the queue has been written
+        self._cond = _threading.Condition()
+        self._thread = None
+        self.queued = 0
+        self.written = 0
+
+    def queue(self, setting, key=None, save=True, callback=None):
+        with self._cond:
+            if key is None:  # writing the whole value makes writes of its keys unnecessary
+                for pending in [p for p in self._pending if p[0] is setting and p[1] is not None]:
+                    self._pending.setdefault((setting, None), []).extend(self._pending.pop(pending))
+            self._pending.setdefault((setting, key), [])
+            if callback:
+                self._pending[(setting, key)].append(callback)
+            if save:
+                self._saves[setting] = True
+            self.queued += 1
+            if self._thread is None:
+                self._thread = _threading.Thread(name="SettingWrites", target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._saves:
+                    self._thread = None
+                    self._cond.notify_all()
+                    return
+                if self._pending:
+                    write = next(iter(self._pending))
+                    callbacks = self._pending.pop(write)
+                else:
+                    write = None
+                    saves, self._saves = list(self._saves), {}
+            if write:
+                self._write(*write, callbacks)
+            else:
+                for setting in saves:
+                    setting._pre_write(True)
+
+    def _write(self, setting, key, callbacks):
+        try:  # write a copy, as the value can be changed by newer writes while it is written
+            value = _copy_value(setting._value)
+            if key is None:
+                result = setting.write(value, save=False)
+            else:
+                result = setting.write_key_value(key, value[int(key)], save=False)
+        except Exception as e:
+            logger.warning("%s: error writing %s: %r", setting._device, setting.name, e)
+            result = None
+        self.written += 1
+        for callback in callbacks:
+            callback(result)
+
+    def wait(self, timeout=None):
+        """Wait for the queued writes to be made. Returns whether they were."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._thread is None, timeout)
+
+    def stats(self):
+        return {"queued": self.queued, "written": self.written, "pending": len(self._pending)}
+
+
 def bool_or_toggle(current, new):
     if isinstance(new, bool):
         return new
@@ -72,13 +240,14 @@ class Setting:
     rw_options = {}
     validator_class = None
     validator_options = {}
+    keyed_writes = False  # whether a key is written by itself, not by writing the whole value
 
     def __init__(self, device, rw, validator):
         self._device = device
         self._rw = rw
         self._validator = validator
         self.kind = getattr(self._validator, "kind", None)
-        self._value = None
+        self._state = getattr(device, "settings_state", None) or SettingsState()
 
     @classmethod
     def build(cls, device):
@@ -99,6 +268,24 @@ class Setting:
     def val_to_string(self, value):
         return self._validator.to_string(value)
 
+    @property
+    def _value(self):
+        return self._state.value(self.name)
+
+    def _record(self, value, source):
+        self._state.set(self.name, value, source)
+
+    def _record_written(self, value):
+        """Record that the value was written to the device, given as a copy made before it was written."""
+        if self._value == value:  # unless a newer value was queued while this one was written
+            self._record(self._value, ASSUMED)
+
+    def _on_device(self):
+        """Whether the value of the setting is known to be on the device.
+        Never for features that the driver sets up again when the device connects."""
+        state = self._state.get(self.name)
+        return state is not None and state.fresh() and self.feature not in _DRIVER_FEATURES
+
     @property
     def choices(self):
         assert hasattr(self, "_value")
@@ -115,22 +302,32 @@ class Setting:
             return (self._validator.min_value, self._validator.max_value)
 
     def _pre_read(self, cached, key=None):
+        """Returns whether the read can be answered from the settings state, never for uncached reads.
+        Cached reads of persisted settings use the configured value, others need a value known to be on the device.
+        """
         if self.persist and self._value is None and getattr(self._device, "persister", None):
             # We haven't read a value from the device yet,
             # maybe we have something in the configuration.
-            self._value = self._device.persister.get(self.name)
+            value = self._device.persister.get(self.name)
+            if value is not None:
+                self._record(value, FROM_PERSISTER)
         if cached and self._value is not None:
             if getattr(self._device, "persister", None) and self.name not in self._device.persister:
                 # If this is a new device (or a new setting for an old device),
                 # make sure to save its current value for the next time.
                 self._device.persister[self.name] = self._value if self.persist else None
+        if not cached:
+            return False  # asked to read the device
+        state = self._state.get(self.name)
+        if state is None or state.value is None:
+            return False
+        return self.persist or not state.stale
 
     def read(self, cached=True):
         assert hasattr(self, "_value")
         assert hasattr(self, "_device")
 
-        self._pre_read(cached)
-        if cached and self._value is not None:
+        if self._pre_read(cached):
             if logger.isEnabledFor(logging.DEBUG):
                 logger.debug("%s: cached value %r on %s", self.name, self._value, self._device)
             return self._value
@@ -138,7 +335,7 @@ class Setting:
         if self._device.online:
             reply = self._rw.read(self._device)
             if reply:
-                self._value = self._validator.validate_read(reply)
+                self._record(self._validator.validate_read(reply), FROM_DEVICE)
             if self._value is not None and self._device.persister and self.name not in self._device.persister:
                 # Don't update the persister if it already has a value,
                 # otherwise the first read might overwrite the value we wanted.
@@ -155,9 +352,24 @@ class Setting:
             self._device.persister[self.name] = self._value if self.persist else None
 
     def update(self, value, save=True):
-        self._value = value
+        self._record(value, FROM_PERSISTER)
         self._pre_write(save)
 
+    def queue_write(self, value, key=None, save=True, callback=None):
+        """Change the value, or the value of a key, now and queue the write to the device, see SettingWrites.
+        Returns False, and changes nothing, if the device is offline.
+        """
+        if not self._device.online:
+            return False
+        if key is None:
+            self.update(value, save=False)
+        else:
+            if not self._value:
+                self.read()
+            self.update_key_value(key, value, save=False)
+        self._state.writes.queue(self, key if self.keyed_writes else None, save, callback)
+        return True
+
     def write(self, value, save=True):
         assert hasattr(self, "_value")
         assert hasattr(self, "_device")
@@ -167,6 +379,7 @@ class Setting:
             logger.debug("%s: write %r to %s", self.name, value, self._device)
 
         if self._device.online:
+            written = _copy_value(value)  # value can change while it is written
             if self._value != value:
                 self.update(value, save)
 
@@ -185,8 +398,10 @@ class Setting:
                 reply = self._rw.write(self._device, data_bytes)
                 if not reply:
                     # tell whomever is calling that the write failed
+                    self._state.invalidate(self.name)
                     return None
 
+            self._record_written(written)
             return value
 
     def acceptable(self, args, current):
@@ -205,11 +420,25 @@ class Setting:
             try:
                 self.write(value, save=False)
             except Exception as e:
+                self._state.invalidate(self.name)
                 if logger.isEnabledFor(logging.WARNING):
                     logger.warning(
                         "%s: error applying value %s so ignore it (%s): %s", self.name, self._value, self._device, repr(e)
                     )
 
+    def _apply_request(self, value):
+        """The feature request that applies value, if this setting is written with one request that needs no read.
+        Such requests can be made together with the others for the same feature."""
+        if (
+            type(self).write is Setting.write
+            and type(self._rw) is FeatureRW
+            and not self._rw.no_reply
+            and not getattr(self._validator, "needs_current_value", False)
+        ):
+            data_bytes = self._validator.prepare_write(value, None)
+            if data_bytes is not None:
+                return self._rw.feature, self._rw.write_fnid, self._rw.prefix, data_bytes, self._rw.suffix
+
     def __str__(self):
         if hasattr(self, "_value"):
             assert hasattr(self, "_device")
@@ -229,24 +458,28 @@ class Settings(Setting):
     """A setting descriptor for multiple choices, being a map from keys to values.
     Needs to be instantiated for each specific device."""
 
+    keyed_writes = True
+
     def read(self, cached=True):
         assert hasattr(self, "_value")
         assert hasattr(self, "_device")
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: settings read %r from %s", self.name, self._value, self._device)
 
-        self._pre_read(cached)
-
-        if cached and self._value is not None:
+        if self._pre_read(cached):
             return self._value
 
         if self._device.online:
             reply_map = {}
-            for key in self._validator.choices:
-                reply = self._rw.read(self._device, key)
+            keys = list(self._validator.choices)
+            if hasattr(self._rw, "read_many"):  # read all the keys in one batch
+                replies = self._rw.read_many(self._device, keys)
+            else:
+                replies = [self._rw.read(self._device, key) for key in keys]
+            for key, reply in zip(keys, replies):
                 if reply:
                     reply_map[int(key)] = self._validator.validate_read(reply, key)
-            self._value = reply_map
+            self._record(reply_map, FROM_DEVICE)
             if getattr(self._device, "persister", None) and self.name not in self._device.persister:
                 # Don't update the persister if it already has a value,
                 # otherwise the first read might overwrite the value we wanted.
@@ -260,8 +493,7 @@ class Settings(Setting):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: settings read %r key %r from %s", self.name, self._value, key, self._device)
 
-        self._pre_read(cached)
-        if cached and self._value is not None:
+        if self._pre_read(cached):
             return self._value[int(key)]
 
         if self._device.online:
@@ -281,6 +513,7 @@ class Settings(Setting):
             logger.debug("%s: settings write %r to %s", self.name, map, self._device)
 
         if self._device.online:
+            written = _copy_value(map)
             self.update(map, save)
             for key, value in map.items():
                 data_bytes = self._validator.prepare_write(int(key), value)
@@ -290,10 +523,12 @@ class Settings(Setting):
                     reply = self._rw.write(self._device, int(key), data_bytes)
                     if not reply:
                         return None
+            self._record_written(written)
             return map
 
     def update_key_value(self, key, value, save=True):
         self._value[int(key)] = value
+        self._record(self._value, FROM_PERSISTER)
         self._pre_write(save)
 
     def write_key_value(self, key, value, save=True):
@@ -329,15 +564,15 @@ class LongSettings(Setting):
     The validator must return a list.
     Needs to be instantiated for each specific device."""
 
+    keyed_writes = True
+
     def read(self, cached=True):
         assert hasattr(self, "_value")
         assert hasattr(self, "_device")
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: settings read %r from %s", self.name, self._value, self._device)
 
-        self._pre_read(cached)
-
-        if cached and self._value is not None:
+        if self._pre_read(cached):
             return self._value
 
         if self._device.online:
@@ -348,7 +583,7 @@ class LongSettings(Setting):
                 reply = self._rw.read(self._device, r)
                 if reply:
                     reply_map[int(item)] = self._validator.validate_read_item(reply, item)
-            self._value = reply_map
+            self._record(reply_map, FROM_DEVICE)
             if getattr(self._device, "persister", None) and self.name not in self._device.persister:
                 # Don't update the persister if it already has a value,
                 # otherwise the first read might overwrite the value we wanted.
@@ -362,8 +597,7 @@ class LongSettings(Setting):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: settings read %r item %r from %s", self.name, self._value, item, self._device)
 
-        self._pre_read(cached)
-        if cached and self._value is not None:
+        if self._pre_read(cached):
             return self._value[int(item)]
 
         if self._device.online:
@@ -383,6 +617,7 @@ class LongSettings(Setting):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: long settings write %r to %s", self.name, map, self._device)
         if self._device.online:
+            written = _copy_value(map)
             self.update(map, save)
             for item, value in map.items():
                 data_bytes_list = self._validator.prepare_write(self._value)
@@ -394,10 +629,12 @@ class LongSettings(Setting):
                             reply = self._rw.write(self._device, data_bytes)
                             if not reply:
                                 return None
+            self._record_written(written)
             return map
 
     def update_key_value(self, key, value, save=True):
         self._value[int(key)] = value
+        self._record(self._value, FROM_PERSISTER)
         self._pre_write(save)
 
     def write_key_value(self, item, value, save=True):
@@ -433,9 +670,7 @@ class BitFieldSetting(Setting):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: settings read %r from %s", self.name, self._value, self._device)
 
-        self._pre_read(cached)
-
-        if cached and self._value is not None:
+        if self._pre_read(cached):
             return self._value
 
         if self._device.online:
@@ -443,7 +678,7 @@ class BitFieldSetting(Setting):
             reply = self._do_read()
             if reply:
                 reply_map = self._validator.validate_read(reply)
-            self._value = reply_map
+            self._record(reply_map, FROM_DEVICE)
             if getattr(self._device, "persister", None) and self.name not in self._device.persister:
                 # Don't update the persister if it already has a value,
                 # otherwise the first read might overwrite the value we wanted.
@@ -460,15 +695,13 @@ class BitFieldSetting(Setting):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: settings read %r key %r from %s", self.name, self._value, key, self._device)
 
-        self._pre_read(cached)
-
-        if cached and self._value is not None:
+        if self._pre_read(cached):
             return self._value[int(key)]
 
         if self._device.online:
             reply = self._do_read_key(key)
             if reply:
-                self._value = self._validator.validate_read(reply)
+                self._record(self._validator.validate_read(reply), FROM_DEVICE)
             if getattr(self._device, "persister", None) and self.name not in self._device.persister:
                 self._device.persister[self.name] = self._value if self.persist else None
             return self._value[int(key)]
@@ -484,6 +717,7 @@ class BitFieldSetting(Setting):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: bit field settings write %r to %s", self.name, map, self._device)
         if self._device.online:
+            written = _copy_value(map)
             self.update(map, save)
             data_bytes = self._validator.prepare_write(self._value)
             if data_bytes is not None:
@@ -495,10 +729,12 @@ class BitFieldSetting(Setting):
                     reply = self._rw.write(self._device, b)
                     if not reply:
                         return None
+            self._record_written(written)
             return map
 
     def update_key_value(self, key, value, save=True):
         self._value[int(key)] = value
+        self._record(self._value, FROM_PERSISTER)
         self._pre_write(save)
 
     def write_key_value(self, key, value, save=True):
@@ -515,6 +751,7 @@ class BitFieldSetting(Setting):
                 self.read()
             value = bool(value)
             self.update_key_value(key, value, save)
+            written = _copy_value(self._value)
 
             data_bytes = self._validator.prepare_write(self._value)
             if data_bytes is not None:
@@ -526,6 +763,7 @@ class BitFieldSetting(Setting):
                     reply = self._rw.write(self._device, b)
                     if not reply:
                         return None
+                self._record_written(written)  # the whole map was written
 
             return value
 
@@ -536,7 +774,10 @@ class BitFieldWithOffsetAndMaskSetting(BitFieldSetting):
     Needs to be instantiated for each specific device."""
 
     def _do_read(self):
-        return {r: self._rw.read(self._device, r) for r in self._validator.prepare_read()}
+        reads = self._validator.prepare_read()
+        if hasattr(self._rw, "read_many"):  # read all the offsets in one batch
+            return dict(zip(reads, self._rw.read_many(self._device, reads)))
+        return {r: self._rw.read(self._device, r) for r in reads}
 
     def _do_read_key(self, key):
         r = self._validator.prepare_read_key(key)
@@ -552,15 +793,14 @@ class RangeFieldSetting(Setting):
         assert hasattr(self, "_device")
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: settings read %r from %s", self.name, self._value, self._device)
-        self._pre_read(cached)
-        if cached and self._value is not None:
+        if self._pre_read(cached):
             return self._value
         if self._device.online:
             reply_map = {}
             reply = self._do_read()
             if reply:
                 reply_map = self._validator.validate_read(reply)
-            self._value = reply_map
+            self._record(reply_map, FROM_DEVICE)
             if getattr(self._device, "persister", None) and self.name not in self._device.persister:
                 # Don't update the persister if it already has a value,
                 # otherwise the first read might overwrite the value we wanted.
@@ -580,6 +820,7 @@ class RangeFieldSetting(Setting):
         if logger.isEnabledFor(logging.DEBUG):
             logger.debug("%s: range field setting write %r to %s", self.name, map, self._device)
         if self._device.online:
+            written = _copy_value(map)
             self.update(map, save)
             data_bytes = self._validator.prepare_write(self._value)
             if data_bytes is not None:
@@ -590,8 +831,14 @@ class RangeFieldSetting(Setting):
                     return None
             elif logger.isEnabledFor(logging.WARNING):
                 logger.warning("%s: range field setting no data to write", self.name)
+            self._record_written(written)
             return map
 
+    def update_key_value(self, key, value, save=True):
+        self._value[int(key)] = value
+        self._record(self._value, FROM_PERSISTER)
+        self._pre_write(save)
+
     def write_key_value(self, key, value, save=True):
         assert key is not None
         assert value is not None
@@ -646,6 +893,15 @@ class FeatureRW:
         assert self.feature is not None
         return device.feature_request(self.feature, self.read_fnid, self.prefix, self.read_prefix, data_bytes)
 
+    def read_many(self, device, data_bytes_list):
+        assert self.feature is not None
+        # make several feature calls at once, raising the first error as a single call would
+        return _hidpp20._raise_errors(
+            device.feature_requests(
+                [(self.feature, self.read_fnid, self.prefix, self.read_prefix, data_bytes) for data_bytes in data_bytes_list]
+            )
+        )
+
     def write(self, device, data_bytes):
         assert self.feature is not None
         reply = device.feature_request(
@@ -680,6 +936,12 @@ class FeatureRWMap(FeatureRW):
         key_bytes = _int2bytes(key, self.key_byte_count)
         return device.feature_request(self.feature, self.read_fnid, key_bytes)
 
+    def read_many(self, device, keys):
+        assert self.feature is not None
+        return _hidpp20._raise_errors(
+            device.feature_requests([(self.feature, self.read_fnid, _int2bytes(key, self.key_byte_count)) for key in keys])
+        )
+
     def write(self, device, key, data_bytes):
         assert self.feature is not None
         key_bytes = _int2bytes(key, self.key_byte_count)
@@ -1423,25 +1685,24 @@ class ActionSettingRW:
         return _int2bytes(self.key.key, 2) if self.active and self.key else b"\x00\x00"
 
     def write(self, device, data_bytes):
-        def handler(device, n):  # Called on notification events from the device
-            if n.sub_id < 0x40 and device.features.get_feature(n.sub_id) == _hidpp20_constants.FEATURE.REPROG_CONTROLS_V4:
-                if n.address == 0x00:
-                    cids = _unpack("!HHHH", n.data[:8])
-                    if not self.pressed and int(self.key.key) in cids:  # trigger key pressed
-                        self.pressed = True
-                        self.press_action()
-                    elif self.pressed:
-                        if int(self.key.key) not in cids:  # trigger key released
-                            self.pressed = False
-                            self.release_action()
-                        else:
-                            for key in cids:
-                                if key and not key == self.key.key:  # some other diverted key pressed
-                                    self.key_action(key)
-                elif n.address == 0x10:
-                    if self.pressed:
-                        dx, dy = _unpack("!hh", n.data[:4])
-                        self.move_action(dx, dy)
+        def handler(device, n):  # Called on REPROG_CONTROLS_V4 notification events from the device
+            if n.address == 0x00:
+                cids = _unpack("!HHHH", n.data[:8])
+                if not self.pressed and int(self.key.key) in cids:  # trigger key pressed
+                    self.pressed = True
+                    self.press_action()
+                elif self.pressed:
+                    if int(self.key.key) not in cids:  # trigger key released
+                        self.pressed = False
+                        self.release_action()
+                    else:
+                        for key in cids:
+                            if key and not key == self.key.key:  # some other diverted key pressed
+                                self.key_action(key)
+            elif n.address == 0x10:
+                if self.pressed:
+                    dx, dy = _unpack("!hh", n.data[:4])
+                    self.move_action(dx, dy)
 
         divertSetting = next(filter(lambda s: s.name == self.divert_setting_name, device.settings), None)
         if divertSetting is None:
@@ -1457,7 +1718,7 @@ class ActionSettingRW:
                     divertSetting.write_key_value(int(self.key.key), 1)
                     if self.device.setting_callback:
                         self.device.setting_callback(device, type(divertSetting), [self.key.key, 1])
-                device.add_notification_handler(self.name, handler)
+                device.add_notification_handler(self.name, handler, _hidpp20_constants.FEATURE.REPROG_CONTROLS_V4)
                 self.activate_action()
             else:
                 logger.error("cannot enable %s on %s for key %s", self.name, device, key)
@@ -1478,7 +1739,14 @@ class ActionSettingRW:
 
 
 class RawXYProcessing:
-    """Special class for processing RawXY action messages initiated by pressing a key with rawXY diversion capability"""
+    """Special class for processing RawXY action messages initiated by pressing a key with rawXY diversion capability
+
+    Movement reports come at up to 1000 per second, so they are coalesced: the deltas of all the reports received
+    within window seconds of the last move_action are added up and passed to the next one. The window starts when
+    move_action returns, so reports that arrive while it is slow are merged instead of queueing up.
+    """
+
+    window = 0.004  # seconds of movement reports to coalesce into one move_action
 
     def __init__(self, device, name=""):
         self.device = device
@@ -1488,30 +1756,46 @@ class RawXYProcessing:
         self.active = False
         self.feature_offset = device.features[_hidpp20_constants.FEATURE.REPROG_CONTROLS_V4]
         assert self.feature_offset is not False
-
-    def handler(self, device, n):  # Called on notification events from the device
-        if n.sub_id < 0x40 and device.features.get_feature(n.sub_id) == _hidpp20_constants.FEATURE.REPROG_CONTROLS_V4:
-            if n.address == 0x00:
-                cids = _unpack("!HHHH", n.data[:8])
-                ## generalize to list of keys
-                if not self.initiating_key:  # no initiating key pressed
-                    for k in self.keys:
-                        if int(k.key) in cids:  # initiating key that was pressed
-                            self.initiating_key = k
-                    if self.initiating_key:
-                        self.press_action(self.initiating_key)
-                else:
-                    if int(self.initiating_key.key) not in cids:  # initiating key released
-                        self.initiating_key = None
-                        self.release_action()
-                    else:
-                        for key in cids:
-                            if key and key != self.initiating_key.key:
-                                self.key_action(key)
-            elif n.address == 0x10:
+        self._dx = self._dy = 0  # coalesced movement not yet passed to move_action
+        self._pending = 0  # number of movement reports coalesced
+        self._last_move = 0.0
+
+    def handler(self, device, n):  # Called on REPROG_CONTROLS_V4 notification events from the device
+        if n.address == 0x00:
+            cids = _unpack("!HHHH", n.data[:8])
+            ## generalize to list of keys
+            if not self.initiating_key:  # no initiating key pressed
+                for k in self.keys:
+                    if int(k.key) in cids:  # initiating key that was pressed
+                        self.initiating_key = k
                 if self.initiating_key:
-                    dx, dy = _unpack("!hh", n.data[:4])
-                    self.move_action(dx, dy)
+                    self._dx = self._dy = self._pending = 0
+                    self._last_move = 0.0  # pass on the first movement report at once
+                    self.press_action(self.initiating_key)
+            else:
+                self._flush_moves()  # key events must come after the movement before them
+                if int(self.initiating_key.key) not in cids:  # initiating key released
+                    self.initiating_key = None
+                    self.release_action()
+                else:
+                    for key in cids:
+                        if key and key != self.initiating_key.key:
+                            self.key_action(key)
+        elif n.address == 0x10:
+            if self.initiating_key:
+                dx, dy = _unpack("!hh", n.data[:4])
+                self._dx += dx
+                self._dy += dy
+                self._pending += 1
+                if _monotonic() - self._last_move >= self.window:
+                    self._flush_moves()
+
+    def _flush_moves(self):
+        if self._pending:
+            dx, dy = self._dx, self._dy
+            self._dx = self._dy = self._pending = 0
+            self.move_action(dx, dy)
+            self._last_move = _monotonic()
 
     def start(self, key):
         device_key = next((k for k in self.device.keys if k.key == key), None)
@@ -1520,7 +1804,7 @@ class RawXYProcessing:
             if not self.active:
                 self.active = True
                 self.activate_action()
-                self.device.add_notification_handler(self.name, self.handler)
+                self.device.add_notification_handler(self.name, self.handler, _hidpp20_constants.FEATURE.REPROG_CONTROLS_V4)
             device_key.set_rawXY_reporting(True)
 
     def stop(self, key):  # only stop if this is the active key
@@ -1557,15 +1841,82 @@ class RawXYProcessing:
         pass
 
 
+# Settings of features that the Linux HID++ driver sets up itself whenever a device connects
+_DRIVER_FEATURES = (_hidpp20_constants.FEATURE.HI_RES_SCROLLING, _hidpp20_constants.FEATURE.HIRES_WHEEL)
+DRIVER_DELAY = 0.2  # seconds to leave the driver before applying settings, to get out of a race condition with it
+
+
+def _copy_value(value):
+    if isinstance(value, dict):
+        return {k: _copy_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_value(v) for v in value]
+    return value
+
+
+def _apply_batch(device, batch):
+    """Make the requests that apply settings of the same feature all at once."""
+    try:
+        replies = device.feature_requests([request for _s, _value, request in batch])
+    except Exception as e:
+        replies = [e] * len(batch)
+    for (s, value, _request), reply in zip(batch, replies):
+        if reply is not None and not isinstance(reply, Exception):
+            s._record_written(value)
+        elif logger.isEnabledFor(logging.WARNING):
+            logger.warning("%s: error applying value %s so ignore it (%s): %r", s.name, value, device, reply)
+
+
 def apply_all_settings(device):
+    """Apply the persisted settings to a device in order, writing only the ones that it is not known to have already.
+    Consecutive settings of the same feature that are written with a single request each are written together.
+    :returns: a list of (setting name, seconds) for the settings that were applied.
+    """
+    started = _monotonic()
     if device.features and _hidpp20_constants.FEATURE.HIRES_WHEEL in device.features:
-        _sleep(0.2)  # delay to try to get out of race condition with Linux HID++ driver
+        _sleep(DRIVER_DELAY)
     persister = getattr(device, "persister", None)
     sensitives = persister.get("_sensitive", {}) if persister else {}
+    report = []
+    batch = []  # [(setting, value, request)] for the same feature, not yet written
+
+    def timed(names, apply, *args):
+        start = _monotonic()
+        apply(*args)
+        end = _monotonic()
+        report.extend((name, (end - start) / len(names)) for name in names)
+        if _trace.active:
+            _trace.add("settings", "apply " + ", ".join(names), start, end, device=str(device))
+
+    def flush():
+        if batch:
+            timed([s.name for s, _value, _request in batch], _apply_batch, device, list(batch))
+            batch.clear()
+
     for s in device.settings:
-        ignore = sensitives.get(s.name, False)
-        if ignore != SENSITIVITY_IGNORE:
-            s.apply()
+        if sensitives.get(s.name, False) == SENSITIVITY_IGNORE:
+            continue
+        value = s.read(s.persist) if s.persist else None
+        if value is not None and s._on_device():
+            continue  # already on the device
+        request = s._apply_request(value) if value is not None else None
+        if batch and (not request or batch[0][0].feature != s.feature):
+            flush()
+        if request:
+            batch.append((s, _copy_value(value), request))
+        else:
+            timed([s.name], s.apply)
+    flush()
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "%s: applied %d settings in %.3fs: %s",
+            device,
+            len(report),
+            _monotonic() - started,
+            ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in report),
+        )
+    return report
 
 
 Setting.validator_class = BooleanValidator
@@ -14,9 +14,12 @@
 ## with this program; if not, write to the Free Software Foundation, Inc.,
 ## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import concurrent.futures as _futures
 import logging
 import socket as _socket
+import threading as _threading
 
+from functools import partial as _partial
 from logging import WARN as _WARN
 from struct import pack as _pack
 from struct import unpack as _unpack
@@ -27,14 +30,13 @@ from . import descriptors as _descriptors
 from . import hidpp10_constants as _hidpp10_constants
 from . import hidpp20
 from . import hidpp20_constants as _hidpp20_constants
-from . import notify as _notify
 from . import special_keys as _special_keys
+from . import trace as _trace
 from .base import _HIDPP_Notification as _HIDPP_Notification
 from .common import NamedInt as _NamedInt
 from .common import NamedInts as _NamedInts
 from .common import bytes2int as _bytes2int
 from .common import int2bytes as _int2bytes
-from .diversion import process_notification as _process_notification
 from .i18n import _
 from .settings import KIND as _KIND
 from .settings import ActionSettingRW as _ActionSettingRW
@@ -772,6 +774,8 @@ class DpiSlidingXY(_RawXYProcessing):
             self.device.setting_callback(self.device, type(self.dpiSetting), [newDpi])
 
     def displayNewDpi(self, newDpiIdx):
+        from . import notify as _notify  # loads Gtk, so only when there is something to show
+
         if _notify.available:
             reason = "DPI %d [min %d, max %d]" % (self.dpiChoices[newDpiIdx], self.dpiChoices[0], self.dpiChoices[-1])
             _notify.show(self.device, reason)
@@ -781,6 +785,7 @@ class DpiSlidingXY(_RawXYProcessing):
         if self.fsmState == "idle":
             self.fsmState = "pressed"
             self.dx = 0.0
+            self.currDpi = self.dpiSetting.read()  # DPI doesn't change until release, so don't read it for each move
             # While in 'moved' state, the index into 'dpiChoices' of the currently selected DPI setting
             self.movingDpiIdx = None
 
@@ -800,14 +805,14 @@ class DpiSlidingXY(_RawXYProcessing):
         if self.device.features.get_feature_version(_F.REPROG_CONTROLS_V4) >= 5 and self.starting:
             self.starting = False  # hack to ignore strange first movement report from MX Master 3S
             return
-        currDpi = self.dpiSetting.read()
+        currDpi = self.currDpi
         self.dx += float(dx) / float(currDpi) * 15.0  # yields a more-or-less DPI-independent dx of about 5/cm
         if self.fsmState == "pressed":
             if abs(self.dx) >= 1.0:
                 self.fsmState = "moved"
                 self.movingDpiIdx = self.dpiChoices.index(currDpi)
         elif self.fsmState == "moved":
-            currIdx = self.dpiChoices.index(self.dpiSetting.read())
+            currIdx = self.dpiChoices.index(currDpi)
             newMovingDpiIdx = min(max(currIdx + int(self.dx), 0), len(self.dpiChoices) - 1)
             if newMovingDpiIdx != self.movingDpiIdx:
                 self.movingDpiIdx = newMovingDpiIdx
@@ -832,6 +837,7 @@ class MouseGesturesXY(_RawXYProcessing):
             self.fsmState = "pressed"
             self.initialize_data()
             self.data = [key.key]
+            self.dpi = self.dpiSetting.read() if self.dpiSetting else 1000  # read once per gesture, not for each move
 
     def release_action(self):
         if self.fsmState == "pressed":
@@ -841,6 +847,8 @@ class MouseGesturesXY(_RawXYProcessing):
                 logger.info("mouse gesture notification %s", self.data)
             payload = _pack("!" + (len(self.data) * "h"), *self.data)
             notification = _HIDPP_Notification(0, 0, 0, 0, payload)
+            from .diversion import process_notification as _process_notification  # the rules engine is loaded when used
+
             _process_notification(self.device, notification, _F.MOUSE_GESTURE)
             self.fsmState = "idle"
 
@@ -852,7 +860,7 @@ class MouseGesturesXY(_RawXYProcessing):
                 return
             if self.lastEv is not None and now - self.lastEv > 200.0:
                 self.push_mouse_event()
-            dpi = self.dpiSetting.read() if self.dpiSetting else 1000
+            dpi = self.dpi
             dx = float(dx) / float(dpi) * 15.0  # This multiplier yields a more-or-less DPI-independent dx of about 5/cm
             self.dx += dx
             dy = float(dy) / float(dpi) * 15.0  # This multiplier yields a more-or-less DPI-independent dx of about 5/cm
@@ -1574,6 +1582,62 @@ def check_feature(device, sclass):
         return False  # differentiate from an error-free determination that the setting is not supported
 
 
+# features probed for settings at the same time, for all devices
+# the threads live on, as each of them opens its own handle on each receiver it makes requests through
+_PROBE_WORKERS = 4
+_probe_pool = None
+_probe_pool_lock = _threading.Lock()
+
+
+def _probe_executor():
+    global _probe_pool
+    with _probe_pool_lock:
+        if _probe_pool is None:
+            _probe_pool = _futures.ThreadPoolExecutor(_PROBE_WORKERS, thread_name_prefix="SettingsProbe")
+        return _probe_pool
+
+
+def _absent_settings(device, firmware):
+    """The names of the settings found to be absent from the device, if found with the same firmware."""
+    if not device.persister:
+        return []
+    if firmware and device.persister.get("_absent_firmware") != firmware:
+        return []  # the firmware changed, so look for all the settings again
+    return device.persister.get("_absent", [])
+
+
+def _probe_group(device, group):
+    """Build the settings of one feature in turn, skipping settings whose name is already taken."""
+    detected = {}
+    built = set()
+    with _trace.span("settings", str(group[0].feature), device=str(device)):
+        for sclass in group:
+            if sclass.name not in built:
+                detected[sclass] = check_feature(device, sclass)
+                if detected[sclass]:
+                    built.add(sclass.name)
+    return detected
+
+
+def _probe(device, sclasses):
+    """Build settings, with the settings of different features probed concurrently.
+    Settings that share a name are built in turn, as only one of them can be on a device.
+    Tables that several settings need, like the key and gesture tables, are read once by the device and shared.
+    """
+    groups = {}
+    names = {}
+    for sclass in sclasses:
+        groups.setdefault(names.setdefault(sclass.name, sclass.feature), []).append(sclass)
+    detected = {}
+    if len(groups) <= 1:
+        for group in groups.values():
+            detected.update(_probe_group(device, group))
+    else:
+        for group_detected in _probe_executor().map(_partial(_probe_group, device), groups.values()):
+            detected.update(group_detected)
+    return detected
+
+
 # Returns True if device was queried to find features, False otherwise
 def check_feature_settings(device, already_known):
     """Auto-detect device settings by the HID++ 2.0 features they have."""
@@ -1581,28 +1645,37 @@ def check_feature_settings(device, already_known):
         return False
     if device.protocol and device.protocol < 2.0:
         return False
-    absent = device.persister.get("_absent", []) if device.persister else []
-    newAbsent = []
+    firmware = device._firmware_key() if device.persister else None
+    absent = _absent_settings(device, firmware)
+    candidates = []
     for sclass in SETTINGS:
         if sclass.feature:
             known_present = device.persister and sclass.name in device.persister
             if not any(s.name == sclass.name for s in already_known) and (known_present or sclass.name not in absent):
-                setting = check_feature(device, sclass)
-                if isinstance(setting, list):
-                    for s in setting:
-                        already_known.append(s)
-                    if sclass.name in newAbsent:
-                        newAbsent.remove(sclass.name)
-                elif setting:
-                    already_known.append(setting)
-                    if sclass.name in newAbsent:
-                        newAbsent.remove(sclass.name)
-                elif setting is None:
-                    if sclass.name not in newAbsent and sclass.name not in absent and sclass.name not in device.persister:
-                        newAbsent.append(sclass.name)
-    if device.persister and newAbsent:
-        absent.extend(newAbsent)
-        device.persister["_absent"] = absent
+                candidates.append(sclass)
+    device.features.lookup(sclass.feature for sclass in candidates)
+    detected = _probe(device, candidates)
+    newAbsent = []
+    for sclass in candidates:  # in the order of SETTINGS
+        if sclass not in detected or any(s.name == sclass.name for s in already_known):
+            continue
+        setting = detected[sclass]
+        if isinstance(setting, list):
+            for s in setting:
+                already_known.append(s)
+            if sclass.name in newAbsent:
+                newAbsent.remove(sclass.name)
+        elif setting:
+            already_known.append(setting)
+            if sclass.name in newAbsent:
+                newAbsent.remove(sclass.name)
+        elif setting is None:
+            if sclass.name not in newAbsent and sclass.name not in absent and sclass.name not in device.persister:
+                newAbsent.append(sclass.name)
+    if device.persister and (newAbsent or (firmware and device.persister.get("_absent_firmware") != firmware)):
+        device.persister["_absent"] = absent + newAbsent
+        if firmware:
+            device.persister["_absent_firmware"] = firmware
     return True
 
 
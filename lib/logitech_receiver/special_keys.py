@@ -1201,13 +1201,9 @@ HORIZONTAL_SCROLL = _NamedInts(
 )
 HORIZONTAL_SCROLL._fallback = lambda x: f"unknown horizontal scroll:{x:04X}"
 
-# Construct universe for Persistent Remappable Keys setting (only for supported values)
-KEYS = _UnsortedNamedInts()
 KEYS_Default = 0x7FFFFFFF  # Special value to reset key to default - has to be different from all others
-KEYS[KEYS_Default] = "Default"  # Value to reset to default
-KEYS[0] = "None"  # Value for no output
 
-# Add HID keys plus modifiers
+# Modifiers for HID keys
 modifiers = {
     0x00: "",
     0x01: "Cntrl+",
@@ -1221,21 +1217,31 @@ modifiers = {
     0x0A: "Meta+Shift+",
     0x0C: "Meta+Alt+",
 }
-for val, name in modifiers.items():
-    for key in USB_HID_KEYCODES:
-        KEYS[(ACTIONID.Key << 24) + (int(key) << 8) + val] = name + str(key)
 
-# Add HID Consumer Codes
-for code in HID_CONSUMERCODES:
-    KEYS[(ACTIONID.Consumer << 24) + (int(code) << 8)] = str(code)
 
-# Add Mouse Buttons
-for code in MOUSE_BUTTONS:
-    KEYS[(ACTIONID.Mouse << 24) + (int(code) << 8)] = str(code)
+# Construct universe for Persistent Remappable Keys setting (only for supported values)
+def _keys():
+    keys = _UnsortedNamedInts()
+    keys[KEYS_Default] = "Default"  # Value to reset to default
+    keys[0] = "None"  # Value for no output
+
+    # Add HID keys plus modifiers
+    for val, name in modifiers.items():
+        for key in USB_HID_KEYCODES:
+            keys[(ACTIONID.Key << 24) + (int(key) << 8) + val] = name + str(key)
+
+    # Add HID Consumer Codes
+    for code in HID_CONSUMERCODES:
+        keys[(ACTIONID.Consumer << 24) + (int(code) << 8)] = str(code)
 
-# Add Horizontal Scroll
-for code in HORIZONTAL_SCROLL:
-    KEYS[(ACTIONID.Hscroll << 24) + (int(code) << 8)] = str(code)
+    # Add Mouse Buttons
+    for code in MOUSE_BUTTONS:
+        keys[(ACTIONID.Mouse << 24) + (int(code) << 8)] = str(code)
+
+    # Add Horizontal Scroll
+    for code in HORIZONTAL_SCROLL:
+        keys[(ACTIONID.Hscroll << 24) + (int(code) << 8)] = str(code)
+    return keys
 
 
 # Construct subsets for known devices
@@ -1243,14 +1249,29 @@ def persistent_keys(action_ids):
     keys = _UnsortedNamedInts()
     keys[KEYS_Default] = "Default"  # Value to reset to default
     keys[0] = "No Output (only as default)"
-    for key in KEYS:
+    for key in __getattr__("KEYS"):
         if (int(key) >> 24) in action_ids:
             keys[int(key)] = str(key)
     return keys
 
 
-KEYS_KEYS_CONSUMER = persistent_keys([ACTIONID.Key, ACTIONID.Consumer])
-KEYS_KEYS_MOUSE_HSCROLL = persistent_keys([ACTIONID.Key, ACTIONID.Mouse, ACTIONID.Hscroll])
+# The key universes have thousands of entries and are only used by the Persistent Remappable Keys setting,
+# so they are built the first time they are used instead of when this module is imported
+_LAZY_TABLES = {
+    "KEYS": _keys,
+    "KEYS_KEYS_CONSUMER": lambda: persistent_keys([ACTIONID.Key, ACTIONID.Consumer]),
+    "KEYS_KEYS_MOUSE_HSCROLL": lambda: persistent_keys([ACTIONID.Key, ACTIONID.Mouse, ACTIONID.Hscroll]),
+}
+
+
+def __getattr__(name):
+    table = globals().get(name)
+    if table is None:
+        if name not in _LAZY_TABLES:
+            raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+        table = globals()[name] = _LAZY_TABLES[name]()
+    return table
+
 
 COLORS = _UnsortedNamedInts(
     {
@@ -0,0 +1,142 @@
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+# Startup tracing - timed spans of the phases of startup and the number of HID++ requests made to
+# each device, collected from start() at the start of the process until finish() is called once startup is over.
+# They can be written as a Chrome trace event file (chrome://tracing, Perfetto, speedscope) and summarized.
+
+import json as _json
+import os as _os
+import threading as _threading
+
+from time import perf_counter as _now
+
+origin = _now()  # start of the trace, may be moved earlier with set_origin
+active = False  # collecting, from start() until finish()
+on_finish = None  # called after finish()
+
+_spans = []  # (name, category, start, end, thread ident, args)
+_threads = {}  # thread ident -> thread name
+_requests = {}  # (handle, devnumber) -> number of requests
+_labels = {}  # handle -> path
+_requests_lock = _threading.Lock()
+
+
+def start():
+    """Start collecting, in processes that will call finish() once started up."""
+    global active
+    active = True
+
+
+def set_origin(started):
+    """Start the trace at an earlier perf_counter time, like when the process started importing."""
+    global origin
+    origin = min(origin, started)
+
+
+class span:
+    """Time a phase of startup, as a context manager: with span("configuration", "load"): ..."""
+
+    __slots__ = ("name", "category", "args", "start")
+
+    def __init__(self, category, name, **args):
+        self.category = category
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if active:
+            add(self.category, self.name, self.start, _now(), **self.args)
+
+
+def add(category, name, start, end, **args):
+    """Record a span that was timed elsewhere, with perf_counter times."""
+    if active:
+        thread = _threading.current_thread()
+        _threads[thread.ident] = thread.name
+        _spans.append((name, category, start, end, thread.ident, args))
+
+
+def label(handle, path):
+    """Name a handle by its device path in request counts."""
+    if active:
+        _labels[int(handle)] = path
+
+
+def count_request(handle, devnumber):
+    if active:
+        key = (int(handle), devnumber)
+        with _requests_lock:  # requests are made from several threads during startup
+            _requests[key] = _requests.get(key, 0) + 1
+
+
+def finish():
+    """Stop collecting, at the end of startup."""
+    global active
+    if active:
+        add("startup", "startup", origin, _now())
+        active = False
+        if on_finish:
+            on_finish()
+
+
+def request_counts():
+    """The number of HID++ requests (pings included) by device, as {"path device n": count}."""
+    return {f"{_labels.get(handle, handle)} device {devnumber}": n for (handle, devnumber), n in _requests.items()}
+
+
+def chrome_trace():
+    """The trace in the Chrome trace event format."""
+    pid = _os.getpid()
+    events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}} for tid, name in _threads.items()
+    ]
+    for name, category, start, end, tid, args in _spans:
+        events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - origin) * 1e6),
+                "dur": round((end - start) * 1e6),
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"requests": request_counts()}}
+
+
+def write(path):
+    with open(path, "w") as trace_file:
+        _json.dump(chrome_trace(), trace_file)
+
+
+def summary(limit=25):
+    """The longest spans and the devices with the most requests, as printable lines."""
+    lines = ["startup phases, longest first:"]
+    for name, category, start, end, _tid, args in sorted(_spans, key=lambda s: s[2] - s[3])[:limit]:
+        details = " ".join(f"{k}={v}" for k, v in args.items())
+        lines.append(f"  {(end - start) * 1000:9.1f} ms  at {(start - origin) * 1000:8.1f} ms  {category}: {name} {details}")
+    counts = sorted(request_counts().items(), key=lambda item: -item[1])
+    if counts:
+        lines.append("HID++ requests by device:")
+        lines.extend(f"  {n:9d}  {device}" for device, n in counts)
+    return lines
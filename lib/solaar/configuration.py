@@ -18,10 +18,13 @@
 import json as _json
 import logging
 import os as _os
+import stat as _stat
+import tempfile as _tempfile
 import threading
 
 import yaml as _yaml
 
+from logitech_receiver import trace as _trace
 from logitech_receiver.common import NamedInt as _NamedInt
 
 from solaar import __version__
@@ -41,6 +44,7 @@ _KEY_UNIT_ID = "_unitId"
 _KEY_ABSENT = "_absent"
 _KEY_SENSITIVE = "_sensitive"
 _config = []
+_saved_text = None  # the configuration as last written, to skip saves that would not change the file
 
 
 def _load():
@@ -64,8 +68,9 @@ def _load():
         path = None
     if logger.isEnabledFor(logging.DEBUG):
         logger.debug("load => %s", loaded_config)
-    global _config
+    global _config, _saved_text
     _config = _parse_config(loaded_config, path)
+    _saved_text = None
 
 
 def _parse_config(loaded_config, config_path):
@@ -116,6 +121,7 @@ def _device_entry_from_config_dict(data, discard_derived_properties):
         }
     if discard_derived_properties:
         data.pop("_absent", None)
+        data.pop("_absent_firmware", None)
         data.pop("_battery", None)
     return _DeviceEntry(**data)
 
@@ -145,15 +151,59 @@ def save(defer=False):
                 save_timer.start()
 
 
+def _entry_yaml(entry):
+    """The YAML of one element of the configuration, as it appears in the YAML of the whole list.
+    Device entries keep their YAML and only dump again when they have been set since or their contents changed."""
+    if not isinstance(entry, _DeviceEntry):
+        return _yaml.dump([entry], default_flow_style=False)
+    contents = repr(entry)
+    if entry._yaml is None or entry._yaml[0] != contents:
+        entry._yaml = (contents, _yaml.dump([entry], default_flow_style=None, width=150))
+    return entry._yaml[1]
+
+
+def _dump(config):
+    return "".join(_entry_yaml(entry) for entry in config)
+
+
+def _write_file(text):
+    """Write a new file and rename it over the old one, so that a crash never leaves a truncated configuration.
+    The file that the configuration path links to is replaced, keeping the link, and the new file gets its mode.
+    """
+    path = _os.path.realpath(_yaml_file_path)
+    fd, temp_path = _tempfile.mkstemp(prefix=".config-", suffix=".yaml", dir=_os.path.dirname(path))
+    try:
+        with _os.fdopen(fd, "w") as config_file:
+            try:
+                _os.chmod(fd, _stat.S_IMODE(_os.stat(path).st_mode))
+            except FileNotFoundError:
+                pass  # a new file, only readable by its owner
+            config_file.write(text)
+            config_file.flush()
+            _os.fsync(config_file.fileno())
+        _os.replace(temp_path, path)
+    except Exception:
+        try:
+            _os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
 def do_save():
-    global save_timer
+    global save_timer, _saved_text
     with configuration_lock:
         if save_timer:
             save_timer.cancel()
             save_timer = None
         try:
-            with open(_yaml_file_path, "w") as config_file:
-                _yaml.dump(_config, config_file, default_flow_style=None, width=150)
+            text = _dump(_config)
+            if text == _saved_text:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("configuration unchanged, not saving to %s", _yaml_file_path)
+                return
+            _write_file(text)
+            _saved_text = text
             if logger.isEnabledFor(logging.INFO):
                 logger.info("saved %s to %s", _config, _yaml_file_path)
         except Exception as e:
@@ -185,11 +235,27 @@ def _convert_json(json_dict):
 class _DeviceEntry(dict):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self._yaml = None  # (repr of the contents, YAML of the entry) when last saved, None when set since
 
     def __setitem__(self, key, value):
+        # values such as profiles are changed in place and set again, their repr does not show the change
+        self._yaml = None
         super().__setitem__(key, value)
         save(defer=True)
 
+    def __delitem__(self, key):
+        self._yaml = None
+        super().__delitem__(key)
+
+    def pop(self, *args):
+        self._yaml = None
+        return super().pop(*args)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._yaml = None
+        return super().setdefault(key, default)
+
     def update(self, name, wpid, serial, modelId, unitId):
         if name and name != self.get(_KEY_NAME):
             super().__setitem__(_KEY_NAME, name)
@@ -240,7 +306,8 @@ def persister(device):
 
     with configuration_lock:
         if not _config:
-            _load()
+            with _trace.span("load", "configuration"):
+                _load()
         entry = None
         # some devices report modelId and unitId as zero so use name and serial for them
         modelId = device.modelId if device.modelId != "000000000000" else device._name if device.modelId else None
@@ -25,16 +25,15 @@ import platform
 import signal
 import sys
 import tempfile
+import time
 
 from traceback import format_exc
 
+import logitech_receiver.trace as _trace
+
 import solaar.cli as _cli
 import solaar.configuration as _configuration
 import solaar.i18n as _i18n
-import solaar.listener as _listener
-import solaar.ui as _ui
-import solaar.ui.common as _common
-import solaar.upower as _upower
 
 from solaar import NAME
 from solaar import __version__
@@ -79,6 +78,9 @@ def _parse_arguments():
         help="unifying receiver to use; the first detected receiver if unspecified. Example: /dev/hidraw2",
     )
     arg_parser.add_argument("--restart-on-wake-up", action="store_true", help="restart Solaar on sleep wake-up (experimental)")
+    arg_parser.add_argument(
+        "--epoll", action="store_true", help="read from all receivers in a single thread using epoll (experimental)"
+    )
     arg_parser.add_argument(
         "-w", "--window", choices=("show", "hide", "only"), help="start with window showing / hidden / only (no tray icon)"
     )
@@ -89,6 +91,13 @@ def _parse_arguments():
         help="prefer regular battery / symbolic battery / solaar icons",
     )
     arg_parser.add_argument("--tray-icon-size", type=int, help="explicit size for tray icons")
+    arg_parser.add_argument(
+        "--profile-startup",
+        nargs="?",
+        const=os.path.join(tempfile.gettempdir(), "solaar-startup.json"),
+        metavar="FILE",
+        help="trace startup to a Chrome trace event FILE and print a summary of its slowest phases",
+    )
     arg_parser.add_argument("-V", "--version", action="version", version="%(prog)s " + __version__)
     arg_parser.add_argument("--help-actions", action="store_true", help="print help for the optional actions")
     arg_parser.add_argument("action", nargs=argparse.REMAINDER, choices=_cli.actions, help="optional actions to perform")
@@ -140,24 +149,62 @@ def _handlesig(signl, stack):
         sys.exit(0)
 
 
-def main():
+# On SIGUSR1, print the counters of the notification and task queues to stderr
+def _report_channels(signl, stack):
+    import logitech_receiver.channel as _channel
+
+    for name, stats in sorted(_channel.stats().items()):
+        print(f"{NAME.lower()}: queue {name}: {stats}", file=sys.stderr)
+
+
+def _report_startup(path):
+    try:
+        _trace.write(path)
+        print(f"{NAME.lower()}: startup trace written to {path}")
+    except OSError as e:
+        print(f"{NAME.lower()}: cannot write startup trace to {path}: {e}")
+    print("\n".join(_trace.summary()))
+
+
+def main(started=None):
+    """Run Solaar; started is the perf_counter time the process started importing it, for the startup trace."""
+    _trace.start()
+    if started:
+        _trace.set_origin(started)
+        _trace.add("import", "solaar", started, time.perf_counter())
     if platform.system() not in ("Darwin", "Windows"):
         _require("pyudev", "python3-pyudev")
+        import hidapi.udev as _udev
+
+        cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+        _udev.enable_descriptor_cache(os.path.join(cache_home, "solaar", "descriptors"))
 
     args = _parse_arguments()
     if not args:
         return
     if args.action:
         # if any argument, run comandline and exit
+        _trace.finish()
         return _cli.run(args.action, args.hidraw_path)
+    if args.profile_startup:
+        _trace.on_finish = lambda: _report_startup(args.profile_startup)
 
     gi = _require("gi", "python3-gi (in Ubuntu) or python3-gobject (in Fedora)")
     _require("gi.repository.Gtk", "gir1.2-gtk-3.0", gi, "Gtk", "3.0")
 
+    # the GUI, the listeners and the rules engine are loaded only now, so that the command line does not pay for them
+    import logitech_receiver.listener as _receiver_listener
+
+    import solaar.listener as _listener
+    import solaar.ui as _ui
+    import solaar.ui.common as _common
+    import solaar.upower as _upower
+
     # handle ^C in console
     signal.signal(signal.SIGINT, signal.SIG_DFL)
     signal.signal(signal.SIGINT, _handlesig)
     signal.signal(signal.SIGTERM, _handlesig)
+    signal.signal(signal.SIGUSR1, _report_channels)
 
     udev_file = "42-logitech-unify-permissions.rules"
     if (
@@ -178,6 +225,9 @@ def main():
 
         _configuration.defer_saves = True  # allow configuration saves to be deferred
 
+        if args.epoll and not _receiver_listener.enable_hub():
+            logger.warning("epoll is not available, using a polling thread for each receiver")
+
         # main UI event loop
         _ui.run_loop(_listener.start_all, _listener.stop_all, args.window != "only", args.window != "hide")
     except Exception:
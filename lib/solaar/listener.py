@@ -15,6 +15,7 @@
 ## with this program; if not, write to the Free Software Foundation, Inc.,
 ## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 
+import concurrent.futures as _futures
 import errno as _errno
 import logging
 import subprocess
@@ -31,6 +32,7 @@ from logitech_receiver import exceptions
 from logitech_receiver import hidpp10_constants as _hidpp10_constants
 from logitech_receiver import listener as _listener
 from logitech_receiver import notifications as _notifications
+from logitech_receiver import trace as _trace
 
 from . import configuration
 
@@ -81,7 +83,7 @@ class ReceiverListener(_listener.EventsListener):
         if logger.isEnabledFor(logging.INFO):
             logger.info("%s: notifications listener has stopped", r)
 
-        # because udev is not notifying us about device removal, make sure to clean up in _all_listeners
+        # the listener may stop before its device removal is reported, make sure to clean up in _all_listeners
         _all_listeners.pop(r.path, None)
 
         # this causes problems but what is it doing (pfps) - r.status = _('The receiver was unplugged.')
@@ -231,18 +233,32 @@ class ReceiverListener(_listener.EventsListener):
 
 _all_listeners = {}  # all known receiver listeners, listeners that stop on their own may remain here
 
+_OPEN_WORKERS = 4  # receivers and devices opened at the same time on startup
+_PROBE_WORKERS = 8  # devices paired to receivers pinged and probed at the same time on startup
+_open_pool = None
+_probe_pool = None
+_generation = 0  # changed by stop_all, so that opens still in progress from before are dropped
+_startup_pending = 0
+
+
+def _open(device_info):
+    if not device_info.isDevice:
+        return _receiver.ReceiverFactory.create_receiver(device_info, _setting_callback)
+    return _device.DeviceFactory.create_device(device_info, _setting_callback)
 
-def _start(device_info):
-    assert _status_callback and _setting_callback
-    isDevice = device_info.isDevice
-    if not isDevice:
-        receiver = _receiver.ReceiverFactory.create_receiver(device_info, _setting_callback)
-    else:
-        receiver = _device.DeviceFactory.create_device(device_info, _setting_callback)
-        configuration.attach_to(receiver)
 
+def _listen(device_info, receiver, notifications=()):
     if receiver:
+        listener_thread = _all_listeners.get(device_info.path)
+        if listener_thread:  # opened again while this one was being opened
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("%s already has a listener, closing %s", device_info.path, receiver)
+            receiver.close()
+            return listener_thread
+        if device_info.isDevice:
+            configuration.attach_to(receiver)
         rl = ReceiverListener(receiver, _status_callback)
+        rl.queue_notifications(notifications)
         rl.start()
         _all_listeners[device_info.path] = rl
         return rl
@@ -250,15 +266,116 @@ def _start(device_info):
     logger.warning("failed to open %s", device_info)
 
 
+def _start(device_info):
+    assert _status_callback and _setting_callback
+    return _listen(device_info, _open(device_info))
+
+
+class _ProbeHandle(int):
+    """The handle of a receiver or device while it is probed, keeping the notifications that turn up for its listener."""
+
+    def __new__(cls, handle):
+        self = super().__new__(cls, handle)
+        self.notifications = []
+        return self
+
+    def notifications_hook(self, n):
+        self.notifications.append(n)
+
+
+def _probe(device):
+    """Ping a device and read what the UI shows first, so that it is known before the listener starts."""
+    with _trace.span("probe", f"{device.path or device.receiver.path}:{device.number}"):
+        try:
+            if device.ping() and device.protocol >= 2.0 and device.features:
+                device.codename  # noqa: B018
+                device.name  # noqa: B018
+        except Exception as e:
+            logger.warning("%s: probing failed: %s", device, e)
+
+
+def _open_and_probe(generation, probe_pool, device_info):
+    """Open a receiver or device and probe its devices, on a startup worker thread, then start its listener.
+    Each device is probed as soon as it is found, while the receiver looks for the next one.
+    """
+    if generation != _generation:  # stopped before its turn came
+        return
+    receiver = error = None
+    notifications = []
+    with _trace.span("open", device_info.path):
+        try:
+            receiver = _open(device_info)
+        except Exception as e:
+            error = e
+    if receiver and receiver.handle and generation == _generation:
+        handle = receiver.handle = _ProbeHandle(receiver.handle)
+        try:
+            devices = [receiver] if device_info.isDevice else receiver
+            for future in [probe_pool.submit(_probe, d) for d in devices]:
+                future.result()
+        except Exception as e:
+            logger.warning("%s: looking for devices failed: %s", receiver, e)
+        finally:
+            if receiver.handle is handle:  # not closed
+                receiver.handle = int(handle)
+            notifications = handle.notifications
+    GLib.idle_add(_opened, generation, device_info, receiver, error, notifications)
+
+
+def _opened(generation, device_info, receiver, error, notifications):
+    global _startup_pending
+    if generation != _generation:  # stopped in the meantime
+        if receiver:
+            receiver.close()
+        return False
+    if isinstance(error, (OSError, exceptions.NoReceiver)):
+        _add_failed(device_info, error, 3)
+    elif error is not None:
+        logger.error("failed to open %s: %s", device_info, error)
+    else:
+        _listen(device_info, receiver, notifications)
+    _startup_pending -= 1
+    if not _startup_pending:
+        _startup_done()
+    return False
+
+
+def _startup_done():
+    if _trace.active:
+        _trace.finish()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("\n".join(_trace.summary(10)))
+
+
 def start_all():
+    """Start listening to all receivers and devices.
+    They are opened, and their devices probed, on worker threads; each listener starts when its receiver is ready.
+    """
+    global _open_pool, _probe_pool, _startup_pending
+    assert _status_callback and _setting_callback
     stop_all()  # just in case this it called twice in a row...
     if logger.isEnabledFor(logging.INFO):
         logger.info("starting receiver listening threads")
-    for device_info in _base.receivers_and_devices():
-        _process_receiver_event("add", device_info)
+    _open_pool = _futures.ThreadPoolExecutor(_OPEN_WORKERS, thread_name_prefix="StartupOpen")
+    _probe_pool = _futures.ThreadPoolExecutor(_PROBE_WORKERS, thread_name_prefix="StartupProbe")
+    with _trace.span("udev", "enumerate"):
+        device_infos = list(_base.receivers_and_devices())
+    _startup_pending = len(device_infos)
+    if not device_infos:
+        _startup_done()
+    for device_info in device_infos:
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("receiver event add %s", device_info)
+        _open_pool.submit(_open_and_probe, _generation, _probe_pool, device_info)
 
 
 def stop_all():
+    global _generation, _open_pool, _probe_pool
+    _generation += 1
+    if _open_pool is not None:  # opens already under way finish on their own, and are dropped
+        _open_pool.shutdown(wait=False)
+        _probe_pool.shutdown(wait=False)
+        _open_pool = _probe_pool = None
     listeners = list(_all_listeners.values())
     _all_listeners.clear()
     if listeners:
@@ -315,7 +432,12 @@ def setup_scanner(status_changed_callback, setting_changed_callback, error_callb
 def _process_add(device_info, retry):
     try:
         _start(device_info)
-    except OSError as e:
+    except (OSError, exceptions.NoReceiver) as e:
+        _add_failed(device_info, e, retry)
+
+
+def _add_failed(device_info, e, retry):
+    if isinstance(e, OSError):
         if e.errno == _errno.EACCES:
             try:
                 output = subprocess.check_output(["/usr/bin/getfacl", "-p", device_info.path], text=True)
@@ -329,7 +451,7 @@ def _process_add(device_info, retry):
                 _error_callback("permissions", device_info.path)
         else:
             _error_callback("nodevice", device_info.path)
-    except exceptions.NoReceiver:
+    else:
         _error_callback("nodevice", device_info.path)
 
 
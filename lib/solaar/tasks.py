@@ -20,12 +20,9 @@ import logging
 
 from threading import Thread as _Thread
 
-logger = logging.getLogger(__name__)
+from logitech_receiver import channel as _channel
 
-try:
-    from Queue import Queue as _Queue
-except ImportError:
-    from queue import Queue as _Queue
+logger = logging.getLogger(__name__)
 
 #
 #
@@ -33,10 +30,10 @@ except ImportError:
 
 
 class TaskRunner(_Thread):
-    def __init__(self, name):
+    def __init__(self, name, queue_size=16, overflow_policy=_channel.BLOCK):
         super().__init__(name=name)
         self.daemon = True
-        self.queue = _Queue(16)
+        self.queue = _channel.Channel(name, queue_size, overflow_policy)
         self.alive = False
 
     def __call__(self, function, *args, **kwargs):
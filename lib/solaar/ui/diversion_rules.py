@@ -207,7 +207,7 @@ class DiversionDialog:
         self.view.expand_all()
 
     def _save_yaml_file(self):
-        if _DIV._save_config_rule_file():
+        if _DIV._save_config_rule_file(saved_rules=self.rules):
             self.dirty = False
             self.save_btn.set_sensitive(False)
             self.discard_btn.set_sensitive(False)
@@ -253,10 +253,11 @@ class DiversionDialog:
 
     def _create_model(self):
         model = Gtk.TreeStore(RuleComponentWrapper)
-        if len(_DIV.rules.components) == 1:
+        self.rules = _DIV.load_rules()  # the rules being edited, even if the rules file is compiled again
+        if len(self.rules.components) == 1:
             # only built-in rules - add empty user rule list
-            _DIV.rules.components.insert(0, _DIV.Rule([], source=_DIV._file_path))
-        self._populate_model(model, None, _DIV.rules.components)
+            self.rules.components.insert(0, _DIV.Rule([], source=_DIV._file_path))
+        self._populate_model(model, None, self.rules.components)
         return model
 
     def _create_view_columns(self):
@@ -0,0 +1,97 @@
+import warnings
+
+import hid_parser
+import pytest
+
+from hid_parser import Usage
+
+# Unifying receiver, keyboard interface
+RECEIVER_KEYBOARD = bytes.fromhex(
+    "05010906A101850195087501150025010507 19E0 29E7 8102 9505 0508 1901 2905 9102 9501 7503 9101"
+    "9506 7508 1500 26FF00 0507 1900 2AFF00 8100 C0"
+)
+# Unifying receiver, mouse interface
+RECEIVER_MOUSE = bytes.fromhex(
+    "05010902A10185020901A10005091901291015002501951075018102"
+    "05011601F826FF07750C95020930093181061581257F7508950109388106"
+    "050C0A3802950181 06C0C0"
+)
+
+
+def descriptor(data):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return hid_parser.ReportDescriptor(data)
+
+
+def mouse_report(buttons, dx, dy, wheel):
+    xy = (dx & 0xFFF) | (dy & 0xFFF) << 12
+    return b"\x02" + buttons.to_bytes(2, "little") + xy.to_bytes(3, "little") + bytes([wheel & 0xFF, 0])
+
+
+def test_parse_input_reports_mouse():
+    reports = [(0x0001, 3, -2, 0), (0x0000, -2047, 2047, 1), (0x8002, 0, -1, -127)]
+
+    columns = descriptor(RECEIVER_MOUSE).parse_input_reports(b"".join(mouse_report(*r) for r in reports))
+
+    assert [int(v) for v in columns[Usage(0x01, 0x30)]] == [3, -2047, 0]
+    assert [int(v) for v in columns[Usage(0x01, 0x31)]] == [-2, 2047, -1]
+    assert [int(v) for v in columns[Usage(0x01, 0x38)]] == [0, 1, -127]
+    assert [int(v) for v in columns[Usage(0x09, 1)]] == [1, 0, 0]
+    assert [int(v) for v in columns[Usage(0x09, 2)]] == [0, 0, 1]
+    assert [int(v) for v in columns[Usage(0x09, 16)]] == [0, 0, 1]
+
+
+def test_parse_input_reports_keyboard():
+    reports = [b"\x01\x02\x04\x05\x00\x00\x00\x00", b"\x01\x00\x29\x00\x00\x00\x00\x00"]
+
+    columns = descriptor(RECEIVER_KEYBOARD).parse_input_reports(b"".join(reports))
+
+    assert [int(v) for v in columns[Usage(0x07, 0xE1)]] == [1, 0]  # left shift modifier
+    assert [int(v) for v in columns[Usage(0x07, 0x04)]] == [1, 0]
+    assert [int(v) for v in columns[Usage(0x07, 0x05)]] == [1, 0]
+    assert [int(v) for v in columns[Usage(0x07, 0x29)]] == [0, 1]
+    assert Usage(0x07, 0x00) not in columns  # no event
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        mouse_report(0, 0, 0, 0)[:-1],
+        mouse_report(0, 0, 0, 0) + b"\x01" + mouse_report(0, 0, 0, 0)[1:],
+        b"\x05" + mouse_report(0, 0, 0, 0)[1:],
+    ],
+)
+def test_parse_input_reports_invalid(data):
+    with pytest.raises(ValueError):
+        descriptor(RECEIVER_MOUSE).parse_input_reports(data)
+
+
+def test_parse_input_report_mouse():
+    rd = descriptor(RECEIVER_MOUSE)
+
+    parsed = rd.parse_input_report(mouse_report(0x8001, 3, -2, -1))
+
+    assert parsed[Usage(0x09, 1)].value is True
+    assert parsed[Usage(0x09, 2)].value is False
+    assert parsed[Usage(0x09, 16)].value is True
+    assert parsed[Usage(0x01, 0x30)].value == 3
+    assert parsed[Usage(0x01, 0x31)].value == -2
+    assert parsed[Usage(0x01, 0x38)].value == -1
+    assert {u: v.value for u, v in rd.parse_input_report(list(mouse_report(0x8001, 3, -2, -1))).items()} == {
+        u: v.value for u, v in parsed.items()
+    }
+
+
+def test_parse_input_report_keyboard():
+    parsed = descriptor(RECEIVER_KEYBOARD).parse_input_report(b"\x01\x02\x04\x05\x00\x00\x00\x00")
+
+    assert not parsed[Usage(0x07, 0xE0)].value
+    assert parsed[Usage(0x07, 0xE1)].value
+    assert parsed[Usage(0x07, 0x04)].value is True
+    assert parsed[Usage(0x07, 0x05)].value is True
+
+
+def test_parse_input_report_short():
+    with pytest.raises(ValueError):
+        descriptor(RECEIVER_MOUSE).parse_input_report(mouse_report(0, 0, 0, 0)[:-1])
@@ -0,0 +1,51 @@
+import warnings
+
+import hid_parser
+import pytest
+
+# Unifying receiver, HID++ interface
+RECEIVER_HIDPP = bytes.fromhex(
+    "0600FF0901A1018510750895061500 26FF00 0901 8100 0901 9100 C0"
+    "0600FF0902A1018511750895131500 26FF00 0902 8100 0902 9100 C0"
+    "0600FF0904A1018520750895 0E 1500 26FF00 0941 8100 0941 9100 8521 951F 1500 26FF00 0942 8100 0942 9100 C0"
+)
+# Unifying receiver, keyboard interface
+RECEIVER_KEYBOARD = bytes.fromhex(
+    "05010906A101850195087501150025010507 19E0 29E7 8102 9505 0508 1901 2905 9102 9501 7503 9101"
+    "9506 7508 1500 26FF00 0507 1900 2AFF00 8100 C0"
+)
+# Unifying receiver, mouse interface
+RECEIVER_MOUSE = bytes.fromhex(
+    "05010902A10185020901A10005091901291015002501951075018102"
+    "05011601F826FF07750C95020930093181061581257F7508950109388106"
+    "050C0A3802950181 06C0C0"
+)
+
+
+@pytest.mark.parametrize("descriptor", [RECEIVER_HIDPP, RECEIVER_KEYBOARD, RECEIVER_MOUSE])
+def test_scan(descriptor):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        rd = hid_parser.ReportDescriptor(descriptor)
+
+    sizes = hid_parser.scan(descriptor)
+
+    assert sizes.input == {i: int(rd.get_input_report_size(i)) for i in rd.input_report_ids}
+    assert sizes.output == {i: int(rd.get_output_report_size(i)) for i in rd.output_report_ids}
+    assert sizes.feature == {i: int(rd.get_feature_report_size(i)) for i in rd.feature_report_ids}
+
+
+def test_scan_push_pop():
+    descriptor = bytes.fromhex("0600FF0901A101 8510 7508 9505 A4 8511 9513 0902 B100 B4 0901 8100 C0")
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        sizes = hid_parser.scan(descriptor)
+
+    assert sizes == ({0x10: 40}, {}, {0x11: 152})
+
+
+@pytest.mark.parametrize("descriptor", [bytes.fromhex("0600FF0901A10185"), bytes.fromhex("0600FF0901A101B4C0")])
+def test_scan_invalid(descriptor):
+    with pytest.raises(hid_parser.InvalidReportDescriptor):
+        hid_parser.scan(descriptor)
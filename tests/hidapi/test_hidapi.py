@@ -0,0 +1,32 @@
+import pytest
+
+hidapi = pytest.importorskip("hidapi.hidapi", exc_type=ImportError)  # needs the hidapi library
+
+
+class _Stop(Exception):
+    pass
+
+
+def test_polling_reports_each_device_once(monkeypatch):
+    listings = [[b"/dev/hidraw0"], [b"/dev/hidraw0", b"/dev/hidraw1"], [b"/dev/hidraw0", b"/dev/hidraw1"]]
+
+    def enumerate_devices():
+        return [{"path": path, "vendor_id": 0x046D} for path in listings.pop(0)]
+
+    def sleep(delay):  # stop once every listing has been polled
+        if not listings:
+            raise _Stop
+
+    monkeypatch.setattr(hidapi, "_hotplug", False)
+    monkeypatch.setattr(hidapi, "_enumerate_devices", enumerate_devices)
+    monkeypatch.setattr(hidapi, "sleep", sleep)
+    events = []
+
+    def device_callback(action, device):
+        events.append((action, device["path"]))
+        device["hidpp_short"] = device["hidpp_long"] = False  # as _match does
+
+    with pytest.raises(_Stop):
+        hidapi._DeviceMonitor(device_callback, polling_delay=0).run()
+
+    assert events == [("add", b"/dev/hidraw1")]
@@ -0,0 +1,174 @@
+import threading
+
+import hid_parser
+import pytest
+
+from hidapi import udev
+
+# Unifying receiver, HID++ interface
+RECEIVER_HIDPP = bytes.fromhex(
+    "0600FF0901A1018510750895061500 26FF00 0901 8100 0901 9100 C0"
+    "0600FF0902A1018511750895131500 26FF00 0902 8100 0902 9100 C0"
+    "0600FF0904A1018520750895 0E 1500 26FF00 0941 8100 0941 9100 8521 951F 1500 26FF00 0942 8100 0942 9100 C0"
+)
+# Unifying receiver, mouse interface
+RECEIVER_MOUSE = bytes.fromhex(
+    "05010902A10185020901A10005091901291015002501951075018102"
+    "05011601F826FF07750C95020930093181061581257F7508950109388106"
+    "050C0A3802950181 06C0C0"
+)
+# HID++ short report of the wrong size, inside a push/pop
+BROKEN_HIDPP = bytes.fromhex("0600FF0901A101 A4 8510750895051500 26FF00 0901 8100 B4 8511 750895 13 0902 8100 C0")
+
+
+@pytest.mark.parametrize(
+    "descriptor, expected", [(RECEIVER_HIDPP, (True, True)), (RECEIVER_MOUSE, (False, False)), (BROKEN_HIDPP, (False, True))]
+)
+def test_classify_descriptor(descriptor, expected, tmp_path, monkeypatch):
+    monkeypatch.setattr(udev, "_descriptor_cache_path", None)  # restored after the test
+    monkeypatch.setattr(udev, "_descriptor_classes", {})
+    udev.enable_descriptor_cache(str(tmp_path / "solaar" / "descriptors"))
+
+    assert udev._classify_descriptor(descriptor) == expected
+
+    monkeypatch.setattr(udev, "_descriptor_classes", {})
+    udev.enable_descriptor_cache(str(tmp_path / "solaar" / "descriptors"))
+    monkeypatch.setattr(hid_parser, "scan", None)  # answered from the file, without scanning
+
+    assert udev._classify_descriptor(descriptor) == expected
+
+
+def test_descriptor_cache_version(tmp_path, monkeypatch):
+    path = tmp_path / "descriptors"
+    key = udev._hashlib.sha1(RECEIVER_HIDPP).hexdigest()
+    path.write_text(f"{key} 0 0\n")  # from before the cache had a version
+    monkeypatch.setattr(udev, "_descriptor_cache_path", None)
+    monkeypatch.setattr(udev, "_descriptor_classes", {})
+    udev.enable_descriptor_cache(str(path))
+
+    assert udev._classify_descriptor(RECEIVER_HIDPP) == (True, True)
+    assert path.read_text() == udev._DESCRIPTOR_CACHE_HEADER + f"{key} 1 1\n"
+    assert [p.name for p in tmp_path.iterdir()] == ["descriptors"]  # no temporary file left
+
+
+class FakeHidDevice(dict):
+    def __init__(self, phys, hid_id="0003:0000046D:0000405E"):
+        super().__init__(HID_PHYS=phys, HID_ID=hid_id)
+
+
+class FakeHidraw:
+    def __init__(self, action, device_node, phys):
+        self.action = action
+        self.device_node = device_node
+        self._hid = FakeHidDevice(phys) if phys else None
+
+    def find_parent(self, subsystem):
+        return self._hid
+
+
+def monitored_index():
+    index = udev._HidrawIndex()
+    index._started = True
+    index._observer = object()  # as if the udev monitor was running
+    return index
+
+
+def test_hidraw_index_add_remove():
+    index = monitored_index()
+    index._event(FakeHidraw("add", "/dev/hidraw3", "usb-0000:00:14.0-2/input2:1"))
+
+    assert index.phys("/dev/hidraw3") == "usb-0000:00:14.0-2/input2:1"
+    assert index.get("usb-0000:00:14.0-2/input2:1") == ("/dev/hidraw3", "0003:0000046D:0000405E")
+
+    index._event(FakeHidraw("remove", "/dev/hidraw3", None))
+
+    assert index.get("usb-0000:00:14.0-2/input2:1") is None
+
+
+def test_hidraw_index_waits_for_node():
+    index = monitored_index()
+    timer = threading.Timer(0.05, index._event, (FakeHidraw("add", "/dev/hidraw4", "usb-0000:00:14.0-2/input2:2"),))
+    timer.start()
+
+    assert index.get("usb-0000:00:14.0-2/input2:2", 5) == ("/dev/hidraw4", "0003:0000046D:0000405E")
+    assert index.get("usb-0000:00:14.0-2/input2:3", 0.05) is None
+    timer.join()
+
+
+def test_hidraw_index_started_without_lock(monkeypatch):
+    index = udev._HidrawIndex()
+    listed = []
+
+    class Context:
+        def list_devices(self, subsystem):
+            # a device removed while listing, reported by the monitor, which must not wait for the listing
+            event = threading.Thread(target=index._event, args=(FakeHidraw("remove", "/dev/hidraw8", None),))
+            event.start()
+            event.join(5)
+            listed.append(not event.is_alive())
+            return [FakeHidraw("add", "/dev/hidraw8", "usb-0000:00:14.0-2/input2:1"), FakeHidraw("add", "/dev/hidraw9", None)]
+
+    class Monitor:
+        @staticmethod
+        def from_netlink(context):
+            raise OSError("no netlink")
+
+    monkeypatch.setattr(udev, "_Context", Context)
+    monkeypatch.setattr(udev, "_Monitor", Monitor)
+
+    assert index.get("usb-0000:00:14.0-2/input2:1") is None  # the removal is applied after the listing
+    assert listed == [True]
+
+
+def test_hidraw_index_listing_fails(monkeypatch):
+    index = udev._HidrawIndex()
+    failures = [OSError("udev went away")]
+
+    class Context:
+        def list_devices(self, subsystem):
+            if failures:
+                raise failures.pop()
+            return [FakeHidraw("add", "/dev/hidraw8", "usb-0000:00:14.0-2/input2:1")]
+
+    class Monitor:
+        @staticmethod
+        def from_netlink(context):
+            raise OSError("no netlink")
+
+    monkeypatch.setattr(udev, "_Context", Context)
+    monkeypatch.setattr(udev, "_Monitor", Monitor)
+
+    with pytest.raises(OSError):
+        index.get("usb-0000:00:14.0-2/input2:1")
+    assert not index._starting and not index._started
+    assert index.get("usb-0000:00:14.0-2/input2:1") == ("/dev/hidraw8", "0003:0000046D:0000405E")  # tried again
+
+
+def test_find_paired_node(monkeypatch):
+    index = monitored_index()
+    index._event(FakeHidraw("add", "/dev/hidraw0", "usb-0000:00:14.0-2/input2"))
+    index._event(FakeHidraw("add", "/dev/hidraw5", "usb-0000:00:14.0-2/input2:1"))
+    monkeypatch.setattr(udev, "_hidraw_index", index)
+
+    assert udev.find_paired_node("/dev/hidraw0", 1, 0) == "/dev/hidraw5"
+    assert udev.find_paired_node("/dev/hidraw0", 2, 0) is None
+    assert udev.find_paired_node_wpid("/dev/hidraw0", 1) == "405E"
+
+
+def test_track_add_change_remove(monkeypatch):
+    matches = {"/dev/hidraw6": "receiver"}
+    monkeypatch.setattr(udev, "_devices", {})
+    monkeypatch.setattr(udev, "_match", lambda action, device, filterfn: matches.get(device.device_node))
+    device = FakeHidraw("add", "/dev/hidraw6", "usb-0000:00:14.0-3/input2")
+
+    assert udev._track("add", device, None) == [("add", "receiver")]
+    assert udev._track("change", device, None) == []
+    assert udev._track("remove", device, None) == [("remove", "receiver")]
+    assert udev._track("remove", device, None) == []
+    assert udev._track("add", FakeHidraw("add", "/dev/hidraw7", "usb-0000:00:14.0-4/input0"), None) == []
+
+    udev._track("add", device, None)
+    matches.clear()  # no longer of interest after a change
+
+    assert udev._track("change", device, None) == [("remove", "receiver")]
+    assert udev._devices == {}
@@ -0,0 +1,67 @@
+import asyncio
+import socket
+import threading
+
+from logitech_receiver import aio
+from logitech_receiver import base
+
+
+def test_connection_requests_in_parallel():
+    ours, device = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    device.setblocking(False)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        connection = aio.Connection(ours.fileno(), loop)
+
+        def answer():  # reply to all the requests at once, in reverse order
+            requests = []
+            while True:
+                try:
+                    requests.append(device.recv(64))
+                except BlockingIOError:
+                    break
+            device.send(bytes([0x11, 0x02, 0x05, 0x00, 0x07]) + bytes(15))  # a notification
+            for data in reversed(requests):
+                device.send(b"\x11" + data[1:4] + bytes([data[1]]) + bytes(15))
+
+        loop.call_later(0.05, answer)
+        replies = await asyncio.gather(*(connection.request(n, 0x0510, 0x01, protocol=4.5) for n in range(1, 7)))
+        notification = await connection.notifications().__anext__()
+        connection.close()
+        return replies, notification
+
+    replies, notification = asyncio.run(run())
+
+    assert [r[:1] for r in replies] == [bytes([n]) for n in range(1, 7)]
+    assert notification.devnumber == 0x02 and notification.sub_id == 0x05
+    device.close()
+
+
+def test_connection_writes_off_the_event_loop(monkeypatch):
+    ours, device = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    writers = []
+    write = base.write
+
+    def recording_write(*args, **kwargs):
+        writers.append(threading.current_thread())
+        write(*args, **kwargs)
+
+    monkeypatch.setattr(base, "write", recording_write)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        connection = aio.Connection(ours.fileno())
+
+        def answer():
+            data = device.recv(64)
+            device.send(b"\x11" + data[1:4] + b"\x42" + bytes(15))
+
+        loop.call_later(0.05, answer)
+        reply = await connection.request(1, 0x0510, 0x01, protocol=4.5)
+        connection.close()
+        return reply
+
+    assert asyncio.run(run())[:1] == b"\x42"
+    assert writers and threading.main_thread() not in writers
+    device.close()
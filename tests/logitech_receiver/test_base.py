@@ -1,3 +1,5 @@
+from unittest import mock
+
 import pytest
 
 from logitech_receiver import base
@@ -19,3 +21,103 @@ def test_product_information(usb_id, expected_name, expected_receiver_kind):
     assert res["name"] == expected_name
     if expected_receiver_kind:
         assert res["receiver_kind"] == expected_receiver_kind
+
+
+@pytest.mark.parametrize(
+    "report_id, devnumber, data, expected",
+    [
+        (0x11, 2, b"\x08\x10\x00\x03\xff\xfe", "Notification(11,2,08,10,0003FFFE)"),
+        (0x10, 1, b"\x41\x04\x72\x40\x5a", "Notification(10,1,41,04,72405A)"),
+        (0x10, 1, b"\x07\x0d\x50\x00\x00", "Notification(10,1,07,0D,500000)"),
+        (0x10, 1, b"\x81\x00\x00\x00\x00", None),  # register reply
+        (0x20, 1, b"\x02\x00\x00\x00\x00", None),  # DJ input record
+        (0x11, 2, b"\x08\x1a\x00\x03\xff\xfe", None),  # reply to request with software id 0x0a
+    ],
+)
+def test_make_notification(report_id, devnumber, data, expected):
+    n = base.make_notification(report_id, devnumber, data)
+
+    assert (str(n) if n else None) == expected
+    if n:
+        assert (n.report_id, n.devnumber, n.sub_id, n.address, n.data) == (report_id, devnumber, data[0], data[1], data[2:])
+
+
+def test_request_pipeline_routes_replies_out_of_order():
+    pipeline = base._RequestPipeline()
+    notifications = []
+    with mock.patch("logitech_receiver.base.write"):
+        first = pipeline.submit(1, 2, b"\x05\x1a\x00\x00\x00")
+        second = pipeline.submit(1, 3, b"\x05\x1b\x00\x00\x00")
+        receiver = pipeline.submit(1, 0xFF, b"\x83\xb5\x20", match=lambda data: data[2:3] == b"\x20")
+
+    pipeline.dispatch(0x10, 0xFF, b"\x83\xb5\x21\x00\x00", notifications.append)  # reply to some other request
+    pipeline.dispatch(0x11, 3, b"\x05\x1b\x01\x02" + bytes(14), notifications.append)
+    pipeline.dispatch(0x10, 2, b"\xff\x05\x1a\x02\x00", notifications.append)
+    pipeline.dispatch(0x11, 2, b"\x05\x00\x01" + bytes(15), notifications.append)  # a notification
+    pipeline.dispatch(0x10, 0xFF, b"\x83\xb5\x20\x01\x00", notifications.append)
+
+    with mock.patch("logitech_receiver.base._read") as read:
+        assert pipeline.wait(1, second, 1) == (0x11, b"\x05\x1b\x01\x02" + bytes(14))
+        assert pipeline.wait(1, first, 1) == (0x10, b"\xff\x05\x1a\x02\x00")
+        assert pipeline.wait(1, receiver, 1) == (0x10, b"\x83\xb5\x20\x01\x00")
+        read.assert_not_called()
+    assert len(notifications) == 1 and notifications[0].sub_id == 0x05
+    assert pipeline._waiters == {}
+
+
+def test_ping_waits_past_other_errors():
+    pipeline = base._RequestPipeline()
+    request_id, request_data, match = base._prepare_ping(pipeline, 1)
+    with mock.patch("logitech_receiver.base.write"):
+        waiter = pipeline.submit(1, 1, request_data, match=match)
+
+    pipeline.dispatch(0x10, 1, b"\x8f" + request_data[:2] + b"\x07\x00")  # busy
+    assert waiter.reply is None
+    pipeline.dispatch(0x10, 1, b"\x8f" + request_data[:2] + b"\x09\x00")  # resource error
+    assert base._ping_reply(1, 1, request_id, pipeline.wait(1, waiter, 1)) is None
+
+    with mock.patch("logitech_receiver.base.write"):
+        waiter = pipeline.submit(1, 1, request_data, match=match)
+    pipeline.dispatch(0x10, 1, b"\x8f" + request_data[:2] + b"\x01\x00")  # HID++ 1.0 device
+    assert base._ping_reply(1, 1, request_id, pipeline.wait(1, waiter, 1)) == 1.0
+
+
+def test_request_keys_reserve_timeout():
+    keys = base._RequestKeys()
+    first, second = base._RequestPipeline(keys), base._RequestPipeline(keys)
+    assert keys.reserve((1, b"\x05\x1a"), first)
+
+    assert not keys.reserve((1, b"\x05\x1a"), second, timeout=0.05)
+    keys.release((1, b"\x05\x1a"))
+    assert keys.reserve((1, b"\x05\x1a"), second, timeout=0.05)
+
+
+def test_drain_leaves_the_buffer_to_the_reader():
+    pipeline = base._RequestPipeline()
+    pipeline._reading = True
+    with mock.patch("logitech_receiver.base._hid") as hid:
+        pipeline.drain(1, block=False)
+    hid.read.assert_not_called()
+
+    pipeline._reading = False
+    with mock.patch("logitech_receiver.base._hid") as hid:
+        hid.read.side_effect = [b"\x10\x01\x41\x04\x72\x40\x5a", b""]
+        notifications = []
+        pipeline.drain(1, notifications.append)
+    assert len(notifications) == 1 and not pipeline._reading
+
+
+class Handle(int):
+    path = "/dev/hidraw7"
+
+
+def test_close_forgets_pipelines_and_keys():
+    with mock.patch("logitech_receiver.base._hid"):
+        first = base.handle_pipeline(Handle(1001))
+        base.handle_pipeline(Handle(1002))
+        assert base.paths_keys[Handle.path] is first._keys
+
+        base.close(1001)
+        assert 1001 not in base.handles_pipeline and Handle.path in base.paths_keys
+        base.close(1002)
+        assert 1002 not in base.handles_pipeline and Handle.path not in base.paths_keys
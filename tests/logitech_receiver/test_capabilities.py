@@ -0,0 +1,39 @@
+from lib.logitech_receiver import capabilities
+from lib.logitech_receiver import hidpp20_constants
+
+
+def test_request_key():
+    key = capabilities.request_key(hidpp20_constants.FEATURE.REPROG_CONTROLS_V4, 0x10, (3,))
+
+    assert key == b"\x1b\x04\x10\x03"
+    assert capabilities.request_key(0x1B04, 0x10, (b"\x03",)) == key
+
+
+def test_dumps_loads():
+    snapshot = capabilities.Snapshot()
+    snapshot.set_reply(0x1B04, 0x00, (), b"\x05")
+    snapshot.set_reply(0x1B04, 0x10, (3,), bytes.fromhex("03110032AB010204CD00"))
+
+    loaded = capabilities.loads(capabilities.dumps({"4082 FW:RQM:40.00": snapshot, "empty": capabilities.Snapshot()}))
+
+    assert loaded == {"4082 FW:RQM:40.00": snapshot, "empty": {}}
+    assert loaded["4082 FW:RQM:40.00"].get_reply(0x1B04, 0x10, (3,)) == bytes.fromhex("03110032AB010204CD00")
+    assert not loaded["4082 FW:RQM:40.00"].dirty
+
+
+def test_loads_other_version():
+    data = capabilities.dumps({"model": capabilities.Snapshot({b"\x00\x01\x00": b"\x01"})})
+
+    assert capabilities.loads(data[:4] + b"\xff" + data[5:]) == {}
+
+
+def test_save_and_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(capabilities, "_file_path", str(tmp_path / "solaar" / "capabilities"))
+    monkeypatch.setattr(capabilities, "_snapshots", None)
+    capabilities.snapshot("model fw").set_reply(0x1B04, 0x00, (), b"\x05")
+
+    capabilities.save()
+    monkeypatch.setattr(capabilities, "_snapshots", None)
+
+    assert capabilities.snapshot("model fw").get_reply(0x1B04, 0x00, ()) == b"\x05"
+    assert capabilities.snapshot("other fw") == {}
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from logitech_receiver import base
+from logitech_receiver import channel
+
+
+def notification(devnumber, sub_id, address, data=b""):
+    return base._HIDPP_Notification(0x11, devnumber, sub_id, address, data)
+
+
+def drain(c):
+    items = []
+    while not c.empty():
+        items.append(c.get())
+    return items
+
+
+def test_drop_oldest():
+    c = channel.Channel("test-drop-oldest", 3)
+
+    for i in range(5):
+        assert c.put(i)
+
+    assert drain(c) == [2, 3, 4]
+    assert c.stats() == {
+        "capacity": 3,
+        "policy": channel.DROP_OLDEST,
+        "depth": 0,
+        "max_depth": 3,
+        "enqueued": 5,
+        "dropped": 2,
+        "coalesced": 0,
+    }
+    assert channel.stats()["test-drop-oldest"]["dropped"] == 2
+
+
+def test_coalesce():
+    c = channel.Channel("test-coalesce", 3, channel.COALESCE)
+    battery1, key, battery2 = notification(1, 4, 0x00, b"\x50"), notification(1, 5, 0x00), notification(1, 4, 0x00, b"\x40")
+    other = notification(2, 4, 0x00)
+
+    for n in (battery1, key, other, battery2):
+        c.put(n)
+    c.put(None)  # not a notification, so the oldest is dropped
+
+    assert drain(c) == [other, battery2, None]
+    assert (c.coalesced, c.dropped) == (1, 1)
+
+
+def test_block():
+    c = channel.Channel("test-block", 2, channel.BLOCK)
+    c.put(1)
+    c.put(2)
+
+    assert not c.put(3, block=False)
+    assert c.dropped == 1
+
+    producer = threading.Thread(target=c.put, args=(4,))
+    producer.start()
+    assert c.get() == 1
+    producer.join(timeout=1)
+
+    assert not producer.is_alive()
+    assert drain(c) == [2, 4]
+
+
+def test_get_timeout():
+    c = channel.Channel("test-timeout", 2)
+
+    with pytest.raises(channel.Empty):
+        c.get(timeout=0.01)
@@ -0,0 +1,129 @@
+import os
+import threading
+
+import pytest
+
+from logitech_receiver import diversion
+from logitech_receiver.base import _HIDPP_Notification
+
+RULES = b"""%YAML 1.3
+---
+- Key: [M2, pressed]
+- Execute: [notify-send, pressed]
+...
+"""
+
+
+@pytest.fixture
+def rules_file(tmp_path, monkeypatch):
+    path = tmp_path / "rules.yaml"
+    monkeypatch.setattr(diversion, "_file_path", str(path))
+    monkeypatch.setattr(diversion, "rules", diversion.built_in_rules)
+    monkeypatch.setattr(diversion, "_rules_key", None)
+    monkeypatch.setattr(diversion, "_rules_loader", None)
+    return path
+
+
+def user_rules():
+    return diversion.rules.components[0].components
+
+
+def test_load_rules(rules_file):
+    rules_file.write_bytes(RULES)
+
+    rules = diversion.load_rules()
+
+    assert rules is diversion.rules
+    assert len(user_rules()) == 1 and user_rules()[0].source == str(rules_file)
+    assert rules.components[1] is diversion.built_in_rules
+
+
+def test_load_rules_no_file(rules_file):
+    diversion.load_rules()
+
+    assert user_rules() == []
+    assert diversion._rules_key[0] is None
+
+
+def test_unchanged_rules_not_compiled_again(rules_file):
+    rules_file.write_bytes(RULES)
+    rules = diversion.load_rules()
+
+    assert diversion.load_rules() is rules
+    mtime = os.stat(rules_file).st_mtime_ns
+    os.utime(rules_file, ns=(mtime + 10**9, mtime + 10**9))  # touched, same contents
+    assert diversion.load_rules() is rules
+    assert diversion._rules_key[0] == mtime + 10**9
+
+    rules_file.write_bytes(RULES.replace(b"...\n", b"---\n- Key: [M3, pressed]\n...\n"))
+    os.utime(rules_file, ns=(mtime + 2 * 10**9, mtime + 2 * 10**9))
+    assert diversion.load_rules() is not rules
+    assert len(user_rules()) == 2
+
+
+def test_reload_discards_rules_in_use(rules_file):
+    rules_file.write_bytes(RULES)
+    rules = diversion.load_rules()
+
+    diversion._load_config_rule_file()
+
+    assert diversion.rules is not rules and len(user_rules()) == 1
+
+
+def test_saved_rules_not_compiled_again(rules_file):
+    rules_file.write_bytes(RULES)
+    rules = diversion.load_rules()
+    user_rules().append(diversion.Rule([{"Key": ["M3", "pressed"]}], source=str(rules_file)))
+
+    assert diversion._save_config_rule_file(str(rules_file))
+
+    assert diversion.load_rules() is rules
+    diversion._load_config_rule_file()
+    assert len(user_rules()) == 2
+
+
+def test_first_notification_loads_rules(rules_file, monkeypatch):
+    rules_file.write_bytes(RULES)
+    scheduled = []
+    monkeypatch.setattr(diversion.GLib, "idle_add", lambda *args: scheduled.append(args))
+    evaluated = threading.Event()
+    monkeypatch.setattr(diversion.Rule, "evaluate", lambda *args: evaluated.set())
+
+    diversion.process_notification(None, _HIDPP_Notification(0x11, 1, 0, 0x10, b"\x00" * 16), None)
+    loader = diversion._rules_loader
+    diversion.process_notification(None, _HIDPP_Notification(0x11, 1, 0, 0x10, b"\x00" * 16), None)
+
+    assert loader is diversion._rules_loader
+    for evaluate_rules, *args in scheduled:
+        evaluate_rules(*args)
+    assert evaluated.is_set() and len(user_rules()) == 1
+
+
+def test_process_connects_when_evaluated(monkeypatch, caplog):
+    setups = []
+    monkeypatch.setattr(diversion, "wayland", None)
+    monkeypatch.setattr(diversion, "x11_setup", lambda: setups.append(True) and False)
+    monkeypatch.setattr(diversion, "x11_focus_prog", lambda: None)
+
+    process = diversion.Process("firefox")
+    mouse_process = diversion.MouseProcess("firefox")
+
+    assert setups == []
+    assert process.evaluate(None, None, None, True) is None
+    assert mouse_process.evaluate(None, None, None, True) is None
+    process.evaluate(None, None, None, True)
+    assert setups and len(caplog.records) == 2  # warned once each
+
+
+def test_save_edited_rules_after_reload(rules_file):
+    rules_file.write_bytes(RULES)
+    edited = diversion.load_rules()  # the rules an editor was built from
+    rules_file.write_bytes(RULES + RULES)
+    diversion._load_config_rule_file()  # compiled again while editing, like after a notification
+    edited.components[0].components.append(diversion.Rule([{"Key": ["M3", "pressed"]}], source=str(rules_file)))
+
+    assert diversion._save_config_rule_file(str(rules_file), saved_rules=edited)
+
+    assert diversion.rules is edited
+    diversion._load_config_rule_file()
+    assert [r.components[0].key for r in user_rules()] == ["M2", "M3"]
@@ -5,6 +5,7 @@ from typing import Optional
 
 import pytest
 
+from lib.logitech_receiver import capabilities
 from lib.logitech_receiver import hidpp20
 from lib.logitech_receiver import hidpp20_constants
 from lib.logitech_receiver import special_keys
@@ -34,10 +35,17 @@ class Device:
                 print("RESPONSE", self.name, hex(r.request_id), r.params, r.response)
                 return bytes.fromhex(r.response) if r.response is not None else None
 
+    def requests(self, request_list):
+        return [self.request(*r) for r in request_list]
+
     def feature_request(self, feature, function=0x00, *params, no_reply=False):
         if self.protocol >= 2.0:
             return hidpp20.feature_request(self, feature, function, *params, no_reply=no_reply)
 
+    def feature_requests(self, request_list):
+        if self.protocol >= 2.0:
+            return hidpp20.feature_requests(self, request_list)
+
 
 device_offline = Device("REGISTERS", False)
 device_registers = Device("OFFLINE", True, 1.0)
@@ -180,3 +188,66 @@ def test_KeysArrayV4_index(key, index):
     result = keysarray.index(key)
 
     assert result == index
+
+
+def test_feature_requests():
+    result = hidpp20.feature_requests(
+        device_standard,
+        [
+            (hidpp20_constants.FEATURE.REPROG_CONTROLS_V4, 0x10, 3),
+            (hidpp20_constants.FEATURE.BATTERY_STATUS, 0x00),
+            (hidpp20_constants.FEATURE.REPROG_CONTROLS_V4, 0x10, 1),
+        ],
+    )
+
+    assert result == [bytes.fromhex("03110032AB010204CD00"), None, bytes.fromhex("01110022AB010203CD00")]
+
+
+def test_KeysArrayV4_from_capabilities():
+    device = Device("STANDARD", True, 4.5, responses_standard)
+    device.features = hidpp20.FeaturesArray(device)
+    device.capabilities = capabilities.Snapshot()
+    hidpp20.KeysArrayV4(device, 5)._ensure_all_keys_queried()
+
+    assert len(device.capabilities) == 5
+    assert device.capabilities.dirty
+
+    cached = Device("NORESPONSES", True, 4.5)  # same model and firmware, but nothing answers
+    cached.features = hidpp20.FeaturesArray(cached)
+    cached.capabilities = device.capabilities
+    device.features.snapshot(cached.capabilities)
+    cached.features.restore(cached.capabilities)
+    keysarray = hidpp20.KeysArrayV4(cached, 5)
+
+    assert keysarray[3]._cid == 0x0311
+    assert keysarray.index(special_keys.CONTROL.Volume_Up) == 2
+
+
+def test_FeaturesArray_snapshot_restore():
+    featuresarray = hidpp20.FeaturesArray(device_standard)
+    assert featuresarray[hidpp20_constants.FEATURE.REPROG_CONTROLS_V4] == 5
+    snapshot = capabilities.Snapshot()
+    featuresarray.snapshot(snapshot)
+
+    restored = hidpp20.FeaturesArray(Device("NORESPONSES", True, 4.5))  # would not find any features by itself
+
+    assert not restored.restore(capabilities.Snapshot())  # nothing cached for the model and firmware
+    assert restored.restore(capabilities.loads(capabilities.dumps({"model FW": snapshot}))["model FW"])
+    assert restored.count == featuresarray.count
+    assert restored[hidpp20_constants.FEATURE.REPROG_CONTROLS_V4] == 5
+    assert restored.get_feature(5) == hidpp20_constants.FEATURE.REPROG_CONTROLS_V4
+    assert restored.get_feature_version(hidpp20_constants.FEATURE.REPROG_CONTROLS_V4) == 3
+
+
+def test_FeaturesArray_lookup():
+    device = Device("STANDARD", True, 4.5, responses_standard)
+    batches = []
+    device.requests = lambda request_list: batches.append(request_list) or [device.request(*r) for r in request_list]
+    featuresarray = hidpp20.FeaturesArray(device)
+
+    featuresarray.lookup([hidpp20_constants.FEATURE.REPROG_CONTROLS_V4, hidpp20_constants.FEATURE.GKEY])
+    featuresarray.lookup([hidpp20_constants.FEATURE.REPROG_CONTROLS_V4])
+
+    assert batches == [[(0x0000, b"\x1b\x04"), (0x0000, b"\x80\x10")]]
+    assert featuresarray.get_feature_version(hidpp20_constants.FEATURE.REPROG_CONTROLS_V4) == 3
+    assert featuresarray.get_feature(5) == hidpp20_constants.FEATURE.REPROG_CONTROLS_V4
@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# The rules engine, the GUI and desktop integration, which the command line should not load
+GUI_MODULES = {
+    "dbus",
+    "evdev",
+    "gi",
+    "keysyms",
+    "logitech_receiver.diversion",
+    "logitech_receiver.notify",
+    "psutil",
+    "solaar.listener",
+    "solaar.ui",
+    "Xlib",
+}
+
+
+def imported_modules(statement):
+    """The modules imported by a statement in a fresh interpreter, from its -X importtime report."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], env=env, capture_output=True, text=True, check=True
+    )
+    return {line.rsplit("|", 1)[1].strip() for line in result.stderr.splitlines() if line.startswith("import time:")}
+
+
+@pytest.mark.parametrize(
+    "statement",
+    ["import logitech_receiver.device", "import logitech_receiver.receiver", "import solaar.cli"],
+)
+def test_command_line_imports(statement):
+    modules = imported_modules(statement)
+
+    assert not {m for m in modules if any(m == g or m.startswith(g + ".") for g in GUI_MODULES)}
+    assert "logitech_receiver.settings_templates" not in modules
+
+
+def test_key_universe_built_on_use():
+    modules = imported_modules(
+        "import logitech_receiver.special_keys as k; assert 'KEYS' not in vars(k); "
+        "assert len(k.KEYS) > len(k.KEYS_KEYS_CONSUMER) > 0 and k.KEYS_KEYS_CONSUMER is k.KEYS_KEYS_CONSUMER"
+    )
+
+    assert "logitech_receiver.special_keys" in modules
@@ -0,0 +1,138 @@
+import select
+import socket
+import threading
+
+from dataclasses import dataclass
+
+import pytest
+
+from logitech_receiver import base
+from logitech_receiver import listener
+
+
+@dataclass
+class Receiver:
+    handle: int
+    path: str = "/dev/hidraw99"
+    name: str = "RECEIVER"
+    isDevice: bool = False
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = listener.EventsHub()
+    hub.start()
+    monkeypatch.setattr(listener, "_hub", hub)
+    yield hub
+    hub.stop()
+    hub.join(1)
+    assert not hub.is_alive()
+
+
+def test_hub_stopped_twice():
+    hub = listener.EventsHub()
+    hub.stop()  # before it runs
+    hub.start()
+    hub.join(1)
+    assert not hub.is_alive()
+
+    hub.stop()  # its wakeup descriptor is closed, or used by something else by now
+
+
+def test_hub_routes_replies_and_notifications(hub):
+    ours, device = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    received = threading.Event()
+    notifications = []
+
+    def callback(n):
+        notifications.append(n)
+        received.set()
+
+    events_listener = listener.EventsListener(Receiver(ours.fileno()), callback)
+    started = threading.Event()
+    events_listener.has_started = started.set
+    events_listener.start()
+    assert started.wait(1)
+
+    def reply():
+        data = device.recv(64)
+        device.send(bytes([0x11, 0x01, 0x05, 0x00, 0x01]) + bytes(15))  # a notification first
+        device.send(b"\x11" + data[1:4] + b"\x42" + bytes(15))
+
+    replier = threading.Thread(target=reply)
+    replier.start()
+    result = base.request(ours.fileno(), 1, 0x0510, 0x01, protocol=4.5)
+    replier.join()
+
+    assert result[:1] == b"\x42"
+    assert received.wait(1)
+    assert notifications[0].sub_id == 0x05 and notifications[0].address == 0x00
+
+    events_listener.stop()
+    events_listener.join(1)
+    assert not events_listener.is_alive()
+    assert not base.handle_pipeline(ours.fileno()).fed
+    ours.close()
+    device.close()
+
+
+class Hidraw:
+    """A device that answers every request in order, copying each reply to every open descriptor like hidraw."""
+
+    def __init__(self):
+        self.ends = []  # our end, device end
+        self.lock = threading.Lock()
+        self.active = True
+        self.thread = threading.Thread(target=self.run)
+        self.thread.start()
+
+    def open(self, path=None):
+        ours, device = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        with self.lock:
+            self.ends.append((ours, device))
+        return ours.fileno()
+
+    def run(self):
+        while self.active:
+            with self.lock:
+                devices = [device for _ours, device in self.ends]
+            for ready in select.select(devices, [], [], 0.01)[0]:
+                data = ready.recv(64)
+                reply = b"\x11" + data[1:].ljust(19, b"\x00")
+                with self.lock:
+                    for _ours, device in self.ends:
+                        device.send(reply)
+
+    def close(self):
+        self.active = False
+        self.thread.join()
+        for ours, device in self.ends:
+            ours.close()
+            device.close()
+
+
+def test_threaded_handle_replies_on_every_descriptor(monkeypatch):
+    hidraw = Hidraw()
+    monkeypatch.setattr(base, "open_path", hidraw.open)
+    handle = listener._ThreadedHandle(threading.current_thread(), "/dev/hidraw99", hidraw.open())
+    mismatched = []
+
+    def run():
+        for _i in range(5):
+            replies = base.requests(handle, 1, [(0x0100, index) for index in range(16)], protocol=4.5)
+            mismatched.extend(index for index, reply in enumerate(replies) if reply is None or reply[0] != index)
+
+    try:
+        threads = [threading.Thread(target=run) for _i in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        hidraw.close()
+
+    assert len(hidraw.ends) == 4
+    assert mismatched == []
@@ -0,0 +1,77 @@
+import pytest
+
+from logitech_receiver import base
+from logitech_receiver import notifications
+from logitech_receiver import settings
+from logitech_receiver.hidpp20_constants import FEATURE
+
+FEATURES = [FEATURE.ROOT, FEATURE.BATTERY_STATUS, FEATURE.REPROG_CONTROLS_V4, FEATURE.HIRES_WHEEL]
+
+
+class Features(list):
+    def get_feature(self, index):
+        return self[index]
+
+
+class Device:
+    isDevice = True
+    online = True
+    protocol = 4.5
+    features = Features(FEATURES)
+
+    def __init__(self, feature_handled=None):
+        self.feature_handled = feature_handled
+        self.battery = None
+        self.ratchet = None
+
+    def handle_notification(self, n):
+        return None
+
+    def handle_feature_notification(self, n, feature):
+        return self.feature_handled
+
+    def set_battery_info(self, info):
+        self.battery = info
+
+    def setting_callback(self, device, setting_class, values):
+        self.ratchet = values
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    processed = []
+    monkeypatch.setattr(notifications._diversion, "process_notification", lambda d, n, f: processed.append(f))
+    return processed
+
+
+def test_feature_notification_dispatch(processed):
+    device = Device()
+
+    assert notifications.process(device, base._HIDPP_Notification(0x11, 1, 1, 0x00, b"\x32\x28\x00\x00"))
+    assert notifications.process(device, base._HIDPP_Notification(0x11, 1, 3, 0x10, b"\x01"))
+    assert notifications.process(device, base._HIDPP_Notification(0x11, 1, 3, 0x70, b"\x01"))  # no handler
+
+    assert device.battery.level == 0x32
+    assert device.ratchet == [2]
+    assert processed == [FEATURE.BATTERY_STATUS, FEATURE.HIRES_WHEEL, FEATURE.HIRES_WHEEL]
+
+
+def test_feature_notification_handled_by_device(processed):
+    device = Device(feature_handled=True)
+
+    assert notifications.process(device, base._HIDPP_Notification(0x11, 1, 1, 0x00, b"\x32\x28\x00\x00"))
+
+    assert device.battery is None
+    assert processed == []
+
+
+def test_feature_notification_invalidates_settings(processed):
+    device = Device()
+    device.settings_state = settings.SettingsState()
+    device.settings_state.set("scroll-ratchet", 1, settings.ASSUMED)
+    device.settings_state.set("smart-shift", True, settings.ASSUMED)
+
+    notifications.process(device, base._HIDPP_Notification(0x11, 1, 3, 0x10, b"\x01"))
+
+    assert device.settings_state.get("scroll-ratchet").stale
+    assert device.settings_state.get("smart-shift").fresh()
@@ -0,0 +1,359 @@
+import threading
+
+from copy import deepcopy as _copy
+from struct import pack
+
+from logitech_receiver import base
+from logitech_receiver import hidpp20_constants
+from logitech_receiver import settings
+
+
+class Features(dict):
+    def get_feature(self, index):
+        return next((f for f, i in self.items() if i == index), None)
+
+
+class Device:
+    features = Features({hidpp20_constants.FEATURE.REPROG_CONTROLS_V4: 0x05})
+
+
+class Key:
+    key = 0x00C3
+
+
+class Recorder(settings.RawXYProcessing):
+    def __init__(self, device):
+        super().__init__(device)
+        self.actions = []
+
+    def press_action(self, key):
+        self.actions.append("press")
+
+    def release_action(self):
+        self.actions.append("release")
+
+    def move_action(self, dx, dy):
+        self.actions.append((dx, dy))
+
+
+def diverted(*cids):
+    return base._HIDPP_Notification(0x11, 1, 0x05, 0x00, pack("!HHHH", *cids, *([0] * (4 - len(cids)))))
+
+
+def raw_xy(dx, dy):
+    return base._HIDPP_Notification(0x11, 1, 0x05, 0x10, pack("!hh", dx, dy))
+
+
+def test_RawXYProcessing_coalesces_moves():
+    device = Device()
+    processing = Recorder(device)
+    processing.keys = [Key()]
+    processing.window = 60.0  # everything after the first move is coalesced until the release
+
+    for n in [diverted(0x00C3), raw_xy(1, 2), raw_xy(3, -4), raw_xy(5, 6), raw_xy(-1, 0), diverted(), raw_xy(7, 7)]:
+        processing.handler(device, n)
+
+    assert processing.actions == ["press", (1, 2), (7, 2), "release"]
+
+
+class ApplyDevice:
+    online = True
+    protocol = 4.5
+
+    def __init__(self, *setting_classes):
+        self.persister = {}
+        self.features = Features()
+        self.requests = []
+        self.batches = []
+        self.settings = [cls.build(self) for cls in setting_classes]
+
+    def feature_request(self, feature, function=0x00, *params, no_reply=False):
+        self.requests.append((feature, function, b"".join(params)))
+        return b"\x01" + b"\x00" * 15
+
+    def feature_requests(self, request_list):
+        self.batches.append(request_list)
+        return [self.feature_request(*request) for request in request_list]
+
+
+def boolean_setting(name, feature, **validator_options):
+    return type(name, (settings.Setting,), {"name": name, "feature": feature, "validator_options": validator_options})
+
+
+SmartShift = boolean_setting("smart-shift", hidpp20_constants.FEATURE.SMART_SHIFT)
+SmartShiftHold = boolean_setting("smart-shift-hold", hidpp20_constants.FEATURE.SMART_SHIFT)
+Backlight = boolean_setting("backlight", hidpp20_constants.FEATURE.BACKLIGHT2)
+FnSwap = boolean_setting("fn-swap", hidpp20_constants.FEATURE.FN_INVERSION, mask=0x01)  # reads before writing
+HiresInvert = boolean_setting("hires-invert", hidpp20_constants.FEATURE.HIRES_WHEEL)
+
+
+def configured_device(*setting_classes):
+    device = ApplyDevice(*setting_classes)
+    for s in device.settings:
+        device.persister[s.name] = True
+    return device
+
+
+def test_apply_all_settings_batches_per_feature():
+    device = configured_device(SmartShift, SmartShiftHold, Backlight, FnSwap)
+
+    report = settings.apply_all_settings(device)
+
+    assert [len(batch) for batch in device.batches] == [2, 1]  # smart shift settings together, then backlight
+    assert len(device.requests) == 4  # three batched writes, and a read for fn swap, which the device already has
+    assert sorted(name for name, _seconds in report) == ["backlight", "fn-swap", "smart-shift", "smart-shift-hold"]
+    assert all(seconds >= 0 for _name, seconds in report)
+
+
+def test_apply_all_settings_writes_only_changes():
+    device = configured_device(SmartShift, SmartShiftHold, Backlight, FnSwap)
+    settings.apply_all_settings(device)
+    device.requests.clear()
+
+    assert settings.apply_all_settings(device) == []
+    assert device.requests == []
+
+    device.settings[2].update(False)  # backlight changed while the device was away
+    report = settings.apply_all_settings(device)
+    assert [name for name, _seconds in report] == ["backlight"]
+    assert device.requests == [(hidpp20_constants.FEATURE.BACKLIGHT2, 0x10, b"\x00")]
+
+
+def test_apply_all_settings_after_invalidate():
+    device = StateDevice(SmartShift, Backlight)
+    for s in device.settings:
+        device.persister[s.name] = True
+    settings.apply_all_settings(device)
+    device.requests.clear()
+
+    device.settings_state.invalidate()  # the device may have lost its settings
+
+    assert len(settings.apply_all_settings(device)) == 2
+    assert len(device.requests) == 2
+
+
+def test_apply_all_settings_failed_write_not_known(monkeypatch):
+    device = configured_device(SmartShift)
+    monkeypatch.setattr(device, "feature_requests", lambda request_list: [None] * len(request_list))
+    settings.apply_all_settings(device)
+
+    monkeypatch.undo()
+    settings.apply_all_settings(device)
+
+    assert len(device.requests) == 1
+
+
+def test_apply_all_settings_driver_features_always_written():
+    device = configured_device(HiresInvert, SmartShift)
+    device.persister["_sensitive"] = {"smart-shift": settings.SENSITIVITY_IGNORE}
+
+    settings.apply_all_settings(device)
+    settings.apply_all_settings(device)  # the driver may have changed it again
+
+    assert [feature for feature, _function, _data in device.requests] == [hidpp20_constants.FEATURE.HIRES_WHEEL] * 2
+
+
+def test_apply_all_settings_in_order(monkeypatch):
+    device = configured_device(SmartShift, FnSwap, SmartShiftHold, Backlight, HiresInvert)
+    device.features[hidpp20_constants.FEATURE.HIRES_WHEEL] = 0x07
+    device.features[hidpp20_constants.FEATURE.FN_INVERSION] = 0x08
+    monkeypatch.setattr(device, "feature_request", lambda *args, **kwargs: device.requests.append(args[0]) or b"\x00" * 16)
+    monkeypatch.setattr(settings, "_sleep", lambda delay: device.requests.append("sleep"))
+
+    settings.apply_all_settings(device)
+
+    F = hidpp20_constants.FEATURE
+    assert device.requests == [
+        "sleep",
+        F.SMART_SHIFT,
+        F.FN_INVERSION,
+        F.FN_INVERSION,
+        F.SMART_SHIFT,
+        F.BACKLIGHT2,
+        F.HIRES_WHEEL,
+    ]
+    assert [len(batch) for batch in device.batches] == [1, 1, 1, 1]  # smart shift settings apart, on either side of fn swap
+
+
+class StateDevice(ApplyDevice):
+    def __init__(self, *setting_classes):
+        self.settings_state = settings.SettingsState()
+        super().__init__(*setting_classes)
+
+
+def test_read_uses_settings_state():
+    device = StateDevice(SmartShift)
+    smart_shift = device.settings[0]
+
+    assert smart_shift.read() is True
+    assert smart_shift.read() is True
+    assert len(device.requests) == 1  # known to be on the device
+    assert device.settings_state.get("smart-shift").source == settings.FROM_DEVICE
+
+    assert smart_shift.read(cached=False) is True
+    assert len(device.requests) == 2  # uncached reads always ask the device
+    assert device.settings_state.get("smart-shift").fresh()
+
+
+def test_read_persisted_value_is_not_on_device():
+    device = StateDevice(SmartShift)
+    device.persister["smart-shift"] = False
+    smart_shift = device.settings[0]
+
+    assert smart_shift.read() is False  # the configured value
+    assert device.requests == []
+    assert device.settings_state.get("smart-shift").source == settings.FROM_PERSISTER
+
+    assert smart_shift.read(cached=False) is True  # what the device has
+    assert len(device.requests) == 1
+
+
+def test_write_is_assumed_on_device():
+    device = StateDevice(SmartShift)
+    smart_shift = device.settings[0]
+
+    smart_shift.write(False)
+
+    assert smart_shift.read() is False
+    assert device.settings_state.get("smart-shift").source == settings.ASSUMED
+    assert len(device.requests) == 1
+    smart_shift.read(cached=False)
+    assert len(device.requests) == 2
+
+
+def test_settings_state_subscribe():
+    state = settings.SettingsState()
+    changes = []
+    unsubscribe = state.subscribe(lambda name, s: changes.append((name, s.value, s.source, s.stale)))
+
+    state.set("smart-shift", True, settings.FROM_DEVICE)
+    state.invalidate()
+    state.invalidate()  # already stale
+    unsubscribe()
+    state.set("smart-shift", False, settings.ASSUMED)
+
+    assert changes == [("smart-shift", True, "device", False), ("smart-shift", True, "device", True)]
+
+
+def test_settings_state_map_changed_in_place():
+    state = settings.SettingsState()
+    value = {1: True, 2: {"a": False}}
+    entry = state.set("divert-keys", value, settings.ASSUMED)
+    assert entry.fresh()
+    assert not entry.fresh(max_age=-1.0)
+
+    value[2]["a"] = True  # changed but not written
+
+    assert not entry.fresh()
+
+
+class Persister(dict):
+    def __init__(self):
+        super().__init__(_NAME="TEST")
+        self.saves = []
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.saves.append((key, value))
+
+
+class SlowDevice(StateDevice):
+    def __init__(self, *setting_classes):
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        super().__init__(*setting_classes)
+        self.persister = Persister()
+
+    def feature_request(self, feature, function=0x00, *params, no_reply=False):
+        self.writing.set()
+        assert self.release.wait(5)
+        return super().feature_request(feature, function, *params, no_reply=no_reply)
+
+
+def test_queued_writes_merged():
+    device = SlowDevice(SmartShift)
+    device.persister["smart-shift"] = False
+    device.persister.saves.clear()
+    smart_shift = device.settings[0]
+
+    assert smart_shift.queue_write(True)
+    assert device.writing.wait(5)  # the first write is in flight
+    for value in (False, True, False):
+        smart_shift.queue_write(value)
+    assert smart_shift.read() is False  # the latest value, before it is written
+    device.release.set()
+
+    assert device.settings_state.writes.wait(5)
+    assert device.requests == [(SmartShift.feature, 0x10, b"\x01"), (SmartShift.feature, 0x10, b"\x00")]
+    assert device.persister.saves == [("smart-shift", False)]  # persisted once
+    assert device.settings_state.get("smart-shift").source == settings.ASSUMED
+    assert device.settings_state.writes.stats() == {"queued": 4, "written": 2, "pending": 0}
+
+
+def test_queue_write_offline():
+    device = SlowDevice(SmartShift)
+    device.online = False
+
+    assert not device.settings[0].queue_write(True)
+    assert device.settings_state.get("smart-shift") is None
+
+
+class MapRW:
+    kind = settings.FeatureRW.kind
+
+    def write(self, device, key, data_bytes):
+        return device.feature_request(MapSetting.feature, 0x10, data_bytes)
+
+
+class MapValidator:
+    kind = settings.KIND.map_choice
+    needs_current_value = False
+
+    def prepare_write(self, key, value):
+        return bytes([key, value])
+
+
+class MapSetting(settings.Settings):
+    name = "map"
+    feature = hidpp20_constants.FEATURE.REPROG_CONTROLS_V4
+
+
+def map_setting(device, value):
+    device.persister["map"] = value
+    device.persister.saves.clear()
+    setting = MapSetting(device, MapRW(), MapValidator())
+    setting.update(value, save=False)
+    return setting
+
+
+def test_queued_writes_keep_callbacks():
+    device = SlowDevice()
+    setting = map_setting(device, {1: 0, 2: 0, 3: 0})
+    results = []
+
+    setting.queue_write(1, key=1, callback=results.append)
+    assert device.writing.wait(5)
+    setting.queue_write(1, key=2, callback=results.append)
+    setting.queue_write(1, key=3, callback=results.append)
+    setting.queue_write({1: 2, 2: 2, 3: 2}, callback=results.append)  # makes the key writes unnecessary
+    device.release.set()
+
+    assert device.settings_state.writes.wait(5)
+    assert len(results) == 4
+    assert device.requests[-3:] == [(MapSetting.feature, 0x10, bytes([key, 2])) for key in (1, 2, 3)]
+
+
+def test_queued_key_not_assumed_before_written():
+    device = SlowDevice()
+    setting = map_setting(device, {1: 0, 2: 0})
+    sources = []
+    device.settings_state.subscribe(lambda name, state: sources.append((_copy(state.value), state.source)))
+
+    setting.queue_write({1: 1, 2: 1})
+    assert device.writing.wait(5)  # writing key 1
+    setting.queue_write(2, key=1)  # key 1 changes again while the map is written
+    device.release.set()
+
+    assert device.settings_state.writes.wait(5)
+    assert device.requests == [(MapSetting.feature, 0x10, bytes(pair)) for pair in ((1, 1), (2, 1), (1, 2))]
+    assert [source for _value, source in sources if source == settings.ASSUMED] == []  # key 1 was last written by itself
@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+from logitech_receiver import settings_templates
+from logitech_receiver.hidpp20_constants import FEATURE
+
+
+class Features(dict):
+    def __init__(self, *features):
+        super().__init__({feature: index for index, feature in enumerate(features, 1)})
+        self.looked_up = []
+
+    def lookup(self, features):
+        self.looked_up.extend(features)
+
+    def get_feature_version(self, feature):
+        return 0
+
+
+class Device:
+    online = True
+    protocol = 4.5
+
+    def __init__(self, *features, firmware="FW 1.0"):
+        self.features = Features(*features)
+        self.persister = {"_NAME": "TEST"}
+        self.firmware = firmware
+
+    def _firmware_key(self):
+        return self.firmware
+
+
+def probe_setting(name, feature, built=True, barrier=None):
+    def build(cls, device):
+        cls.probed.append(threading.current_thread())
+        if barrier:
+            barrier.wait()
+        return cls() if cls.built else None
+
+    attributes = {"name": name, "feature": feature, "min_version": 0, "built": built, "probed": []}
+    return type(name, (), dict(attributes, build=classmethod(build)))
+
+
+@pytest.fixture
+def probe_settings(monkeypatch):
+    def use(*sclasses):
+        monkeypatch.setattr(settings_templates, "SETTINGS", list(sclasses))
+        return sclasses
+
+    return use
+
+
+def test_check_feature_settings_in_order(probe_settings):
+    device = Device(FEATURE.SMART_SHIFT, FEATURE.SMART_SHIFT_ENHANCED, FEATURE.FN_INVERSION, FEATURE.HIRES_WHEEL)
+    shift, shift_enhanced, fn_swap, scroll, thumb = probe_settings(
+        probe_setting("smart-shift", FEATURE.SMART_SHIFT),
+        probe_setting("smart-shift", FEATURE.SMART_SHIFT_ENHANCED),
+        probe_setting("fn-swap", FEATURE.FN_INVERSION),
+        probe_setting("hires-scroll-mode", FEATURE.HIRES_WHEEL, built=False),
+        probe_setting("thumb-scroll-mode", FEATURE.THUMB_WHEEL),
+    )
+    known = []
+
+    assert settings_templates.check_feature_settings(device, known)
+
+    assert [type(s) for s in known] == [shift, fn_swap]
+    assert not shift_enhanced.probed  # a device only has one setting with the same name
+    assert not thumb.probed
+    assert set(device.features.looked_up) == {s.feature for s in (shift, shift_enhanced, fn_swap, scroll, thumb)}
+    assert device.persister["_absent"] == ["hires-scroll-mode", "thumb-scroll-mode"]
+    assert device.persister["_absent_firmware"] == "FW 1.0"
+
+
+def test_check_feature_settings_probes_features_concurrently(probe_settings):
+    device = Device(FEATURE.SMART_SHIFT, FEATURE.FN_INVERSION)
+    barrier = threading.Barrier(2, timeout=5)  # broken unless both settings are built at the same time
+    shift, fn_swap = probe_settings(
+        probe_setting("smart-shift", FEATURE.SMART_SHIFT, barrier=barrier),
+        probe_setting("fn-swap", FEATURE.FN_INVERSION, barrier=barrier),
+    )
+    known = []
+
+    settings_templates.check_feature_settings(device, known)
+
+    assert [type(s) for s in known] == [shift, fn_swap]
+    assert shift.probed[0] != fn_swap.probed[0]
+
+
+def test_check_feature_settings_absent_per_firmware(probe_settings):
+    (scroll,) = probe_settings(probe_setting("hires-scroll-mode", FEATURE.HIRES_WHEEL, built=False))
+    device = Device(FEATURE.HIRES_WHEEL)
+    settings_templates.check_feature_settings(device, [])
+    settings_templates.check_feature_settings(device, [])
+
+    assert len(scroll.probed) == 1  # known to be absent the second time
+
+    device.firmware = "FW 1.1"
+    scroll.built = True
+    known = []
+    settings_templates.check_feature_settings(device, known)
+
+    assert len(scroll.probed) == 2
+    assert [type(s) for s in known] == [scroll]
+    assert device.persister["_absent"] == []
+    assert device.persister["_absent_firmware"] == "FW 1.1"
+
+
+def test_check_feature_settings_reuses_probe_threads(probe_settings):
+    shift, fn_swap = probe_settings(
+        probe_setting("smart-shift", FEATURE.SMART_SHIFT),
+        probe_setting("fn-swap", FEATURE.FN_INVERSION),
+    )
+    for _i in range(10):
+        settings_templates.check_feature_settings(Device(FEATURE.SMART_SHIFT, FEATURE.FN_INVERSION), [])
+
+    assert len(set(shift.probed + fn_swap.probed)) <= settings_templates._PROBE_WORKERS
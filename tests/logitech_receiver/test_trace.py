@@ -0,0 +1,101 @@
+import json
+import threading
+
+import pytest
+
+from logitech_receiver import trace
+
+
+@pytest.fixture(autouse=True)
+def fresh_trace(monkeypatch):
+    monkeypatch.setattr(trace, "origin", 100.0)
+    monkeypatch.setattr(trace, "active", True)
+    monkeypatch.setattr(trace, "on_finish", None)
+    monkeypatch.setattr(trace, "_spans", [])
+    monkeypatch.setattr(trace, "_threads", {})
+    monkeypatch.setattr(trace, "_requests", {})
+    monkeypatch.setattr(trace, "_labels", {})
+
+
+def test_span():
+    with trace.span("load", "configuration", path="config.yaml"):
+        pass
+
+    (name, category, start, end, _tid, args) = trace._spans[0]
+    assert (name, category, args) == ("configuration", "load", {"path": "config.yaml"})
+    assert start <= end
+
+
+def test_request_counts():
+    trace.label(5, "/dev/hidraw0")
+    trace.count_request(5, 0xFF)
+    trace.count_request(5, 1)
+    trace.count_request(5, 1)
+    trace.count_request(6, 2)
+
+    assert trace.request_counts() == {"/dev/hidraw0 device 255": 1, "/dev/hidraw0 device 1": 2, "6 device 2": 1}
+
+
+def test_request_counts_from_threads():
+    def count():
+        for _i in range(10000):
+            trace.count_request(5, 1)
+
+    threads = [threading.Thread(target=count) for _i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert trace.request_counts() == {"5 device 1": 40000}
+
+
+def test_not_collecting_unless_started(monkeypatch):
+    monkeypatch.setattr(trace, "active", False)
+    with trace.span("load", "configuration"):
+        trace.count_request(5, 1)
+    assert trace._spans == [] and trace.request_counts() == {}
+
+    trace.start()
+    trace.count_request(5, 1)
+    assert trace.request_counts() == {"5 device 1": 1}
+
+
+def test_chrome_trace():
+    trace.add("probe", "probe /dev/hidraw0:1", 100.5, 100.75, kind="mouse")
+    trace.count_request(5, 1)
+
+    result = json.loads(json.dumps(trace.chrome_trace()))
+
+    metadata, event = result["traceEvents"]
+    assert metadata["ph"] == "M" and metadata["tid"] == event["tid"]
+    assert event["ph"] == "X" and event["cat"] == "probe" and event["args"] == {"kind": "mouse"}
+    assert (event["ts"], event["dur"]) == (500000, 250000)
+    assert result["otherData"]["requests"] == {"5 device 1": 1}
+
+
+def test_summary_longest_first():
+    trace.add("open", "short", 100.0, 100.1)
+    trace.add("open", "long", 100.1, 101.1)
+    trace.add("open", "middle", 101.1, 101.6)
+    trace.count_request(5, 1)
+
+    lines = trace.summary(limit=2)
+
+    assert "long" in lines[1] and "middle" in lines[2]
+    assert not any("short" in line for line in lines)
+    assert lines[-1].split() == ["1", "5", "device", "1"]
+
+
+def test_finish():
+    finished = []
+    trace.on_finish = lambda: finished.append(len(trace._spans))
+
+    trace.finish()
+    trace.finish()
+    trace.add("open", "late", 100.0, 101.0)
+    trace.count_request(5, 1)
+
+    assert finished == [1]
+    assert trace._spans[0][:2] == ("startup", "startup")
+    assert len(trace._spans) == 1 and not trace._requests
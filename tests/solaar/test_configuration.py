@@ -0,0 +1,72 @@
+import yaml
+
+from logitech_receiver import hidpp20
+from solaar import configuration
+
+LED_BYTES = bytes.fromhex("0A01020300500407000000")
+PROFILE_BYTES = bytes.fromhex(
+    "01010290018003000700140028FFFFFF"
+    "FFFF0000000000000000000000000000"
+    "8000FFFF900aFF00800204548000FFFF"
+    "900aFF00800204548000FFFF900aFF00"
+    "800204548000FFFF900aFF0080020454"
+    "8000FFFF900aFF00800204548000FFFF"
+    "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"
+    "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"
+    "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"
+    "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"
+    "54004500370000000000000000000000"
+    "00000000000000000000000000000000"
+    "00000000000000000000000000000000"
+    "0A01020300500407000000FFFFFFFFFF"
+    "FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF"
+    "FFFFFFFFFFFFFFFFFFFFFFFFFF7C81"
+)
+
+
+def device_entry():
+    profile = hidpp20.OnboardProfile.from_bytes(2, 1, 16, 0, PROFILE_BYTES)
+    profiles = hidpp20.OnboardProfiles(version=3, name="Lab Mouse", count=1, buttons=16, gbuttons=0, sectors=16, size=255)
+    profiles.profiles = {1: profile}
+    return configuration._DeviceEntry(
+        _NAME="Lab Mouse",
+        _wpid="4082",
+        _serial="0123ABCD",
+        dpi=1600,
+        **{"led-effect": {0: hidpp20.LEDEffectSetting.from_bytes(LED_BYTES)}, "profiles": profiles},
+    )
+
+
+def test_save_load_custom_tags(monkeypatch):
+    monkeypatch.setattr(configuration, "save", lambda defer=False: None)
+    entry = device_entry()
+
+    text = configuration._dump(["1.1.11", entry])
+    loaded = yaml.safe_load(text)
+
+    assert "!!python" not in text
+    assert "!LEDEffectSetting" in text and "!OnboardProfiles" in text and "!OnboardProfile\n" in text
+    assert "color: 0x10203" in text
+    assert loaded[0] == "1.1.11"
+    effect = loaded[1]["led-effect"][0]
+    assert effect.to_bytes() == LED_BYTES
+    profile = loaded[1]["profiles"].profiles[1]
+    assert profile.to_bytes(255) == PROFILE_BYTES
+    assert loaded[1]["dpi"] == 1600
+
+
+def test_dump_in_place_change(monkeypatch):
+    monkeypatch.setattr(configuration, "save", lambda defer=False: None)
+    entry = device_entry()
+    configuration._dump([entry])
+
+    effects = entry["led-effect"]
+    effects[0].color = 0x405060
+    entry["led-effect"] = effects
+    profiles = entry["profiles"]
+    profiles.profiles[1].resolutions[0] = 0x0320
+    entry["profiles"] = profiles
+
+    loaded = yaml.safe_load(configuration._dump([entry]))[0]
+    assert loaded["led-effect"][0].color == 0x405060
+    assert loaded["profiles"].profiles[1].resolutions[0] == 0x0320
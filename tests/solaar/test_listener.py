@@ -0,0 +1,54 @@
+import concurrent.futures as futures
+
+from unittest import mock
+
+from solaar import listener
+
+
+class Device:
+    def __init__(self, receiver, number):
+        self.receiver = receiver
+        self.number = number
+        self.path = None
+
+    def ping(self):
+        self.receiver.handle.notifications_hook(f"notification from {self.number}")
+        return False
+
+
+class Receiver:
+    def __init__(self):
+        self.handle = 7
+        self.path = "/dev/hidraw7"
+
+    def __iter__(self):
+        yield Device(self, 1)
+        yield Device(self, 2)
+
+
+def test_open_and_probe_keeps_notifications(monkeypatch):
+    receiver = Receiver()
+    monkeypatch.setattr(listener, "_open", lambda device_info: receiver)
+    device_info = mock.Mock(path=receiver.path, isDevice=False)
+
+    with futures.ThreadPoolExecutor(2) as probe_pool, mock.patch.object(listener, "GLib") as glib:
+        listener._open_and_probe(listener._generation, probe_pool, device_info)
+
+    glib.idle_add.assert_called_once()
+    _opened, _generation, _device_info, opened, error, notifications = glib.idle_add.call_args[0]
+    assert opened is receiver and error is None
+    assert sorted(notifications) == ["notification from 1", "notification from 2"]
+    assert not isinstance(receiver.handle, listener._ProbeHandle) and receiver.handle == 7
+
+
+def test_open_and_probe_dropped_after_stop(monkeypatch):
+    monkeypatch.setattr(listener, "_open", mock.Mock())
+    monkeypatch.setattr(listener.configuration, "save", mock.Mock())
+    generation = listener._generation
+    listener.stop_all()
+
+    with mock.patch.object(listener, "GLib") as glib:
+        listener._open_and_probe(generation, None, mock.Mock())
+
+    listener._open.assert_not_called()
+    glib.idle_add.assert_not_called()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Cost of saving and loading a configuration with many device entries.
+
+Saves a configuration the old way (the whole list dumped with the Python dumper,
+in place) and with configuration.do_save, first with every entry new, then after
+changing one setting of one device, and loads it.
+
+    tools/benchmarks/bench_config.py [devices]
+"""
+
+import os.path as _path
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, _path.normpath(_path.join(_path.dirname(_path.realpath(__file__)), "..", "..", "lib")))
+
+import yaml  # noqa: E402
+
+from solaar import configuration  # noqa: E402
+
+REPEAT = 5
+
+
+def device_entry(n):
+    return configuration._DeviceEntry(
+        _NAME=f"Lab Mouse {n}",
+        _wpid=f"{0x4000 + n:04X}",
+        _serial=f"{n:08X}",
+        _modelId=f"B0{n:04X}00000",
+        _unitId=f"{n:08X}",
+        _absent=["hires-scroll-mode", "thumb-scroll-mode", "lowres-scroll-mode", "backlight"],
+        _absent_firmware=f"RBM 12.01.B{n % 10}",
+        _sensitive={"hires-smooth-resolution": "ignore", "hires-smooth-invert": "ignore", "hires-scroll-mode": "ignore"},
+        _battery=4100,
+        dpi=1600,
+        **{
+            "smart-shift": 12,
+            "scroll-ratchet": 2,
+            "hires-smooth-invert": False,
+            "hires-smooth-resolution": False,
+            "thumb-scroll-invert": False,
+            "divert-keys": {82: 0, 83: 0, 86: 0, 195: 0, 196: 0},
+            "reprogrammable-keys": {80: 80, 81: 81, 82: 82, 83: 83, 86: 86, 195: 195, 196: 196},
+            "persistent-remappable-keys": {},
+            "mouse-gestures": None,
+            "onboard_profiles": 0,
+            "report_rate": 1,
+        },
+    )
+
+
+def timed(function):
+    best = None
+    for _i in range(REPEAT):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def old_save():
+    with open(configuration._yaml_file_path, "w") as config_file:
+        yaml.dump(configuration._config, config_file, default_flow_style=None, width=150)
+
+
+def new_save(change):
+    def save():
+        if change:
+            entry = configuration._config[-1]
+            dict.__setitem__(entry, "dpi", entry["dpi"] + 1)
+        else:
+            for entry in configuration._config[1:]:
+                entry._yaml = None
+        configuration._saved_text = None
+        configuration.do_save()
+
+    return save
+
+
+def load():
+    with open(configuration._yaml_file_path) as config_file:
+        return yaml.safe_load(config_file)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    with tempfile.TemporaryDirectory() as directory:
+        configuration._yaml_file_path = _path.join(directory, "config.yaml")
+        configuration._config = ["1.1.11"] + [device_entry(n) for n in range(count)]
+        old = timed(old_save)
+        with open(configuration._yaml_file_path) as config_file:
+            old_text = config_file.read()
+        first = timed(new_save(False))
+        changed = timed(new_save(True))
+        unchanged = timed(configuration.do_save)
+        assert yaml.safe_load(old_text)[:-1] == yaml.safe_load(configuration._saved_text)[:-1]
+        print(f"{count} devices, {len(old_text):,} bytes")
+        print(f"old save, whole list:          {old:8.2f} ms")
+        print(f"new save, all entries dumped:  {first:8.2f} ms")
+        print(f"new save, one entry changed:   {changed:8.2f} ms  ({old / changed:.1f}x)")
+        print(f"new save, nothing changed:     {unchanged:8.2f} ms")
+        print(f"load:                          {timed(load):8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
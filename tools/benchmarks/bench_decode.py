@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Packets per second through the read and notification decode path.
+
+Feeds rawXY-like HID++ 2.0 notifications through a socket pair and decodes them
+with the old path (ord() of one byte slices, namedtuple notifications) and with
+base._read and base.make_notification.
+
+    tools/benchmarks/bench_decode.py [packets]
+"""
+
+import logging
+import os.path as _path
+import socket
+import sys
+import time
+
+from collections import namedtuple
+
+sys.path.insert(0, _path.normpath(_path.join(_path.dirname(_path.realpath(__file__)), "..", "..", "lib")))
+
+import hidapi as _hid  # noqa: E402
+
+from logitech_receiver import base  # noqa: E402
+
+# REPROG_CONTROLS_V4 rawXY notification, dx 3, dy -2
+PACKET = bytes.fromhex("11020810000300FE000000000000000000000000")
+BATCH = 64  # packets written before reading them back, fits in the socket buffer
+
+_Notification = namedtuple("_Notification", ("report_id", "devnumber", "sub_id", "address", "data"))
+
+
+def old_check_message(data):
+    assert isinstance(data, bytes), (repr(data), type(data))
+    report_id = ord(data[:1])
+    if report_id in base.report_lengths:
+        if base.report_lengths.get(report_id) == len(data):
+            return True
+    return False
+
+
+def old_read(handle):
+    data = _hid.read(handle, base._MAX_READ_SIZE, 0)
+    if data and old_check_message(data):
+        report_id = ord(data[:1])
+        devnumber = ord(data[1:2])
+        if base.logger.isEnabledFor(logging.DEBUG) and (report_id != base.DJ_MESSAGE_ID or ord(data[2:3]) > 0x10):
+            pass
+        return report_id, devnumber, data[2:]
+
+
+def old_notification(report_id, devnumber, data):
+    sub_id = ord(data[:1])
+    if sub_id & 0x80 == 0x80:
+        return
+    if report_id == base.DJ_MESSAGE_ID and (sub_id < 0x10):
+        return
+    address = ord(data[1:2])
+    if sub_id == 0x00 and (address & 0x0F == 0x00):
+        return
+    if (
+        (sub_id >= 0x40)
+        or (sub_id in (0x07, 0x0D) and len(data) == 5 and data[4:5] == b"\x00")
+        or (sub_id == 0x17 and len(data) == 5)
+        or (address & 0x0F == 0x00)
+    ):
+        return _Notification(report_id, devnumber, sub_id, address, data[2:])
+
+
+def new_read(handle):
+    return base._read(handle, 0)
+
+
+def run(read, notification, count):
+    reader, writer = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    handle = reader.fileno()
+    decoded = 0
+    elapsed = 0.0
+    try:
+        for _batch in range(count // BATCH):
+            for _i in range(BATCH):
+                writer.send(PACKET)
+            start = time.perf_counter()
+            for _i in range(BATCH):
+                n = notification(*read(handle))
+                decoded += n is not None
+            elapsed += time.perf_counter() - start
+    finally:
+        reader.close()
+        writer.close()
+    return decoded / elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    old = run(old_read, old_notification, count)
+    new = run(new_read, base.make_notification, count)
+    print(f"old decode path: {old:12,.0f} packets/s")
+    print(f"new decode path: {new:12,.0f} packets/s  ({new / old:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
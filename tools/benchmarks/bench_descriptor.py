@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Cost of finding the report sizes of a report descriptor, per descriptor.
+
+Compares hid_parser.ReportDescriptor with hid_parser.scan on the descriptors of
+the interfaces of a Unifying receiver, and on any report_descriptor files given.
+
+    tools/benchmarks/bench_descriptor.py [/sys/class/hidraw/hidraw*/device/report_descriptor ...]
+"""
+
+import os.path as _path
+import sys
+import timeit
+import warnings
+
+sys.path.insert(0, _path.normpath(_path.join(_path.dirname(_path.realpath(__file__)), "..", "..", "lib")))
+
+import hid_parser  # noqa: E402
+
+CORPUS = {
+    "receiver keyboard": bytes.fromhex(
+        "05010906A101850195087501150025010507 19E0 29E7 8102 9505 0508 1901 2905 9102 9501 7503 9101"
+        "9506 7508 1500 26FF00 0507 1900 2AFF00 8100 C0"
+    ),
+    "receiver mouse": bytes.fromhex(
+        "05010902A10185020901A10005091901291015002501951075018102"
+        "05011601F826FF07750C95020930093181061581257F7508950109388106"
+        "050C0A3802950181 06C0C0"
+    ),
+    "receiver consumer": bytes.fromhex(
+        "050C0901A1018503751095021501 26FF02 1901 2AFF02 8100 C0"
+        "05010980A101850475029501150125030982098109838160 7506 8103 C0"
+        "06BCFF0988A1018508 1901 29FF 1501 26FF00 7508 9501 8100 C0"
+    ),
+    "receiver HID++": bytes.fromhex(
+        "0600FF0901A1018510750895061500 26FF00 0901 8100 0901 9100 C0"
+        "0600FF0902A1018511750895131500 26FF00 0902 8100 0902 9100 C0"
+        "0600FF0904A1018520750895 0E 1500 26FF00 0941 8100 0941 9100 8521 951F 1500 26FF00 0942 8100 0942 9100 C0"
+    ),
+}
+
+
+def full_parse(data):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        rd = hid_parser.ReportDescriptor(data)
+    return {i: int(rd.get_input_report_size(i)) for i in rd.input_report_ids}
+
+
+def scan(data):
+    return hid_parser.scan(data).input
+
+
+def report(full, fast):
+    return f" full {full * 1e6:8.1f} µs  scan {fast * 1e6:6.1f} µs  ({full / fast:.0f}x)"
+
+
+def main():
+    corpus = dict(CORPUS)
+    for name in sys.argv[1:]:
+        with open(name, "rb") as f:
+            corpus[name] = f.read()
+    count = 2000
+    total_full = total_scan = 0.0
+    for name, data in corpus.items():
+        assert {k: v for k, v in full_parse(data).items() if v} == {k: v for k, v in scan(data).items() if v}, name
+        full = min(timeit.repeat(lambda: full_parse(data), number=count, repeat=3)) / count  # noqa: B023
+        fast = min(timeit.repeat(lambda: scan(data), number=count, repeat=3)) / count  # noqa: B023
+        total_full += full
+        total_scan += fast
+        print(f"{name[:32]:32} {len(data):4} bytes {report(full, fast)}")
+    print(f"{'all':32}            {report(total_full, total_scan)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Cost of dispatching a HID++ 2.0 feature notification, per notification.
+
+Runs notifications.process on a stand-in device for notifications of features
+handled early and late in the dispatch, with rule processing left out.
+
+    tools/benchmarks/bench_dispatch.py [notifications]
+"""
+
+import os.path as _path
+import sys
+import timeit
+
+sys.path.insert(0, _path.normpath(_path.join(_path.dirname(_path.realpath(__file__)), "..", "..", "lib")))
+
+from logitech_receiver import base  # noqa: E402
+from logitech_receiver import notifications  # noqa: E402
+from logitech_receiver.hidpp20_constants import FEATURE  # noqa: E402
+
+FEATURES = [
+    FEATURE.ROOT,
+    FEATURE.BATTERY_STATUS,
+    FEATURE.WIRELESS_DEVICE_STATUS,
+    FEATURE.REPROG_CONTROLS_V4,
+    FEATURE.HIRES_WHEEL,
+    FEATURE.ONBOARD_PROFILES,
+]
+
+
+class Features:
+    def get_feature(self, index):
+        return FEATURES[index]
+
+    def __bool__(self):
+        return True
+
+
+class Device:
+    isDevice = True
+    online = True
+    protocol = 4.5
+    features = Features()
+    setting_callback = None
+
+    def handle_notification(self, n):
+        return None
+
+    def handle_feature_notification(self, n, feature):
+        return None
+
+    def set_battery_info(self, info):
+        pass
+
+    def changed(self, *args, **kwargs):
+        pass
+
+
+CASES = [
+    ("BATTERY_STATUS", base._HIDPP_Notification(0x11, 1, 1, 0x00, b"\x50\x00\x00\x00")),
+    ("WIRELESS_DEVICE_STATUS", base._HIDPP_Notification(0x11, 1, 2, 0x00, b"\x00\x00\x00\x00")),
+    ("REPROG_CONTROLS_V4 rawXY", base._HIDPP_Notification(0x11, 1, 3, 0x10, b"\x00\x03\xff\xfe")),
+    ("HIRES_WHEEL", base._HIDPP_Notification(0x11, 1, 4, 0x00, b"\x10\x00\x01")),
+    ("ONBOARD_PROFILES unknown", base._HIDPP_Notification(0x11, 1, 5, 0x20, b"\x00\x00")),
+]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    notifications._diversion.process_notification = lambda device, n, feature: None
+    device = Device()
+    for name, n in CASES:
+        seconds = min(timeit.repeat(lambda: notifications.process(device, n), number=count, repeat=3))  # noqa: B023
+        print(f"{name:28} {seconds / count * 1e9:8.0f} ns/notification")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+## Copyright (C) 2024 Solaar contributors
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License along
+## with this program; if not, write to the Free Software Foundation, Inc.,
+## 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+
+"""Import time of the command line and GUI entry points.
+
+Imports each module in fresh interpreters with python -X importtime and prints
+the best cumulative time of the runs, and the modules that took longest to
+import themselves. The first runs also compile bytecode unless that is disabled.
+
+    tools/benchmarks/bench_import.py [runs] [module ...]
+"""
+
+import os
+import os.path as _path
+import subprocess
+import sys
+
+LIB = _path.normpath(_path.join(_path.dirname(_path.realpath(__file__)), "..", "..", "lib"))
+MODULES = ["logitech_receiver.base", "logitech_receiver.device", "solaar.cli", "solaar.gtk"]
+
+
+def importtime(module):
+    """The -X importtime report of importing a module, as (module, self us, cumulative us) tuples."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([LIB] + sys.path[1:]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], env=env, capture_output=True, text=True
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.splitlines()[-1])
+    report = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and not line.endswith("| imported package"):
+            own, cumulative, name = line[len("import time:") :].split("|")
+            report.append((name.strip(), int(own), int(cumulative)))
+    return report
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for module in sys.argv[2:] or MODULES:
+        try:
+            reports = [importtime(module) for _i in range(runs)]
+        except RuntimeError as e:
+            print(f"{module:28} cannot be imported: {e}")
+            continue
+        best = min(reports, key=lambda report: report[-1][2])
+        print(f"{module:28} {best[-1][2] / 1000:8.1f} ms  {len(best)} modules")
+        for name, own, _cumulative in sorted(best, key=lambda item: -item[1])[:5]:
+            print(f"    {own / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()